@@ -1,49 +1,73 @@
+-- Tables of the documents app's initial migration (documents/migrations/0001_initial.py).
+-- This file is frozen at that schema: later changes live in the migrations.
+-- After loading it run `python manage.py migrate --fake-initial` once; the
+-- auth_user and other Django tables come from `migrate`.
+
 -- Disable foreign key checks
 SET FOREIGN_KEY_CHECKS = 0;
 
--- Users Table
-CREATE TABLE IF NOT EXISTS auth_user (
-    id INT AUTO_INCREMENT PRIMARY KEY,
-    username VARCHAR(50) NOT NULL UNIQUE,
-    last_name VARCHAR(50) NOT NULL UNIQUE,
-    first_name VARCHAR(50) NOT NULL UNIQUE,
-    password VARCHAR(100) NOT NULL,
-    email VARCHAR(100) NOT NULL UNIQUE,
-    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-    updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP
-);
-
 -- Documents Table
 CREATE TABLE IF NOT EXISTS documents (
-    id INT AUTO_INCREMENT PRIMARY KEY,
+    id BIGINT AUTO_INCREMENT PRIMARY KEY,
     user_id INT NOT NULL,
-    file_name VARCHAR(100) NOT NULL,
-    upload_date TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-    status VARCHAR(20) DEFAULT 'uploaded',
-    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-    updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP
+    file_name VARCHAR(255) NOT NULL,
+    upload_date DATETIME(6) NOT NULL,
+    status VARCHAR(20) NOT NULL DEFAULT 'uploaded',
+    created_at DATETIME(6) NOT NULL,
+    updated_at DATETIME(6) NOT NULL
 );
 
 -- Contents Table
 CREATE TABLE IF NOT EXISTS contents (
-    id INT AUTO_INCREMENT PRIMARY KEY,
-    document_id INT NOT NULL,
-    original_content TEXT NOT NULL,
-    improved_content TEXT,
-    suggestions TEXT,
-    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-    updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP
+    id BIGINT AUTO_INCREMENT PRIMARY KEY,
+    document_id BIGINT NOT NULL,
+    original_content LONGTEXT NOT NULL,
+    improved_content LONGTEXT,
+    suggestions JSON,
+    created_at DATETIME(6) NOT NULL,
+    updated_at DATETIME(6) NOT NULL
 );
 
+-- Improvement Jobs Table (queue consumed by manage.py run_improvement_worker)
+CREATE TABLE IF NOT EXISTS improvement_jobs (
+    id BIGINT AUTO_INCREMENT PRIMARY KEY,
+    document_id BIGINT NOT NULL,
+    status VARCHAR(20) NOT NULL DEFAULT 'queued',
+    error LONGTEXT,
+    created_at DATETIME(6) NOT NULL,
+    started_at DATETIME(6) NULL,
+    finished_at DATETIME(6) NULL,
+    INDEX idx_improvement_jobs_status (status, id)
+);
 
+-- Improvement Cache Table (results of the NLP pipeline keyed by content hash)
+CREATE TABLE IF NOT EXISTS improvement_cache (
+    id BIGINT AUTO_INCREMENT PRIMARY KEY,
+    cache_key VARCHAR(64) NOT NULL UNIQUE,
+    improved_content LONGTEXT NOT NULL,
+    suggestions JSON NOT NULL,
+    created_at DATETIME(6) NOT NULL,
+    last_used_at DATETIME(6) NOT NULL,
+    INDEX idx_improvement_cache_used (last_used_at)
+);
+
+-- Segment Results Table (per-window corrections and per-sentence analysis)
+CREATE TABLE IF NOT EXISTS segment_results (
+    id BIGINT AUTO_INCREMENT PRIMARY KEY,
+    segment_hash VARCHAR(64) NOT NULL UNIQUE,
+    result JSON NOT NULL,
+    created_at DATETIME(6) NOT NULL
+);
 
 -- Add Foreign Key Constraints
-ALTER TABLE documents 
+ALTER TABLE documents
 ADD CONSTRAINT fk_documents_user_id FOREIGN KEY (user_id) REFERENCES auth_user(id) ON DELETE CASCADE;
 
-ALTER TABLE contents 
+ALTER TABLE contents
 ADD CONSTRAINT fk_contents_document_id FOREIGN KEY (document_id) REFERENCES documents(id) ON DELETE CASCADE;
 
+ALTER TABLE improvement_jobs
+ADD CONSTRAINT fk_improvement_jobs_document_id FOREIGN KEY (document_id) REFERENCES documents(id) ON DELETE CASCADE;
 
 -- Enable foreign key checks
-SET FOREIGN_KEY_CHECKS = 1;
\ No newline at end of file
+SET FOREIGN_KEY_CHECKS = 1;
@@ -0,0 +1,156 @@
+import os
+import shutil
+import tempfile
+import zipfile
+from collections import namedtuple
+from concurrent.futures import ProcessPoolExecutor
+
+from django.conf import settings
+from django.db import connection, transaction
+
+from .extraction import SUPPORTED_EXTENSIONS, extract_file
+from .models import Content, Document
+from .search import index_uploads
+from .statistics import DOCUMENTS, adjust_counters, status_counter
+
+# A file of a bulk upload, spooled to disk for the extraction processes
+BulkFile = namedtuple('BulkFile', ['name', 'extension', 'path'])
+
+
+class BulkUploadError(Exception):
+    pass
+
+
+def spool(file, directory):
+    # Uploads larger than FILE_UPLOAD_MAX_MEMORY_SIZE are already on disk
+    if hasattr(file, 'temporary_file_path'):
+        return file.temporary_file_path()
+    handle, path = tempfile.mkstemp(dir=directory)
+    with os.fdopen(handle, 'wb') as target:
+        for chunk in file.chunks():
+            target.write(chunk)
+    return path
+
+
+def unpack_zip(file, directory):
+    # Members of an uploaded .zip become files of their own
+    files = []
+    with zipfile.ZipFile(file) as archive:
+        for info in archive.infolist():
+            if info.is_dir():
+                continue
+            name = os.path.basename(info.filename)
+            extension = os.path.splitext(name)[1].lower()
+            if extension not in SUPPORTED_EXTENSIONS:
+                files.append((name, extension, None, "Unsupported file format"))
+            elif info.file_size > settings.MAX_UPLOAD_SIZE:
+                files.append((name, extension, None, "File too large"))
+            else:
+                handle, path = tempfile.mkstemp(dir=directory)
+                with archive.open(info) as source, os.fdopen(handle, 'wb') as target:
+                    shutil.copyfileobj(source, target)
+                files.append((name, extension, path, None))
+    return files
+
+
+def collect_files(uploads, directory):
+    # Returns the files to extract and a result for every file that was
+    # rejected, in upload order (zip archives are expanded in place)
+    collected = []
+    for file in uploads:
+        extension = os.path.splitext(file.name)[1].lower()
+        if file.size > settings.MAX_UPLOAD_SIZE:
+            collected.append((file.name, extension, None, "File too large"))
+        elif extension == '.zip':
+            try:
+                collected.extend(unpack_zip(file, directory))
+            except zipfile.BadZipFile:
+                collected.append((file.name, extension, None, "Invalid zip archive"))
+        elif extension not in SUPPORTED_EXTENSIONS:
+            collected.append((file.name, extension, None, "Unsupported file format"))
+        else:
+            collected.append((file.name, extension, spool(file, directory), None))
+        if len(collected) > settings.BULK_UPLOAD_MAX_FILES:
+            raise BulkUploadError(f"At most {settings.BULK_UPLOAD_MAX_FILES} files can be uploaded at once")
+    return collected
+
+
+def extract_batch(executor, files):
+    # Extracts a batch concurrently; failures are returned, not raised
+    if executor is None:
+        futures = None
+    else:
+        futures = [executor.submit(extract_file, file.path, file.extension) for file in files]
+    results = []
+    for index, file in enumerate(files):
+        try:
+            if futures is None:
+                results.append(extract_file(file.path, file.extension))
+            else:
+                results.append(futures[index].result())
+        except Exception as e:
+            results.append(e)
+    return results
+
+
+def create_documents(user, files, extracted):
+    # Documents and their contents for one batch, with bulk INSERTs.
+    # Databases that cannot return primary keys from a bulk insert (MySQL)
+    # create the documents one by one and still bulk insert the contents.
+    documents = [Document(user=user, file_name=file.name) for file in files]
+    with transaction.atomic():
+        if connection.features.can_return_rows_from_bulk_insert:
+            Document.objects.bulk_create(documents)
+            # bulk_create sends no post_save, so count the documents here
+            adjust_counters({DOCUMENTS: len(documents), status_counter(documents[0].status): len(documents)})
+        else:
+            for document in documents:
+                document.save()
+        Content.objects.bulk_create([
+            Content(document=document, original_content=body, excerpt=excerpt)
+            for document, (body, excerpt, _) in zip(documents, extracted)
+        ])
+        index_uploads([(document, index_text) for document, (_, _, index_text) in zip(documents, extracted)])
+    return documents
+
+
+def bulk_upload(user, uploads, directory):
+    # Returns one result per uploaded file (or zip member), in order
+    collected = collect_files(uploads, directory)
+    results = [{"file_name": name} for name, _, _, _ in collected]
+    pending = []
+    for index, (name, extension, path, error) in enumerate(collected):
+        if error:
+            results[index]["error"] = error
+        else:
+            pending.append((index, BulkFile(name, extension, path)))
+
+    processes = min(settings.BULK_UPLOAD_PROCESSES, len(pending))
+    executor = ProcessPoolExecutor(max_workers=processes) if processes > 1 else None
+    try:
+        batch_size = settings.BULK_UPLOAD_BATCH_SIZE
+        for start in range(0, len(pending), batch_size):
+            batch = pending[start:start + batch_size]
+            extracted = extract_batch(executor, [file for _, file in batch])
+
+            succeeded = [(index, file, result) for (index, file), result in zip(batch, extracted)
+                         if not isinstance(result, Exception)]
+            for (index, _), result in zip(batch, extracted):
+                if isinstance(result, Exception):
+                    results[index]["error"] = f"Could not extract text: {result}"
+            if not succeeded:
+                continue
+
+            documents = create_documents(
+                user, [file for _, file, _ in succeeded], [result for _, _, result in succeeded]
+            )
+            for (index, _, _), document in zip(succeeded, documents):
+                results[index].update({
+                    "document_id": document.id,
+                    "status": document.status,
+                    "upload_date": document.upload_date.isoformat(),
+                })
+    finally:
+        if executor is not None:
+            executor.shutdown()
+    return results
@@ -0,0 +1,213 @@
+import hashlib
+import threading
+import time
+from collections import OrderedDict
+from datetime import timedelta
+
+from django.conf import settings
+from django.db.models import Q
+from django.utils import timezone
+
+from .models import CachedImprovement, SegmentResult
+
+# Bump when the pipeline changes in a way that makes old results stale
+PIPELINE_VERSION = 4
+
+_config_fingerprint = None
+
+
+def config_fingerprint():
+    global _config_fingerprint
+    if _config_fingerprint is None:
+        with open(settings.NLP_CONFIG_PATH, 'rb') as file:
+            _config_fingerprint = hashlib.sha256(file.read()).hexdigest()
+    return _config_fingerprint
+
+
+def cache_key(text, kind='document'):
+    # The exact text is hashed: improved content and suggestion offsets are
+    # only valid for the text they were computed from, whitespace included
+    key = hashlib.sha256()
+    # Everything that changes the output besides the text: the rules, the
+    # models and engines that produced it, and the pipeline code itself
+    parts = (
+        kind, text, config_fingerprint(), settings.GRAMMAR_MODEL, settings.GRAMMAR_BACKEND,
+        settings.SPELLING_ENGINE, settings.LANGUAGETOOL_BACKEND, str(PIPELINE_VERSION),
+    )
+    for part in parts:
+        key.update(part.encode('utf-8'))
+        key.update(b'\0')
+    return key.hexdigest()
+
+
+# When each table was last pruned by this process (time.monotonic())
+_last_pruned = {}
+_prune_lock = threading.Lock()
+
+
+def prune_due(table):
+    # Pruning sorts the table by last use, so a process does it at most once
+    # every CACHE_PRUNE_INTERVAL seconds instead of on every write
+    now = time.monotonic()
+    with _prune_lock:
+        last = _last_pruned.get(table)
+        if last is not None and now - last < settings.CACHE_PRUNE_INTERVAL:
+            return False
+        _last_pruned[table] = now
+        return True
+
+
+def prune_least_recently_used(model, max_entries):
+    # Deletes every row used less recently than the max_entries most recent
+    # ones: one query finds the first row to go, one range delete removes it
+    # and everything older
+    first = list(
+        model.objects.order_by('-last_used_at', '-id').values_list('last_used_at', 'id')[max_entries:max_entries + 1]
+    )
+    if not first:
+        return 0
+    last_used_at, row_id = first[0]
+    deleted, _ = model.objects.filter(
+        Q(last_used_at__lt=last_used_at) | Q(last_used_at=last_used_at, id__lte=row_id)
+    ).delete()
+    return deleted
+
+
+def result_size(improved_content, suggestions):
+    return len(improved_content) + sum(len(suggestion) for suggestion in suggestions)
+
+
+class ResultCache:
+    # In-memory LRU bounded by the characters it holds, optionally backed by
+    # the improvement_cache table so results survive restarts and are shared
+    # between the web and worker processes
+    def __init__(self, max_chars, persistent=False, persistent_max_entries=None):
+        self.max_chars = max_chars
+        self.persistent = persistent
+        self.persistent_max_entries = persistent_max_entries
+        self.entries = OrderedDict()
+        self.size = 0
+        self.lock = threading.Lock()
+        self.memory_hits = 0
+        self.persistent_hits = 0
+        self.misses = 0
+
+    def get(self, text):
+        key = cache_key(text)
+        with self.lock:
+            if key in self.entries:
+                self.entries.move_to_end(key)
+                self.memory_hits += 1
+                return self.entries[key]
+
+        if self.persistent:
+            entry = CachedImprovement.objects.filter(cache_key=key).first()
+            if entry is not None:
+                CachedImprovement.objects.filter(pk=entry.pk).update(last_used_at=timezone.now())
+                result = (entry.improved_content, entry.suggestions)
+                with self.lock:
+                    self.persistent_hits += 1
+                self._remember(key, result)
+                return result
+
+        with self.lock:
+            self.misses += 1
+        return None
+
+    def put(self, text, improved_content, suggestions):
+        key = cache_key(text)
+        result = (improved_content, list(suggestions))
+        self._remember(key, result)
+
+        if self.persistent:
+            CachedImprovement.objects.update_or_create(
+                cache_key=key,
+                defaults={
+                    'improved_content': improved_content,
+                    'suggestions': result[1],
+                    'last_used_at': timezone.now(),
+                },
+            )
+            if self.persistent_max_entries and prune_due(CachedImprovement._meta.db_table):
+                self.prune_persistent()
+
+    def _remember(self, key, result):
+        size = result_size(*result)
+        if size > self.max_chars:
+            return
+        with self.lock:
+            if key in self.entries:
+                self.size -= result_size(*self.entries.pop(key))
+            self.entries[key] = result
+            self.size += size
+            # Evict least recently used entries until we are back under the limit
+            while self.size > self.max_chars:
+                _, evicted = self.entries.popitem(last=False)
+                self.size -= result_size(*evicted)
+
+    def prune_persistent(self):
+        return prune_least_recently_used(CachedImprovement, self.persistent_max_entries)
+
+    def stats(self):
+        with self.lock:
+            hits = self.memory_hits + self.persistent_hits
+            lookups = hits + self.misses
+            return {
+                'hits': hits,
+                'memory_hits': self.memory_hits,
+                'persistent_hits': self.persistent_hits,
+                'misses': self.misses,
+                'hit_rate': hits / lookups if lookups else 0.0,
+                'entries': len(self.entries),
+                'size_chars': self.size,
+                'max_chars': self.max_chars,
+            }
+
+
+class SegmentStore:
+    # Results for pieces of a document (corrected windows, analysed sentences)
+    # keyed by the hash of their text, so an edited document only pays for the
+    # pieces that changed. Backed by the segment_results table.
+    # Rows used beyond max_entries are pruned least recently used first, as
+    # in the improvement_cache table, at most every CACHE_PRUNE_INTERVAL
+    # seconds. last_used_at is only refreshed once it is older than
+    # touch_interval, so hot rows are not rewritten on every hit.
+    batch_size = 500
+    touch_interval = timedelta(hours=1)
+
+    def __init__(self, max_entries=None):
+        self.max_entries = settings.SEGMENT_STORE_MAX_ENTRIES if max_entries is None else max_entries
+
+    def get_many(self, kind, texts):
+        keys = {cache_key(text, kind): text for text in set(texts)}
+        key_list = list(keys)
+        found = {}
+        now = timezone.now()
+        for start in range(0, len(key_list), self.batch_size):
+            batch = key_list[start:start + self.batch_size]
+            rows = SegmentResult.objects.filter(segment_hash__in=batch)
+            for segment_hash, result in rows.values_list('segment_hash', 'result'):
+                found[keys[segment_hash]] = result
+            SegmentResult.objects.filter(
+                segment_hash__in=batch, last_used_at__lt=now - self.touch_interval
+            ).update(last_used_at=now)
+        return found
+
+    def put_many(self, kind, results):
+        SegmentResult.objects.bulk_create(
+            [SegmentResult(segment_hash=cache_key(text, kind), result=result) for text, result in results.items()],
+            batch_size=self.batch_size,
+            ignore_conflicts=True,
+        )
+        if self.max_entries and prune_due(SegmentResult._meta.db_table):
+            self.prune()
+
+    def prune(self):
+        return prune_least_recently_used(SegmentResult, self.max_entries)
+
+
+result_cache = ResultCache(
+    settings.IMPROVEMENT_CACHE_MAX_CHARS,
+    persistent=settings.IMPROVEMENT_CACHE_PERSISTENT,
+    persistent_max_entries=settings.IMPROVEMENT_CACHE_PERSISTENT_MAX_ENTRIES,
+)
@@ -0,0 +1,148 @@
+import re
+
+from .metrics import timed
+
+# Sentence ends and paragraph breaks; the separators are kept so the
+# corrected windows can be stitched back with the original layout
+SEPARATOR = re.compile(r'\s*\n\s*|(?<=[.!?])\s+')
+
+LINE_BREAK = re.compile(r'\n\s*')
+
+
+def split_segments(text):
+    # Split text into (sentence, separator) pairs; joining them gives back text
+    segments = []
+    position = 0
+    for match in SEPARATOR.finditer(text):
+        segments.append((text[position:match.start()], match.group()))
+        position = match.end()
+    if position < len(text):
+        segments.append((text[position:], ''))
+    return segments
+
+
+def split_sections(text, max_chars):
+    # Split text after line breaks into sections of at least max_chars
+    # characters (except the last). Windows never cross a line break, so
+    # correcting the sections one by one gives the same text as a whole.
+    sections = []
+    position = 0
+    while position < len(text):
+        match = LINE_BREAK.search(text, position + max_chars)
+        end = match.end() if match else len(text)
+        sections.append(text[position:end])
+        position = end
+    return sections
+
+
+class GrammarCorrector:
+    # Runs the text2text grammar pipeline over sentence-aligned windows that
+    # fit the token limit, in batches, and stitches the output back in order.
+    # postprocess (e.g. spelling correction) is applied to each window output.
+    def __init__(self, pipeline, max_window_tokens=256, batch_size=8, postprocess=None):
+        self.pipeline = pipeline
+        self.max_window_tokens = max_window_tokens
+        self.batch_size = batch_size
+        self.postprocess = postprocess
+
+    def count_tokens(self, texts):
+        if not texts:
+            return []
+        input_ids = self.pipeline.tokenizer(list(texts), add_special_tokens=False)['input_ids']
+        return [len(ids) for ids in input_ids]
+
+    def split_long_sentence(self, sentence):
+        # A single sentence over the limit is cut between words
+        words = sentence.split(' ')
+        pieces = []
+        current = []
+        current_tokens = 0
+        for word, tokens in zip(words, self.count_tokens(words)):
+            if current and current_tokens + tokens > self.max_window_tokens:
+                pieces.append(' '.join(current))
+                current = []
+                current_tokens = 0
+            current.append(word)
+            current_tokens += tokens
+        if current:
+            pieces.append(' '.join(current))
+        return [(piece, ' ') for piece in pieces[:-1]] + [(pieces[-1], '')]
+
+    def build_windows(self, text):
+        # Returns (window, separator) pairs; windows never cross a paragraph
+        # break, so newlines survive the model untouched
+        segments = split_segments(text)
+        token_counts = self.count_tokens([sentence for sentence, _ in segments])
+
+        windows = []
+        current = []
+        current_tokens = 0
+
+        def flush():
+            if current:
+                window = ''.join(sentence + separator for sentence, separator in current[:-1]) + current[-1][0]
+                windows.append((window, current[-1][1]))
+                current.clear()
+
+        for (sentence, separator), tokens in zip(segments, token_counts):
+            if tokens > self.max_window_tokens:
+                flush()
+                pieces = self.split_long_sentence(sentence)
+                windows.extend(pieces[:-1])
+                windows.append((pieces[-1][0], separator))
+                current_tokens = 0
+                continue
+            if current and current_tokens + tokens > self.max_window_tokens:
+                flush()
+                current_tokens = 0
+            current.append((sentence, separator))
+            current_tokens += tokens
+            if '\n' in separator:
+                flush()
+                current_tokens = 0
+        flush()
+        return windows
+
+    @timed('grammar_model')
+    def generate(self, inputs):
+        # Sorting by length keeps padding inside each batch small
+        order = sorted(range(len(inputs)), key=lambda index: len(inputs[index]))
+        outputs = [None] * len(inputs)
+        max_length = self.max_window_tokens + self.max_window_tokens // 2
+        for start in range(0, len(order), self.batch_size):
+            batch = [inputs[index] for index in order[start:start + self.batch_size]]
+            results = self.pipeline(batch, batch_size=len(batch), max_length=max_length)
+            for index, result in zip(order[start:start + self.batch_size], results):
+                if isinstance(result, list):
+                    result = result[0]
+                outputs[index] = result['generated_text']
+        return outputs
+
+    def correct_many(self, texts, store=None):
+        # Windows from all texts share batches, which matters when several
+        # documents are corrected together. With a store, windows corrected
+        # before (unchanged paragraphs of an edited document) are reused.
+        windows = [self.build_windows(text) for text in texts]
+        inputs = {window for text_windows in windows for window, _ in text_windows if window.strip()}
+
+        corrected_windows = store.get_many('correction', inputs) if store is not None else {}
+        missing = [window for window in inputs if window not in corrected_windows]
+        outputs = self.generate(missing)
+        if self.postprocess is not None:
+            outputs = [self.postprocess(output) for output in outputs]
+        fresh = dict(zip(missing, outputs))
+        corrected_windows.update(fresh)
+        if store is not None and fresh:
+            store.put_many('correction', fresh)
+
+        corrected = []
+        for text_windows in windows:
+            parts = []
+            for window, separator in text_windows:
+                parts.append(corrected_windows[window] if window.strip() else window)
+                parts.append(separator)
+            corrected.append(''.join(parts))
+        return corrected
+
+    def correct(self, text, store=None):
+        return self.correct_many([text], store)[0]
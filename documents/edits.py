@@ -0,0 +1,56 @@
+from collections import namedtuple
+
+# A replacement of text[start:end]; offsets are relative to the text the
+# suggestion was produced for
+Edit = namedtuple('Edit', ['start', 'end', 'replacement', 'rule_id'])
+
+
+class Suggestion(namedtuple('Suggestion', ['message', 'edits', 'rule_id'])):
+    # The human-readable message shown by the API plus the edits (possibly
+    # none) that apply it to the text
+    __slots__ = ()
+
+    def __new__(cls, message, edits=(), rule_id=None):
+        return super().__new__(cls, message, tuple(edits), rule_id)
+
+    def shifted(self, offset):
+        return self._replace(edits=tuple(
+            edit._replace(start=edit.start + offset, end=edit.end + offset) for edit in self.edits
+        ))
+
+    def to_dict(self):
+        return {
+            'message': self.message,
+            'edits': [list(edit) for edit in self.edits],
+            'rule_id': self.rule_id,
+        }
+
+    @classmethod
+    def from_dict(cls, data):
+        return cls(data['message'], [Edit(*edit) for edit in data['edits']], data['rule_id'])
+
+
+def match_case(original, replacement):
+    # Keep a capitalised word capitalised ('Utilize' -> 'Use')
+    if original[:1].isupper() and replacement[:1].islower():
+        return replacement[0].upper() + replacement[1:]
+    return replacement
+
+
+def apply_edits(text, edits):
+    # Apply all edits in one left-to-right pass. On overlap the edit that
+    # starts first wins, and for the same start the longer span wins.
+    parts = []
+    position = 0
+    for edit in sorted(edits, key=lambda edit: (edit.start, edit.start - edit.end)):
+        if edit.start < position:
+            continue
+        parts.append(text[position:edit.start])
+        parts.append(edit.replacement)
+        position = edit.end
+    parts.append(text[position:])
+    return ''.join(parts)
+
+
+def render_messages(suggestions):
+    return [suggestion.message for suggestion in suggestions]
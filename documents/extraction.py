@@ -0,0 +1,197 @@
+import codecs
+import os
+import tempfile
+import zipfile
+from concurrent.futures import ProcessPoolExecutor
+from contextlib import contextmanager
+
+import PyPDF2
+from lxml import etree
+from django.conf import settings
+from django.core.files import File
+
+from .fields import TextCompressor
+from .models import Content
+
+SUPPORTED_EXTENSIONS = ('.txt', '.docx', '.pdf')
+
+WORD_NAMESPACE = '{http://schemas.openxmlformats.org/wordprocessingml/2006/main}'
+
+
+def iter_txt(file):
+    # Decode upload chunks incrementally so multi-byte characters split
+    # between chunks are handled
+    decoder = codecs.getincrementaldecoder('utf-8')()
+    for chunk in file.chunks():
+        text = decoder.decode(chunk)
+        if text:
+            yield text
+    tail = decoder.decode(b'', final=True)
+    if tail:
+        yield tail
+
+
+def paragraph_text(paragraph):
+    # Same text python-docx reports for a paragraph: runs, tabs and breaks
+    parts = []
+    for element in paragraph.iter(WORD_NAMESPACE + 't', WORD_NAMESPACE + 'tab',
+                                  WORD_NAMESPACE + 'br', WORD_NAMESPACE + 'cr'):
+        if element.tag == WORD_NAMESPACE + 't':
+            parts.append(element.text or '')
+        elif element.tag == WORD_NAMESPACE + 'tab':
+            parts.append('\t')
+        else:
+            parts.append('\n')
+    return ''.join(parts)
+
+
+def iter_docx(file):
+    # Stream word/document.xml instead of building the whole python-docx
+    # object tree; body elements are dropped as soon as they are read
+    body_tag = WORD_NAMESPACE + 'body'
+    with zipfile.ZipFile(file) as archive, archive.open('word/document.xml') as document_xml:
+        for _, element in etree.iterparse(document_xml, events=('end',)):
+            parent = element.getparent()
+            if parent is None or parent.tag != body_tag:
+                continue
+            if element.tag == WORD_NAMESPACE + 'p':
+                yield paragraph_text(element) + '\n'
+            element.clear()
+            while element.getprevious() is not None:
+                del parent[0]
+
+
+def extract_pdf_pages(path, start, end):
+    # Runs in a pool process for large PDFs
+    reader = PyPDF2.PdfReader(path)
+    return [reader.pages[index].extract_text() + '\n' for index in range(start, end)]
+
+
+def iter_pdf(file):
+    reader = PyPDF2.PdfReader(file)
+    page_count = len(reader.pages)
+    processes = settings.PDF_EXTRACTION_PROCESSES
+
+    if processes < 2 or page_count < settings.PDF_PARALLEL_MIN_PAGES:
+        for page in reader.pages:
+            yield page.extract_text() + '\n'
+        return
+
+    # Big PDFs: split the pages into ranges and extract them in parallel;
+    # map() hands the ranges back in page order
+    with uploaded_file_path(file) as path:
+        step = max(1, page_count // (processes * 4))
+        starts = range(0, page_count, step)
+        ends = [min(start + step, page_count) for start in starts]
+        with ProcessPoolExecutor(max_workers=processes) as executor:
+            for pages in executor.map(extract_pdf_pages, [path] * len(ends), starts, ends):
+                yield from pages
+
+
+@contextmanager
+def uploaded_file_path(file):
+    # Path of an upload on disk; uploads kept in memory are spooled to a
+    # temporary file for the pool processes to open
+    if hasattr(file, 'temporary_file_path'):
+        yield file.temporary_file_path()
+        return
+    temporary = tempfile.NamedTemporaryFile(suffix='.pdf', delete=False)
+    try:
+        file.seek(0)
+        for chunk in file.chunks():
+            temporary.write(chunk)
+        temporary.close()
+        yield temporary.name
+    finally:
+        temporary.close()
+        os.unlink(temporary.name)
+
+
+def extract_text(file, extension):
+    # Yields the text of an upload piece by piece (chunks, paragraphs or pages)
+    if extension == '.txt':
+        return iter_txt(file)
+    if extension == '.docx':
+        return iter_docx(file)
+    if extension == '.pdf':
+        return iter_pdf(file)
+    raise ValueError(f"Unsupported file format: {extension}")
+
+
+class ContentWriter:
+    # Compresses extracted text into Content.original_content in large chunks,
+    # so only one chunk of text (plus a short preview for the response, the
+    # start of the body for the search index and the compressed body) is held
+    # in memory
+    def __init__(self, content, chunk_chars, preview_chars, index_chars=0):
+        self.content = content
+        self.chunk_chars = chunk_chars
+        self.preview_chars = preview_chars
+        self.index_chars = index_chars
+        self.compressor = TextCompressor()
+        self.buffer = []
+        self.buffered = 0
+        self.preview = []
+        self.previewed = 0
+        self.index = []
+        self.indexed = 0
+        self.total_chars = 0
+
+    def write(self, text):
+        if self.previewed < self.preview_chars:
+            part = text[:self.preview_chars - self.previewed]
+            self.preview.append(part)
+            self.previewed += len(part)
+        if self.indexed < self.index_chars:
+            part = text[:self.index_chars - self.indexed]
+            self.index.append(part)
+            self.indexed += len(part)
+        self.buffer.append(text)
+        self.buffered += len(text)
+        self.total_chars += len(text)
+        if self.buffered >= self.chunk_chars:
+            self.flush()
+
+    def flush(self):
+        if not self.buffer:
+            return
+        self.compressor.write(''.join(self.buffer))
+        self.buffer = []
+        self.buffered = 0
+
+    def close(self):
+        self.flush()
+        Content.objects.filter(pk=self.content.pk).update(
+            original_content=self.compressor.finish(),
+            excerpt=self.preview_text()[:settings.DOCUMENT_EXCERPT_CHARS],
+        )
+
+    @property
+    def truncated(self):
+        return self.total_chars > self.previewed
+
+    def preview_text(self):
+        return ''.join(self.preview)
+
+    def index_text(self):
+        return ''.join(self.index)
+
+
+def extract_file(path, extension):
+    # Runs in a pool process for bulk uploads; only the compressed body, the
+    # excerpt and the start of the body for the search index are sent back to
+    # the request process
+    compressor = TextCompressor()
+    excerpt = ''
+    index = []
+    indexed = 0
+    with open(path, 'rb') as handle:
+        for text in extract_text(File(handle), extension):
+            if len(excerpt) < settings.DOCUMENT_EXCERPT_CHARS:
+                excerpt += text[:settings.DOCUMENT_EXCERPT_CHARS - len(excerpt)]
+            if indexed < settings.SEARCH_INDEX_MAX_CHARS:
+                part = text[:settings.SEARCH_INDEX_MAX_CHARS - indexed]
+                index.append(part)
+                indexed += len(part)
+            compressor.write(text)
+    return compressor.finish(), excerpt, ''.join(index)
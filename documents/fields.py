@@ -0,0 +1,90 @@
+import zlib
+
+from django.conf import settings
+from django.db import models
+
+# Stored values start with a two byte header naming the codec, so the codec
+# can change without rewriting old rows. Values without a header are plain
+# UTF-8 text written before the column was compressed.
+ZLIB_HEADER = b'\x1fZ'
+ZSTD_HEADER = b'\x1fS'
+
+
+def zstd_module():
+    try:
+        import zstandard
+    except ImportError:
+        raise RuntimeError("CONTENT_COMPRESSION = 'zstd' needs the zstandard package")
+    return zstandard
+
+
+class TextCompressor:
+    # Incremental compressor, so a document can be compressed while it is
+    # extracted without holding the uncompressed text in memory
+    def __init__(self, codec=None, level=None):
+        codec = codec or settings.CONTENT_COMPRESSION
+        level = settings.CONTENT_COMPRESSION_LEVEL if level is None else level
+        if codec == 'zstd':
+            self.header = ZSTD_HEADER
+            self.compressor = zstd_module().ZstdCompressor(level=level).compressobj()
+        elif codec == 'zlib':
+            self.header = ZLIB_HEADER
+            self.compressor = zlib.compressobj(level)
+        else:
+            raise ValueError(f"Unknown content compression codec: {codec}")
+        self.parts = [self.header]
+
+    def write(self, text):
+        self.parts.append(self.compressor.compress(text.encode('utf-8')))
+
+    def finish(self):
+        self.parts.append(self.compressor.flush())
+        data = b''.join(self.parts)
+        self.parts = []
+        return data
+
+
+def compress_text(text, codec=None, level=None):
+    compressor = TextCompressor(codec, level)
+    compressor.write(text)
+    return compressor.finish()
+
+
+def decompress_text(data):
+    if isinstance(data, str):
+        return data
+    data = bytes(data)
+    header, body = data[:2], data[2:]
+    if header == ZLIB_HEADER:
+        return zlib.decompress(body).decode('utf-8')
+    if header == ZSTD_HEADER:
+        return zstd_module().ZstdDecompressor().decompressobj().decompress(body).decode('utf-8')
+    return data.decode('utf-8')
+
+
+class CompressedTextField(models.TextField):
+    # Text in Python, compressed bytes (BLOB) in the database. Assigning
+    # bytes from TextCompressor stores them as they are.
+    def get_internal_type(self):
+        return 'BinaryField'
+
+    def from_db_value(self, value, expression, connection):
+        if value is None:
+            return value
+        return decompress_text(value)
+
+    def to_python(self, value):
+        if value is None or isinstance(value, str):
+            return value
+        return decompress_text(value)
+
+    def get_prep_value(self, value):
+        if value is None or isinstance(value, (bytes, memoryview)):
+            return value
+        return compress_text(str(value))
+
+    def get_db_prep_value(self, value, connection, prepared=False):
+        value = super().get_db_prep_value(value, connection, prepared)
+        if value is not None:
+            return connection.Database.Binary(value)
+        return value
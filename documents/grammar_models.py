@@ -0,0 +1,85 @@
+import os
+
+from django.conf import settings
+
+# Inference backends for the grammar model, all used through the same
+# text2text-generation pipeline interface:
+# - pytorch: the full precision model
+# - int8: the Linear layers dynamically quantized to int8
+# - onnx: an ONNX Runtime graph with a decoder that reuses its key/value cache
+# int8 and onnx load the artifacts written by manage.py export_grammar_model
+BACKENDS = ['pytorch', 'int8', 'onnx']
+
+INT8_WEIGHTS = 'model-int8.pt'
+
+
+class MissingArtifacts(Exception):
+    pass
+
+
+def artifact_dir(backend):
+    return os.path.join(settings.GRAMMAR_ARTIFACTS_DIR, backend)
+
+
+def quantize_int8(model):
+    import torch
+    return torch.quantization.quantize_dynamic(model, {torch.nn.Linear}, dtype=torch.qint8)
+
+
+def export_int8(model_name, directory):
+    # Saves the quantized model as a whole, so loading it never materialises
+    # the full precision weights
+    import torch
+    from transformers import AutoModelForSeq2SeqLM, AutoTokenizer
+    os.makedirs(directory, exist_ok=True)
+    model = quantize_int8(AutoModelForSeq2SeqLM.from_pretrained(model_name).eval())
+    torch.save(model, os.path.join(directory, INT8_WEIGHTS))
+    AutoTokenizer.from_pretrained(model_name).save_pretrained(directory)
+
+
+def export_onnx(model_name, directory, quantize=False):
+    # Encoder, decoder and decoder-with-past graphs; with quantize=True their
+    # weights are also dynamically quantized to int8 by ONNX Runtime
+    from optimum.onnxruntime import ORTModelForSeq2SeqLM, ORTQuantizer
+    from optimum.onnxruntime.configuration import AutoQuantizationConfig
+    from transformers import AutoTokenizer
+    os.makedirs(directory, exist_ok=True)
+    model = ORTModelForSeq2SeqLM.from_pretrained(model_name, export=True, use_cache=True)
+    model.save_pretrained(directory)
+    AutoTokenizer.from_pretrained(model_name).save_pretrained(directory)
+    if quantize:
+        config = AutoQuantizationConfig.avx512_vnni(is_static=False, per_channel=False)
+        for name in sorted(os.listdir(directory)):
+            if name.endswith('.onnx'):
+                quantizer = ORTQuantizer.from_pretrained(directory, file_name=name)
+                quantizer.quantize(save_dir=directory, quantization_config=config)
+                # The quantized graph replaces the full precision one
+                os.replace(os.path.join(directory, name[:-len('.onnx')] + '_quantized.onnx'), os.path.join(directory, name))
+
+
+def load_model(backend):
+    # Returns (model, tokenizer) for the backend
+    if backend not in BACKENDS:
+        raise ValueError(f"Unknown grammar backend: {backend}")
+    from transformers import AutoModelForSeq2SeqLM, AutoTokenizer
+    if backend == 'pytorch':
+        model_name = settings.GRAMMAR_MODEL
+        return AutoModelForSeq2SeqLM.from_pretrained(model_name).eval(), AutoTokenizer.from_pretrained(model_name)
+
+    directory = artifact_dir(backend)
+    if not os.path.isdir(directory):
+        raise MissingArtifacts(
+            f"No {backend} grammar model in {directory}; run manage.py export_grammar_model --backend {backend}"
+        )
+    if backend == 'int8':
+        import torch
+        model = torch.load(os.path.join(directory, INT8_WEIGHTS), weights_only=False)
+        return model.eval(), AutoTokenizer.from_pretrained(directory)
+    from optimum.onnxruntime import ORTModelForSeq2SeqLM
+    return ORTModelForSeq2SeqLM.from_pretrained(directory, use_cache=True), AutoTokenizer.from_pretrained(directory)
+
+
+def load_pipeline(backend):
+    from transformers import pipeline
+    model, tokenizer = load_model(backend)
+    return pipeline('text2text-generation', model=model, tokenizer=tokenizer, device=-1)
@@ -0,0 +1,365 @@
+import copy
+import functools
+import os
+import threading
+import time
+from multiprocessing import AuthenticationError
+from multiprocessing.connection import Client, Listener
+
+from django.conf import settings
+
+from .languagetool import BatchedChecker, LocalMatch
+
+# Shared inference server: one long-lived process (manage.py
+# run_inference_server) owns the models and the web and improvement worker
+# processes call it over a Unix socket or localhost TCP. Requests that arrive
+# close together are run as one batch, so concurrent documents share the
+# grammar model's batches instead of each process running its own copy.
+# Messages are pickles: anyone who can connect with the authkey can run code
+# in the server, so it is never bound to a public address.
+
+
+class InferenceError(Exception):
+    pass
+
+
+WILDCARD_HOSTS = ('0.0.0.0', '::', '[::]', '*')
+
+
+def parse_address(address):
+    # 'unix:/path/to/socket' or 'host:port'
+    if address.startswith('unix:'):
+        return address[len('unix:'):], 'AF_UNIX'
+    host, _, port = address.rpartition(':')
+    return (host or '127.0.0.1', int(port)), 'AF_INET'
+
+
+def require_authkey(authkey):
+    if not authkey:
+        raise InferenceError("INFERENCE_SERVER_AUTHKEY must be set to use the inference server")
+    return authkey
+
+
+class PendingRequest:
+    def __init__(self, key, items):
+        self.key = key
+        self.items = items
+        self.arrived = time.monotonic()
+        self.done = threading.Event()
+        self.results = None
+        self.error = None
+
+
+class MicroBatcher:
+    # Gathers the items submitted by concurrent requests into batches for one
+    # model, run by a single thread. A batch starts once max_batch items are
+    # waiting or the oldest request has waited max_wait seconds; only requests
+    # with the same key (e.g. the same generation length) share a batch.
+    def __init__(self, name, process, max_batch, max_wait):
+        self.name = name
+        self.process = process
+        self.max_batch = max_batch
+        self.max_wait = max_wait
+        self.queue = []
+        self.condition = threading.Condition()
+        self.requests = 0
+        self.batches = 0
+        self.items = 0
+        self.busy_seconds = 0.0
+        self.thread = threading.Thread(target=self.run, name=f'batcher-{name}', daemon=True)
+        self.thread.start()
+
+    def submit(self, key, items):
+        if not items:
+            return []
+        request = PendingRequest(key, list(items))
+        with self.condition:
+            self.queue.append(request)
+            self.condition.notify()
+        request.done.wait()
+        if request.error is not None:
+            raise request.error
+        return request.results
+
+    def waiting(self, key):
+        return sum(len(request.items) for request in self.queue if request.key == key)
+
+    def next_batch(self):
+        with self.condition:
+            while not self.queue:
+                self.condition.wait()
+            key = self.queue[0].key
+            deadline = self.queue[0].arrived + self.max_wait
+            while self.waiting(key) < self.max_batch:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                self.condition.wait(remaining)
+
+            # Whole requests in arrival order; one larger than max_batch is
+            # run on its own
+            batch = []
+            size = 0
+            for request in self.queue:
+                if request.key != key:
+                    continue
+                if batch and size + len(request.items) > self.max_batch:
+                    break
+                batch.append(request)
+                size += len(request.items)
+            for request in batch:
+                self.queue.remove(request)
+            return key, batch
+
+    def run(self):
+        while True:
+            key, batch = self.next_batch()
+            items = [item for request in batch for item in request.items]
+            start = time.perf_counter()
+            try:
+                results = self.process(key, items)
+            except Exception as e:
+                for request in batch:
+                    request.error = e
+                    request.done.set()
+                continue
+            self.busy_seconds += time.perf_counter() - start
+            self.requests += len(batch)
+            self.batches += 1
+            self.items += len(items)
+            position = 0
+            for request in batch:
+                request.results = results[position:position + len(request.items)]
+                position += len(request.items)
+                request.done.set()
+
+    def stats(self):
+        return {
+            'requests': self.requests,
+            'batches': self.batches,
+            'items': self.items,
+            'busy_seconds': self.busy_seconds,
+        }
+
+
+class InferenceServer:
+    # Answers each connection on its own thread; the model calls go through
+    # one MicroBatcher per model. Tokenizing and spelling are cheap, so they
+    # never wait for a batch to fill.
+    def __init__(self, models, max_batch, max_wait):
+        self.models = models
+        self.max_batch = max_batch
+        self.batchers = {
+            'grammar': MicroBatcher('grammar', self.generate, max_batch, max_wait),
+            'tokenize': MicroBatcher('tokenize', self.tokenize, max_batch, 0),
+            'parse': MicroBatcher('parse', self.parse, max_batch, max_wait),
+            'check': MicroBatcher('check', self.check, max_batch, max_wait),
+            'spelling': MicroBatcher('spelling', self.correct_spelling, max_batch, 0),
+        }
+        self.operations = {
+            'generate': lambda texts, max_length: self.batchers['grammar'].submit(max_length, texts),
+            'tokenize': lambda texts, add_special_tokens: self.batchers['tokenize'].submit(add_special_tokens, texts),
+            'parse': lambda texts, disable: self.batchers['parse'].submit(tuple(sorted(disable)), texts),
+            'spacy_meta': self.spacy_meta,
+            'check': lambda text: self.batchers['check'].submit(None, [text])[0],
+            'correct_spelling': lambda text: self.batchers['spelling'].submit(None, [text])[0],
+            'stats': self.stats,
+        }
+
+    def generate(self, max_length, texts):
+        # Sorting by length keeps padding inside the batch small
+        pipeline = self.models.get('grammar')
+        order = sorted(range(len(texts)), key=lambda index: len(texts[index]))
+        results = pipeline(
+            [texts[index] for index in order], batch_size=min(len(texts), self.max_batch), max_length=max_length,
+        )
+        outputs = [None] * len(texts)
+        for index, result in zip(order, results):
+            if isinstance(result, list):
+                result = result[0]
+            outputs[index] = result['generated_text']
+        return outputs
+
+    @functools.cached_property
+    def tokenizer(self):
+        # Fast tokenizers may not be used from two threads at once, and the
+        # grammar batcher's pipeline uses the original
+        return copy.deepcopy(self.models.get('grammar').tokenizer)
+
+    def tokenize(self, add_special_tokens, texts):
+        return [list(ids) for ids in self.tokenizer(texts, add_special_tokens=add_special_tokens)['input_ids']]
+
+    def parse(self, disable, texts):
+        # Docs are sent as bytes and rebuilt by the client; extension values
+        # are set by the client, not here
+        nlp = self.models.get('spacy')
+        return [doc.to_bytes(exclude=['tensor', 'user_data']) for doc in nlp.pipe(texts, disable=list(disable))]
+
+    def spacy_meta(self):
+        nlp = self.models.get('spacy')
+        return {'lang': nlp.lang, 'pipe_names': list(nlp.pipe_names)}
+
+    def check(self, key, texts):
+        # The texts of concurrent requests go to LanguageTool together, in as
+        # few requests as the chunk size allows
+        checker = BatchedChecker(self.models.get('languagetool'), settings.LANGUAGETOOL_CHUNK_CHARS)
+        return [
+            [LocalMatch(match.offset, match.length, match.message, match.replacements, match.rule_id)
+             for match in result.matches]
+            for result in checker.check_many(texts)
+        ]
+
+    def correct_spelling(self, key, texts):
+        corrector = self.models.get('spelling')
+        return [corrector.correct(text) for text in texts]
+
+    def stats(self):
+        return {name: batcher.stats() for name, batcher in self.batchers.items()}
+
+    def serve_connection(self, connection):
+        with connection:
+            while True:
+                try:
+                    operation, args = connection.recv()
+                except (EOFError, OSError):
+                    return
+                try:
+                    result = self.operations[operation](*args)
+                except Exception as e:
+                    connection.send(('error', f"{type(e).__name__}: {e}"))
+                else:
+                    connection.send(('ok', result))
+
+    def serve_forever(self, address, authkey, ready=None):
+        require_authkey(authkey)
+        location, family = parse_address(address)
+        if family == 'AF_INET' and location[0] in WILDCARD_HOSTS:
+            raise InferenceError(
+                f"Refusing to listen on every interface ({address}); use a Unix socket or an internal address"
+            )
+        if family == 'AF_UNIX' and os.path.exists(location):
+            # Left behind by a server that did not shut down cleanly
+            os.unlink(location)
+        with Listener(location, family, authkey=authkey) as listener:
+            if family == 'AF_UNIX':
+                # Only the server's user and group may connect
+                os.chmod(location, 0o660)
+            if ready is not None:
+                ready()
+            while True:
+                try:
+                    connection = listener.accept()
+                except (AuthenticationError, EOFError, ConnectionError):
+                    continue
+                threading.Thread(target=self.serve_connection, args=(connection,), daemon=True).start()
+
+
+class InferenceClient:
+    # One connection per thread and process: a forked child (e.g. an
+    # improvement worker pool process) opens its own instead of sharing the
+    # parent's socket
+    def __init__(self, address, authkey):
+        self.address = address
+        self.location, self.family = parse_address(address)
+        self.authkey = authkey
+        self.local = threading.local()
+
+    def connection(self):
+        if getattr(self.local, 'pid', None) != os.getpid():
+            self.local.connection = None
+            self.local.pid = os.getpid()
+        if self.local.connection is None:
+            self.local.connection = Client(self.location, self.family, authkey=self.authkey)
+        return self.local.connection
+
+    def call(self, operation, *args):
+        # Every operation can be repeated safely, so a connection dropped by a
+        # restarted server is retried once on a new one
+        for attempt in range(2):
+            try:
+                connection = self.connection()
+                connection.send((operation, args))
+                status, result = connection.recv()
+                break
+            except (EOFError, OSError) as e:
+                self.local.connection = None
+                if attempt:
+                    raise InferenceError(f"Inference server at {self.address} is not available: {e}") from e
+        if status == 'error':
+            raise InferenceError(result)
+        return result
+
+
+class RemoteTokenizer:
+    def __init__(self, client):
+        self.client = client
+
+    def __call__(self, texts, add_special_tokens=True):
+        return {'input_ids': self.client.call('tokenize', list(texts), add_special_tokens)}
+
+
+class RemotePipeline:
+    # Stands in for the text2text-generation pipeline used by GrammarCorrector;
+    # the server picks the batch size
+    def __init__(self, client):
+        self.client = client
+        self.tokenizer = RemoteTokenizer(client)
+
+    def __call__(self, texts, batch_size=None, max_length=None):
+        outputs = self.client.call('generate', list(texts), max_length)
+        return [{'generated_text': output} for output in outputs]
+
+
+class RemoteLanguage:
+    # Stands in for a spaCy Language: texts are parsed by the server and the
+    # Docs rebuilt here on the vocab of a blank pipeline of the same language
+    def __init__(self, client):
+        import spacy
+        self.client = client
+        meta = client.call('spacy_meta')
+        self.lang = meta['lang']
+        self.pipe_names = meta['pipe_names']
+        self.vocab = spacy.blank(self.lang).vocab
+
+    def __call__(self, text, disable=()):
+        return self.pipe([text], disable=disable)[0]
+
+    def pipe(self, texts, disable=(), **kwargs):
+        from spacy.tokens import Doc
+        return [Doc(self.vocab).from_bytes(data) for data in self.client.call('parse', list(texts), list(disable))]
+
+
+class RemoteLanguageTool:
+    def __init__(self, client):
+        self.client = client
+
+    def check(self, text):
+        return self.client.call('check', text)
+
+    def close(self):
+        pass
+
+
+class RemoteSpelling:
+    def __init__(self, client):
+        self.client = client
+
+    def correct(self, text):
+        return self.client.call('correct_spelling', text)
+
+
+REMOTE_MODELS = {
+    'spacy': RemoteLanguage,
+    'languagetool': RemoteLanguageTool,
+    'grammar': RemotePipeline,
+    'spelling': RemoteSpelling,
+}
+
+
+@functools.lru_cache(maxsize=None)
+def client_for(address):
+    return InferenceClient(address, require_authkey(settings.INFERENCE_SERVER_AUTHKEY))
+
+
+def remote_model(name, address):
+    return REMOTE_MODELS[name](client_for(address))
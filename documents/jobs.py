@@ -0,0 +1,275 @@
+import logging
+import multiprocessing
+import time
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import connection, transaction
+from django.utils import timezone
+
+from .cache import SegmentStore, result_cache
+from .metrics import add_timings, collect_timings, stage_metrics
+from .models import Content, Document, ImprovementJob
+from .registry import registry
+from .search import index_improvements
+
+logger = logging.getLogger(__name__)
+
+# The state of an improvement lives on its ImprovementJob; Document.status is
+# the review state (uploaded/approved/rejected) and is never touched here
+
+
+def enqueue_improvement(document):
+    return enqueue_improvements([document])[0]
+
+
+def enqueue_improvements(documents):
+    # One job per document; a document that already has a queued or running
+    # job gets that job back instead of a second one. Locking the documents
+    # keeps two concurrent requests from both queuing the same one.
+    # Databases that cannot return primary keys from a bulk insert (MySQL)
+    # create the jobs one by one.
+    document_ids = [document.pk for document in documents]
+    with transaction.atomic():
+        list(Document.objects.select_for_update().filter(id__in=document_ids).values_list('id', flat=True))
+        active = {
+            job.document_id: job
+            for job in ImprovementJob.objects.filter(
+                document_id__in=document_ids, status__in=[ImprovementJob.QUEUED, ImprovementJob.RUNNING]
+            ).order_by('id')
+        }
+        new_jobs = [ImprovementJob(document=document) for document in documents if document.pk not in active]
+        if connection.features.can_return_rows_from_bulk_insert:
+            ImprovementJob.objects.bulk_create(new_jobs)
+        else:
+            for job in new_jobs:
+                job.save()
+    active.update((job.document_id, job) for job in new_jobs)
+    return [active[document.pk] for document in documents]
+
+
+def claim_jobs(limit):
+    # Jobs left running past the timeout belong to a worker that died
+    stale_before = timezone.now() - timedelta(seconds=settings.IMPROVEMENT_JOB_TIMEOUT)
+    ImprovementJob.objects.filter(status=ImprovementJob.RUNNING, started_at__lt=stale_before).update(
+        status=ImprovementJob.QUEUED, started_at=None
+    )
+
+    with transaction.atomic():
+        # skip_locked lets several workers poll the same table without
+        # blocking on or double-claiming each other's rows
+        job_ids = list(
+            ImprovementJob.objects.select_for_update(skip_locked=True)
+            .filter(status=ImprovementJob.QUEUED)
+            .order_by('id')
+            .values_list('id', flat=True)[:limit]
+        )
+        if not job_ids:
+            return []
+        now = timezone.now()
+        ImprovementJob.objects.filter(id__in=job_ids).update(status=ImprovementJob.RUNNING, started_at=now)
+    return list(ImprovementJob.objects.filter(id__in=job_ids).select_related('document').order_by('id'))
+
+
+def save_improvement(document, improved_content, suggestions):
+    now = timezone.now()
+    with transaction.atomic():
+        Content.objects.filter(document=document).update(
+            improved_content=improved_content, suggestions=suggestions, updated_at=now
+        )
+        index_improvements({document.pk: improved_content})
+
+
+def save_improvements(results):
+    # results are (document id, content id, improved content, suggestions);
+    # the whole batch is written with one UPDATE per table
+    now = timezone.now()
+    with transaction.atomic():
+        Content.objects.bulk_update(
+            [
+                Content(pk=content_id, improved_content=improved_content, suggestions=suggestions, updated_at=now)
+                for _, content_id, improved_content, suggestions in results
+            ],
+            ['improved_content', 'suggestions', 'updated_at'],
+        )
+        index_improvements({document_id: improved_content for document_id, _, improved_content, _ in results})
+
+
+def complete_jobs(results):
+    # results are (job, content id, improved content, suggestions, timings)
+    now = timezone.now()
+    with transaction.atomic():
+        save_improvements([
+            (job.document_id, content_id, improved_content, suggestions)
+            for job, content_id, improved_content, suggestions, _ in results
+        ])
+        ImprovementJob.objects.bulk_update(
+            [
+                ImprovementJob(pk=job.pk, status=ImprovementJob.DONE, finished_at=now, timings=timings)
+                for job, _, _, _, timings in results
+            ],
+            ['status', 'finished_at', 'timings'],
+        )
+
+
+def fail_job(job, error):
+    now = timezone.now()
+    logger.error("Improvement job %s failed: %s", job.pk, error)
+    with transaction.atomic():
+        ImprovementJob.objects.filter(pk=job.pk).update(
+            status=ImprovementJob.FAILED, error=str(error), finished_at=now
+        )
+
+
+def correct_texts(texts):
+    # Runs in the worker's main process: the grammar model sees the windows
+    # of every claimed document in shared batches
+    from .nlp_utils import correct_documents
+    store = SegmentStore() if settings.INCREMENTAL_ANALYSIS else None
+    with collect_timings() as timings:
+        corrected_texts = correct_documents(texts, store)
+    stage_metrics.flush()
+    return corrected_texts, timings
+
+
+def analyze_text(corrected_text):
+    # Runs inside a pool process. With incremental analysis the unchanged
+    # sentences of an edited document are read from the segment store.
+    from .nlp_utils import analyze_corrected_content
+    store = SegmentStore() if settings.INCREMENTAL_ANALYSIS else None
+    with collect_timings() as timings:
+        improved_content, suggestions = analyze_corrected_content(corrected_text, store)
+    stage_metrics.flush()
+    return improved_content, suggestions, timings
+
+
+def analyze_shard_text(shard_text):
+    # Runs inside a pool process: the sentence level analysis of one shard of
+    # a large document
+    from .nlp_utils import analyze_shard
+    store = SegmentStore() if settings.INCREMENTAL_ANALYSIS else None
+    with collect_timings() as timings:
+        result = analyze_shard(shard_text, store)
+    stage_metrics.flush()
+    return result, timings
+
+
+def finish_shards(corrected_text, spans, shard_results):
+    # Runs inside a pool process once every shard is analysed
+    from .nlp_utils import finish_sharded_analysis
+    with collect_timings() as timings:
+        improved_content, suggestions = finish_sharded_analysis(
+            corrected_text, spans, [result for result, _ in shard_results]
+        )
+    stage_metrics.flush()
+    for _, shard_timings in shard_results:
+        add_timings(timings, shard_timings)
+    return improved_content, suggestions, timings
+
+
+class ShardedAnalysis:
+    # Stands in for the AsyncResult of analyze_text for a large document: its
+    # shards are analysed across the whole pool, then one more task merges
+    # them and runs the whole-text stages
+    def __init__(self, pool, corrected_text):
+        from .nlp_utils import shard_spans
+        self.pool = pool
+        self.corrected_text = corrected_text
+        self.spans = shard_spans(corrected_text)
+        self.shards = pool.map_async(analyze_shard_text, [corrected_text[start:end] for start, end in self.spans])
+        self.finished = None
+
+    def ready(self):
+        if self.finished is None:
+            if not self.shards.ready():
+                return False
+            if not self.shards.successful():
+                return True
+            self.finished = self.pool.apply_async(finish_shards, (self.corrected_text, self.spans, self.shards.get()))
+        return self.finished.ready()
+
+    def get(self):
+        if self.finished is None:
+            # Raises the exception of the failed shard
+            return self.shards.get()
+        return self.finished.get()
+
+
+def run_worker(processes, poll_interval=1.0, once=False, preload=(), batch_size=None):
+    # Claimed jobs are grammar corrected together in this process, then the
+    # other analyzers run per document in the pool (large documents shard by
+    # shard), overlapping with the correction of the next batch. Finished
+    # jobs are written back together.
+    batch_size = batch_size or settings.IMPROVEMENT_BATCH_SIZE
+
+    # Models loaded here are inherited by the forked pool processes, which
+    # then share the weights instead of loading a copy each
+    registry.warm(preload)
+
+    # The pool is started before the first query so no forked process ever
+    # shares the parent's database connection
+    pool = multiprocessing.Pool(processes)
+    pending = {}
+    try:
+        while True:
+            finished = []
+            for job_id, (job, content_id, text, correction_timings, result) in list(pending.items()):
+                if not result.ready():
+                    continue
+                del pending[job_id]
+                try:
+                    improved_content, suggestions, analysis_timings = result.get()
+                except Exception as e:
+                    fail_job(job, e)
+                else:
+                    result_cache.put(text, improved_content, suggestions)
+                    timings = {'correction': correction_timings, 'analysis': analysis_timings}
+                    finished.append((job, content_id, improved_content, suggestions, timings))
+
+            claimed = []
+            if len(pending) < processes:
+                claimed = claim_jobs(batch_size)
+                contents = {
+                    document_id: (content_id, text)
+                    for document_id, content_id, text in Content.objects.filter(
+                        document_id__in=[job.document_id for job in claimed]
+                    ).values_list('document_id', 'id', 'original_content')
+                }
+                batch = []
+                for job in claimed:
+                    if job.document_id not in contents:
+                        fail_job(job, "Content not found for this document")
+                        continue
+                    content_id, text = contents[job.document_id]
+                    # Another job may have improved the same text in the meantime
+                    cached = result_cache.get(text)
+                    if cached is not None:
+                        finished.append((job, content_id, *cached, None))
+                        continue
+                    batch.append((job, content_id, text))
+
+                if batch:
+                    try:
+                        corrected_texts, correction_timings = correct_texts([text for _, _, text in batch])
+                    except Exception as e:
+                        for job, _, _ in batch:
+                            fail_job(job, e)
+                    else:
+                        # Correction timings cover the whole batch
+                        correction_timings['batch_documents'] = len(batch)
+                        for (job, content_id, text), corrected_text in zip(batch, corrected_texts):
+                            if len(corrected_text) >= settings.LARGE_DOCUMENT_CHARS:
+                                result = ShardedAnalysis(pool, corrected_text)
+                            else:
+                                result = pool.apply_async(analyze_text, (corrected_text,))
+                            pending[job.pk] = (job, content_id, text, correction_timings, result)
+
+            if finished:
+                complete_jobs(finished)
+            if once and not pending and not claimed:
+                break
+            if not claimed:
+                time.sleep(poll_interval)
+    finally:
+        pool.terminate()
+        pool.join()
@@ -0,0 +1,129 @@
+import bisect
+import re
+import time
+from collections import namedtuple
+
+from .metrics import timed
+
+# A LanguageTool match with its offset relative to the whole checked text
+CheckedMatch = namedtuple('CheckedMatch', ['offset', 'length', 'message', 'replacements', 'rule_id'])
+
+
+def chunk_spans(text, chunk_chars, boundaries=None):
+    # Split text into (start, end) spans of at most chunk_chars characters,
+    # cutting at the last sentence boundary (or whitespace) inside each window
+    if boundaries is None:
+        boundaries = [m.end() for m in re.finditer(r'\n+|(?<=[.!?])\s+', text)]
+    boundaries = sorted(set(b for b in boundaries if 0 < b < len(text)))
+
+    spans = []
+    start = 0
+    while start < len(text):
+        limit = start + chunk_chars
+        if limit >= len(text):
+            spans.append((start, len(text)))
+            break
+        index = bisect.bisect_right(boundaries, limit) - 1
+        if index >= 0 and boundaries[index] > start:
+            end = boundaries[index]
+        else:
+            # A single sentence longer than the chunk; fall back to whitespace
+            end = text.rfind(' ', start + 1, limit) + 1 or limit
+        spans.append((start, end))
+        start = end
+    return spans
+
+
+class CheckResult:
+    # All matches for one text, sorted by offset so that the matches of any
+    # sentence can be found with a binary search on its character span
+    def __init__(self, matches):
+        self.matches = sorted(matches, key=lambda match: match.offset)
+        self.offsets = [match.offset for match in self.matches]
+
+    def for_span(self, start, end):
+        low = bisect.bisect_left(self.offsets, start)
+        high = bisect.bisect_left(self.offsets, end)
+        return self.matches[low:high]
+
+    def messages(self):
+        return [match.message for match in self.matches]
+
+
+class BatchedChecker:
+    # Sends a document to LanguageTool in a few large chunks instead of one
+    # request per sentence
+    def __init__(self, tool, chunk_chars=20000):
+        self.tool = tool
+        self.chunk_chars = chunk_chars
+
+    @timed('languagetool')
+    def check(self, text, boundaries=None):
+        matches = []
+        for start, end in chunk_spans(text, self.chunk_chars, boundaries):
+            for match in self.tool.check(text[start:end]):
+                matches.append(CheckedMatch(
+                    offset=start + match.offset,
+                    length=match.errorLength,
+                    message=match.message,
+                    replacements=list(match.replacements),
+                    rule_id=match.ruleId,
+                ))
+        return CheckResult(matches)
+
+    def check_many(self, texts):
+        # Check several independent texts (e.g. edited sentences) in as few
+        # requests as possible; each result has offsets relative to its text
+        separator = '\n\n'
+        spans = []
+        position = 0
+        for text in texts:
+            spans.append((position, position + len(text)))
+            position += len(text) + len(separator)
+        combined = self.check(separator.join(texts), boundaries=[end + len(separator) for _, end in spans])
+
+        results = []
+        for start, end in spans:
+            results.append(CheckResult([
+                match._replace(offset=match.offset - start) for match in combined.for_span(start, end)
+            ]))
+        return results
+
+
+# Offline stand-in for the LanguageTool server. It implements the part of the
+# language_tool_python API the app uses (check() returning matches) with a few
+# regex rules, so the pipeline can run and be benchmarked without Java.
+LocalMatch = namedtuple('LocalMatch', ['offset', 'errorLength', 'message', 'replacements', 'ruleId'])
+
+LOCAL_RULES = [
+    ('EN_REPEATED_WORDS', re.compile(r'\b(\w+)\s+\1\b', re.IGNORECASE),
+     'Possible typo: you repeated a word', lambda m: [m.group(1)]),
+    ('EN_A_LOT', re.compile(r'\balot\b', re.IGNORECASE),
+     "Did you mean 'a lot'? 'alot' is a misspelling", lambda m: ['a lot']),
+    ('EN_COULD_OF', re.compile(r'\b(could|would|should) of\b', re.IGNORECASE),
+     "Did you mean 'could have'? 'could of' is a common mistake", lambda m: [m.group(1) + ' have']),
+    ('EN_IRREGARDLESS', re.compile(r'\birregardless\b', re.IGNORECASE),
+     "'irregardless' is nonstandard, use 'regardless'", lambda m: ['regardless']),
+]
+
+
+class LocalLanguageTool:
+    def __init__(self, language='en-US', latency=0.0):
+        self.language = language
+        # Simulated cost of one round trip to the server, in seconds
+        self.latency = latency
+        self.requests = 0
+
+    def check(self, text):
+        self.requests += 1
+        if self.latency:
+            time.sleep(self.latency)
+        matches = []
+        for rule_id, pattern, message, replacements in LOCAL_RULES:
+            for m in pattern.finditer(text):
+                matches.append(LocalMatch(m.start(), m.end() - m.start(), message, replacements(m), rule_id))
+        matches.sort(key=lambda match: match.offset)
+        return matches
+
+    def close(self):
+        pass
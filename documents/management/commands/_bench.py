@@ -0,0 +1,62 @@
+import time
+
+# Sample paragraph used to build benchmark documents; it mixes passive voice,
+# long sentences, casual and complex words, entities and redundant phrases
+SAMPLE_PARAGRAPH = (
+    "The report was written by the team at Acme Corp in New York. "
+    "In order to facilitate the review, we will commence the analysis at this point in time "
+    "and utilize the data that was collected by John Doe over the last three months, "
+    "which is really a large number of records that have been gathered from many sources. "
+    "Their results were kinda awesome, but the stuff we found needs more work. "
+    "Due to the fact that the deadline is close, we should expedite the process. "
+    "Alot of the findings are sufficient to ascertain the trend.\n"
+)
+
+# Roughly one printed page of text
+WORDS_PER_PAGE = 500
+
+
+def sample_text(pages):
+    words_per_paragraph = len(SAMPLE_PARAGRAPH.split())
+    paragraphs = max(1, (pages * WORDS_PER_PAGE) // words_per_paragraph)
+    return SAMPLE_PARAGRAPH * paragraphs
+
+
+def load_text(options):
+    if options.get('file'):
+        with open(options['file'], 'r', encoding='utf-8') as file:
+            return file.read()
+    return sample_text(options['pages'])
+
+
+def add_text_arguments(parser, pages=20):
+    parser.add_argument('--file', help='Benchmark a text file instead of the generated sample')
+    parser.add_argument('--pages', type=int, default=pages, help='Size of the generated sample in pages')
+    parser.add_argument('--repeat', type=int, default=3, help='Number of timed runs, the best one is reported')
+
+
+def best_of(repeat, func, *args, **kwargs):
+    # Run func repeat times and return the last result with the fastest wall time
+    best = None
+    result = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = func(*args, **kwargs)
+        elapsed = time.perf_counter() - start
+        if best is None or elapsed < best:
+            best = elapsed
+    return result, best
+
+
+class CallCounter:
+    # Wraps a callable (e.g. the spaCy pipeline) and counts how often it is called
+    def __init__(self, wrapped):
+        self.wrapped = wrapped
+        self.calls = 0
+
+    def __call__(self, *args, **kwargs):
+        self.calls += 1
+        return self.wrapped(*args, **kwargs)
+
+    def __getattr__(self, name):
+        return getattr(self.wrapped, name)
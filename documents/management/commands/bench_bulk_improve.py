@@ -0,0 +1,62 @@
+import multiprocessing
+import random
+import re
+import time
+
+from django.core.management.base import BaseCommand
+
+from documents.registry import registry
+from ._bench import add_text_arguments, load_text
+
+
+def make_corpus(text, documents):
+    # Every document gets the sentences in its own order, so documents do not
+    # share identical correction windows
+    sentences = re.split(r'(?<=[.!?])\s+', text.strip())
+    corpus = []
+    for index in range(documents):
+        rng = random.Random(index)
+        shuffled = sentences[:]
+        rng.shuffle(shuffled)
+        corpus.append(' '.join(shuffled))
+    return corpus
+
+
+def analyze(corrected_text):
+    from documents.nlp_utils import analyze_corrected_content
+    return analyze_corrected_content(corrected_text)
+
+
+class Command(BaseCommand):
+    help = 'Measure improvement throughput in documents/minute, one document at a time vs. batched across documents'
+
+    def add_arguments(self, parser):
+        add_text_arguments(parser, pages=1)
+        parser.add_argument('--documents', type=int, default=100, help='Number of documents in the batch')
+        parser.add_argument('--processes', type=int, default=multiprocessing.cpu_count(), help='Pool size for the analyzers')
+
+    def report(self, label, documents, elapsed):
+        self.stdout.write(f"{label:<28} {elapsed:8.1f}s {documents * 60 / elapsed:8.1f} documents/minute")
+
+    def handle(self, *args, **options):
+        from documents.nlp_utils import correct_documents, improve_document_content
+
+        corpus = make_corpus(load_text(options), options['documents'])
+        self.stdout.write(f"{len(corpus)} documents of about {len(corpus[0])} characters")
+        # Model loading is not part of the measurement
+        registry.warm()
+
+        start = time.perf_counter()
+        for text in corpus:
+            improve_document_content(text)
+        self.report('one document at a time', len(corpus), time.perf_counter() - start)
+
+        # What run_improvement_worker does with a batch of claimed jobs
+        start = time.perf_counter()
+        corrected = correct_documents(corpus)
+        correction_time = time.perf_counter() - start
+        with multiprocessing.Pool(options['processes']) as pool:
+            pool.map(analyze, corrected)
+        elapsed = time.perf_counter() - start
+        self.report(f"batched, {options['processes']} processes", len(corpus), elapsed)
+        self.stdout.write(f"  of which grammar correction {correction_time:.1f}s")
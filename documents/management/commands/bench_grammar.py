@@ -0,0 +1,43 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from documents.correction import GrammarCorrector
+from ._bench import add_text_arguments, best_of, load_text
+
+
+class Command(BaseCommand):
+    help = 'Measure grammar correction throughput (tokens/sec on CPU) for the windowed, batched engine'
+
+    def add_arguments(self, parser):
+        add_text_arguments(parser, pages=1)
+        parser.add_argument('--batch-sizes', default='1,4,8', help='Comma separated batch sizes to compare')
+        parser.add_argument('--max-window-tokens', type=int, default=settings.GRAMMAR_MAX_WINDOW_TOKENS)
+
+    def handle(self, *args, **options):
+        from documents.grammar_models import load_pipeline
+
+        text = load_text(options)
+        grammar_corrector = load_pipeline(settings.GRAMMAR_BACKEND)
+        engine = GrammarCorrector(grammar_corrector, max_window_tokens=options['max_window_tokens'])
+        input_tokens = sum(engine.count_tokens([text]))
+        self.stdout.write(f"Text: {len(text)} chars, {input_tokens} tokens, {settings.GRAMMAR_BACKEND} backend")
+
+        # Previous behaviour: the whole text in one call, truncated by the model
+        output, elapsed = best_of(
+            options['repeat'],
+            lambda: grammar_corrector(text, max_length=512)[0]['generated_text'],
+        )
+        output_tokens = sum(engine.count_tokens([output]))
+        self.stdout.write(
+            f"{'single call':<16} wall={elapsed:.2f}s output_tokens={output_tokens:<6} "
+            f"tokens/sec={output_tokens / elapsed:.1f} (output is {output_tokens * 100 // max(input_tokens, 1)}% of input)"
+        )
+
+        for batch_size in [int(size) for size in options['batch_sizes'].split(',')]:
+            engine.batch_size = batch_size
+            output, elapsed = best_of(options['repeat'], engine.correct, text)
+            output_tokens = sum(engine.count_tokens([output]))
+            self.stdout.write(
+                f"{'batch_size=' + str(batch_size):<16} wall={elapsed:.2f}s output_tokens={output_tokens:<6} "
+                f"tokens/sec={output_tokens / elapsed:.1f} windows={len(engine.build_windows(text))}"
+            )
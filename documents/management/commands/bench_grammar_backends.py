@@ -0,0 +1,93 @@
+import difflib
+import json
+import subprocess
+import sys
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from documents.grammar_models import BACKENDS
+
+# Fixed set of sentences with typical mistakes, so runs are comparable
+TEXTS = [
+    "The report were written by the team at Acme Corp in New York.",
+    "Their results was kinda awesome, but the stuff we found needs more work.",
+    "Alot of the findings are sufficient to ascertain the trend.",
+    "He don't know how many records has been gathered from the sources.",
+    "We should of started the analysis earlier in the year.",
+    "Each of the managers have approved there budget for next quarter.",
+    "The data shows that less people are using the old system then before.",
+    "She have been working on this project since three years.",
+    "Due to the fact that the deadline is close, we should expedite the process.",
+    "Me and him went to the meeting but nobody were there.",
+    "The results of the survey is going to be publish next week.",
+    "If I would have known about the issue, I would fix it immediately.",
+    "Its important that every employee complete the training on time.",
+    "The company have decided to move it's headquarters to Boston.",
+    "There is many reasons why the project was delayed by the vendor.",
+    "Irregardless of the outcome, the team learned alot from the experience.",
+]
+
+# Runs in a fresh interpreter, so every backend is measured with its own RSS
+PROBE = '''
+import json, os, resource, sys, time
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'src.settings')
+import django
+django.setup()
+from django.conf import settings
+from documents.correction import GrammarCorrector
+from documents.grammar_models import load_pipeline
+texts = json.loads(sys.stdin.read())
+start = time.perf_counter()
+pipeline = load_pipeline(sys.argv[1])
+load_seconds = time.perf_counter() - start
+engine = GrammarCorrector(pipeline, max_window_tokens=settings.GRAMMAR_MAX_WINDOW_TOKENS, batch_size=settings.GRAMMAR_BATCH_SIZE)
+engine.correct_many(texts[:1])
+best = None
+for _ in range(int(sys.argv[2])):
+    start = time.perf_counter()
+    outputs = engine.correct_many(texts)
+    elapsed = time.perf_counter() - start
+    best = elapsed if best is None else min(best, elapsed)
+print(json.dumps({
+    'load_seconds': load_seconds,
+    'seconds': best,
+    'output_tokens': sum(engine.count_tokens(outputs)),
+    'max_rss_mb': resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024,
+    'outputs': outputs,
+}))
+'''
+
+
+class Command(BaseCommand):
+    help = 'Compare grammar model backends on a fixed text set: tokens/sec, RSS and agreement with full precision'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--backends', default=','.join(BACKENDS), help='Comma separated backends to compare')
+        parser.add_argument('--repeat', type=int, default=3, help='Number of timed runs, the best one is reported')
+
+    def handle(self, *args, **options):
+        reference = None
+        for backend in options['backends'].split(','):
+            completed = subprocess.run(
+                [sys.executable, '-c', PROBE, backend, str(options['repeat'])],
+                input=json.dumps(TEXTS), cwd=settings.BASE_DIR, capture_output=True, text=True,
+            )
+            if completed.returncode != 0:
+                error = (completed.stderr.strip().splitlines() or [f"exit status {completed.returncode}"])[-1]
+                self.stdout.write(f"{backend:<8} failed: {error}")
+                continue
+            run = json.loads(completed.stdout.strip().splitlines()[-1])
+            # Agreement is measured against the first backend, by default the
+            # full precision model
+            if reference is None:
+                reference = run['outputs']
+            exact = sum(a == b for a, b in zip(reference, run['outputs']))
+            similarity = sum(
+                difflib.SequenceMatcher(None, a, b).ratio() for a, b in zip(reference, run['outputs'])
+            ) / len(TEXTS)
+            self.stdout.write(
+                f"{backend:<8} load={run['load_seconds']:.1f}s wall={run['seconds']:.2f}s "
+                f"tokens/sec={run['output_tokens'] / run['seconds']:.1f} rss={run['max_rss_mb']:.0f}MB "
+                f"identical={exact}/{len(TEXTS)} similarity={similarity:.3f}"
+            )
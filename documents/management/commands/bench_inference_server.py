@@ -0,0 +1,120 @@
+import multiprocessing
+import os
+import resource
+import subprocess
+import sys
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from documents.inference import client_for
+from ._bench import add_text_arguments, load_text
+
+
+def warm(ready):
+    # Pool initializer: models (or, with the server, its clients) are loaded
+    # before the clock starts
+    from documents.registry import registry
+    registry.warm()
+    ready.release()
+
+
+def numbered(text, count):
+    # Numbered paragraphs, so no two documents share a window and every
+    # window reaches the model
+    paragraphs = text.splitlines(keepends=True)
+    return [
+        ''.join(f"Item {number}.{index}: {paragraph}" for index, paragraph in enumerate(paragraphs))
+        for number in range(count)
+    ]
+
+
+def improve(text):
+    from documents.nlp_utils import improve_document_content
+    improved_content, suggestions = improve_document_content(text)
+    return improved_content, len(suggestions), resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+def rss_mb(pid):
+    with open(f'/proc/{pid}/status') as status:
+        for line in status:
+            if line.startswith('VmRSS:'):
+                return int(line.split()[1]) / 1024
+    return 0.0
+
+
+class Command(BaseCommand):
+    help = 'Compare in-process models with the shared inference server under concurrent clients'
+
+    def add_arguments(self, parser):
+        add_text_arguments(parser, pages=2)
+        parser.add_argument('--clients', default='1,2,4,8', help='Comma separated numbers of concurrent client processes')
+        parser.add_argument('--documents', type=int, default=4, help='Documents improved by each client')
+        parser.add_argument(
+            '--max-wait-ms', default=f'0,{settings.INFERENCE_MAX_WAIT_MS:g}',
+            help='Comma separated server max waits to compare',
+        )
+        parser.add_argument('--max-batch', type=int, default=settings.INFERENCE_MAX_BATCH)
+        parser.add_argument('--no-baseline', action='store_true', help='Skip the in-process models runs')
+
+    def run_clients(self, label, clients, texts, reference):
+        ready = multiprocessing.Semaphore(0)
+        with multiprocessing.Pool(clients, initializer=warm, initargs=(ready,)) as pool:
+            for _ in range(clients):
+                ready.acquire()
+            start = time.perf_counter()
+            results = pool.map(improve, texts, chunksize=1)
+            elapsed = time.perf_counter() - start
+        identical = 'yes' if reference is None or [result[:2] for result in results] == reference else 'NO'
+        self.stdout.write(
+            f"{label:<20} clients={clients:<3} {elapsed:7.2f}s docs/sec={len(results) / elapsed:6.2f} "
+            f"client_rss={max(result[2] for result in results):5.0f}MB identical={identical}"
+        )
+        return [result[:2] for result in results]
+
+    def start_server(self, address, max_wait_ms, max_batch):
+        server = subprocess.Popen(
+            [sys.executable, 'manage.py', 'run_inference_server', '--address', address,
+             '--max-wait-ms', str(max_wait_ms), '--max-batch', str(max_batch)],
+            cwd=settings.BASE_DIR, stdout=subprocess.PIPE, text=True,
+        )
+        for line in server.stdout:
+            if line.startswith('Inference server listening'):
+                return server
+        server.wait()
+        raise CommandError(f"Inference server exited with status {server.returncode}")
+
+    def handle(self, *args, **options):
+        if not settings.INFERENCE_SERVER_AUTHKEY:
+            raise CommandError("Set INFERENCE_SERVER_AUTHKEY; the benchmark's server and clients share it")
+        text = load_text(options)
+        sizes = [int(size) for size in options['clients'].split(',')]
+        texts = {clients: numbered(text, clients * options['documents']) for clients in sizes}
+        self.stdout.write(f"Text: {len(text)} chars, {options['documents']} documents per client")
+
+        references = {}
+        if not options['no_baseline']:
+            settings.INFERENCE_SERVER = ''
+            for clients in sizes:
+                references[clients] = self.run_clients('in-process', clients, texts[clients], None)
+
+        address = f'unix:/tmp/bench-inference-{os.getpid()}.sock'
+        settings.INFERENCE_SERVER = address
+        for max_wait_ms in options['max_wait_ms'].split(','):
+            server = self.start_server(address, max_wait_ms, options['max_batch'])
+            try:
+                client = client_for(address)
+                for clients in sizes:
+                    before = client.call('stats')['grammar']
+                    self.run_clients(f"server wait={max_wait_ms}ms", clients, texts[clients], references.get(clients))
+                    after = client.call('stats')['grammar']
+                    batches = after['batches'] - before['batches']
+                    self.stdout.write(
+                        f"{'':<20} grammar batches={batches} "
+                        f"windows/batch={(after['items'] - before['items']) / max(batches, 1):.1f} "
+                        f"server_rss={rss_mb(server.pid):.0f}MB"
+                    )
+            finally:
+                server.terminate()
+                server.wait()
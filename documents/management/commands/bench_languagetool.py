@@ -0,0 +1,70 @@
+import re
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from documents.languagetool import BatchedChecker, LocalLanguageTool
+from ._bench import add_text_arguments, best_of, load_text
+
+
+class CountingTool:
+    def __init__(self, tool):
+        self.tool = tool
+        self.requests = 0
+
+    def check(self, text):
+        self.requests += 1
+        return self.tool.check(text)
+
+
+def legacy_check(tool, text, sentences):
+    # Previous behaviour: one request per sentence in check_syntax, then one
+    # more for the whole text in fix_grammar_and_spelling
+    matches = []
+    for sentence in sentences:
+        matches.extend(tool.check(sentence))
+    return matches + list(tool.check(text))
+
+
+def batched_check(checker, text):
+    return checker.check(text).matches
+
+
+class Command(BaseCommand):
+    help = 'Compare LanguageTool round trips and wall time of per-sentence and batched checking'
+
+    def add_arguments(self, parser):
+        add_text_arguments(parser, pages=5)
+        parser.add_argument('--backend', choices=['local', 'server'], default='local',
+                            help="'local' uses the offline stand-in, 'server' the Java LanguageTool server")
+        parser.add_argument('--latency', type=float, default=0.005,
+                            help='Simulated round trip time of the local stand-in, in seconds')
+
+    def handle(self, *args, **options):
+        text = load_text(options)
+        sentences = [s for s in re.split(r'(?<=[.!?])\s+|\n+', text) if s.strip()]
+
+        if options['backend'] == 'local':
+            tool = LocalLanguageTool('en-US', latency=options['latency'])
+        else:
+            import language_tool_python
+            tool = language_tool_python.LanguageTool('en-US')
+
+        try:
+            self.stdout.write(f"Text: {len(text)} chars, {len(sentences)} sentences")
+            counting_tool = CountingTool(tool)
+            matches, elapsed = best_of(options['repeat'], legacy_check, counting_tool, text, sentences)
+            self.stdout.write(
+                f"{'per-sentence':<14} requests/run={counting_tool.requests // options['repeat']:<6} "
+                f"wall={elapsed:.3f}s matches={len(matches)}"
+            )
+
+            counting_tool.requests = 0
+            checker = BatchedChecker(counting_tool, chunk_chars=settings.LANGUAGETOOL_CHUNK_CHARS)
+            matches, elapsed = best_of(options['repeat'], batched_check, checker, text)
+            self.stdout.write(
+                f"{'batched':<14} requests/run={counting_tool.requests // options['repeat']:<6} "
+                f"wall={elapsed:.3f}s matches={len(matches)}"
+            )
+        finally:
+            tool.close()
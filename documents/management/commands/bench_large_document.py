@@ -0,0 +1,54 @@
+import multiprocessing
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from documents.registry import registry
+from ._bench import add_text_arguments, load_text
+
+
+def analyze_shard(shard_text):
+    from documents.nlp_utils import analyze_shard
+    return analyze_shard(shard_text)
+
+
+class Command(BaseCommand):
+    help = 'Measure the sharded analysis of a large document with an increasing number of processes'
+
+    def add_arguments(self, parser):
+        add_text_arguments(parser, pages=300)
+        parser.add_argument(
+            '--processes', default='1,2,4,8,16',
+            help='Comma separated pool sizes; sizes above the CPU count are skipped',
+        )
+
+    def handle(self, *args, **options):
+        from documents.nlp_utils import finish_sharded_analysis, shard_spans
+
+        text = load_text(options)
+        spans = shard_spans(text)
+        shards = [text[start:end] for start, end in spans]
+        self.stdout.write(
+            f"Text: {len(text)} chars, {len(text.split())} words, "
+            f"{len(shards)} shards of about {settings.DOCUMENT_SHARD_CHARS} chars"
+        )
+        # Loaded before forking, as run_improvement_worker --preload does
+        registry.warm(['spacy', 'languagetool'])
+
+        baseline = None
+        sizes = [int(size) for size in options['processes'].split(',')]
+        for processes in [size for size in sizes if size <= multiprocessing.cpu_count()]:
+            with multiprocessing.Pool(processes) as pool:
+                best = None
+                for _ in range(options['repeat']):
+                    start = time.perf_counter()
+                    results = pool.map(analyze_shard, shards, chunksize=1)
+                    _, suggestions = finish_sharded_analysis(text, spans, results)
+                    elapsed = time.perf_counter() - start
+                    best = elapsed if best is None else min(best, elapsed)
+            baseline = baseline or best
+            self.stdout.write(
+                f"{processes:>3} processes {best:8.2f}s speedup={baseline / best:5.2f}x "
+                f"suggestions={len(suggestions)}"
+            )
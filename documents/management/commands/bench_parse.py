@@ -0,0 +1,57 @@
+from django.core.management.base import BaseCommand
+
+from documents import nlp_utils
+from ._bench import CallCounter, add_text_arguments, best_of, load_text
+
+
+def legacy_analysis(text):
+    # Previous behaviour: every analyzer parsed the text with the full pipeline
+    suggestions = []
+    doc = nlp_utils.nlp(text)
+    suggestions.extend(nlp_utils.analyze_sentences(doc))
+    suggestions.extend(nlp_utils.analyze_entities(doc))
+    suggestions.extend(nlp_utils.analyze_style_and_tone(nlp_utils.nlp(text)))
+    suggestions.extend(nlp_utils.improve_clarity_and_conciseness(nlp_utils.nlp(text)))
+    return suggestions
+
+
+def staged_analysis(text):
+    return nlp_utils.run_stages(nlp_utils.parse(text))
+
+
+def token_only_analysis(text):
+    stages = [nlp_utils.STYLE_STAGE, nlp_utils.CLARITY_STAGE]
+    return nlp_utils.run_stages(nlp_utils.parse(text, stages), stages)
+
+
+class Command(BaseCommand):
+    help = 'Compare spaCy parse count and wall time of the legacy and single-parse analysis'
+
+    def add_arguments(self, parser):
+        add_text_arguments(parser)
+
+    def handle(self, *args, **options):
+        text = load_text(options)
+        repeat = options['repeat']
+
+        # LanguageTool is benchmarked separately, keep it out of the parse numbers
+        original_check_syntax = nlp_utils.check_syntax
+        original_nlp = nlp_utils.nlp
+        nlp_utils.check_syntax = lambda sentence: []
+        try:
+            self.stdout.write(f"Text: {len(text)} chars, {len(text.split())} words")
+            for label, analysis in (
+                ('legacy (parse per analyzer)', legacy_analysis),
+                ('single parse, all stages', staged_analysis),
+                ('token-only stages', token_only_analysis),
+            ):
+                counter = CallCounter(original_nlp)
+                nlp_utils.nlp = counter
+                suggestions, elapsed = best_of(repeat, analysis, text)
+                self.stdout.write(
+                    f"{label:<30} parses/run={counter.calls // repeat:<3} "
+                    f"wall={elapsed:.3f}s suggestions={len(suggestions)}"
+                )
+        finally:
+            nlp_utils.nlp = original_nlp
+            nlp_utils.check_syntax = original_check_syntax
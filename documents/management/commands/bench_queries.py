@@ -0,0 +1,93 @@
+import random
+import time
+
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand
+from django.db import connection, transaction
+
+from documents.models import Content, Document
+
+STATUSES = ['uploaded', 'approved', 'rejected', 'improved']
+
+
+def seed(users, documents, batch_size=5000):
+    # Users named bench-user-N own the documents; rerunning tops them up
+    existing_users = User.objects.filter(username__startswith='bench-user-').count()
+    User.objects.bulk_create(
+        [User(username=f'bench-user-{index}') for index in range(existing_users, users)],
+        batch_size=batch_size,
+    )
+    user_ids = list(User.objects.filter(username__startswith='bench-user-').values_list('id', flat=True))
+
+    rng = random.Random(0)
+    existing = Document.objects.filter(user_id__in=user_ids).count()
+    for start in range(existing, documents, batch_size):
+        count = min(batch_size, documents - start)
+        with transaction.atomic():
+            Document.objects.bulk_create([
+                Document(user_id=rng.choice(user_ids), status=rng.choice(STATUSES), file_name=f'bench-{start + index}.txt')
+                for index in range(count)
+            ])
+            new_ids = Document.objects.filter(content__isnull=True).values_list('id', flat=True)
+            body = 'Benchmark document body. ' * 40
+            Content.objects.bulk_create(
+                [Content(document_id=document_id, original_content=body, excerpt=body[:200]) for document_id in new_ids],
+                batch_size=batch_size,
+            )
+    return user_ids
+
+
+def hot_queries(user_id, document_id):
+    return [
+        ('listing page', Document.objects.filter(user_id=user_id, content__isnull=False).select_related('content')
+            .defer('content__original_content', 'content__improved_content')
+            .order_by('-upload_date', '-id')[:50]),
+        ('content by document', Content.objects.filter(document_id=document_id)),
+        ('approved count', Document.objects.filter(status='approved')),
+    ]
+
+
+class Command(BaseCommand):
+    help = 'Seed documents and show query plans and timings of the hot lookups with and without the indexes'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--users', type=int, default=100)
+        parser.add_argument('--documents', type=int, default=100000)
+        parser.add_argument('--repeat', type=int, default=20, help='Timed runs per query, the best one is reported')
+
+    def run_queries(self, user_id, document_id, repeat):
+        for label, queryset in hot_queries(user_id, document_id):
+            plan = queryset.explain().replace('\n', '\n      ')
+            self.stdout.write(f"  {label}\n      {plan}")
+            best = None
+            for _ in range(repeat):
+                start = time.perf_counter()
+                # .all() gives a fresh queryset so nothing comes from its cache
+                if label == 'approved count':
+                    queryset.all().count()
+                else:
+                    list(queryset.all())
+                elapsed = time.perf_counter() - start
+                best = elapsed if best is None else min(best, elapsed)
+            self.stdout.write(f"      best of {repeat}: {best * 1000:.2f}ms")
+
+    def handle(self, *args, **options):
+        self.stdout.write(f"Seeding {options['documents']} documents on {connection.vendor}...")
+        user_ids = seed(options['users'], options['documents'])
+        user_id = user_ids[len(user_ids) // 2]
+        document_id = Document.objects.order_by('-id').values_list('id', flat=True).first()
+
+        indexes = Document._meta.indexes
+        self.stdout.write("Without the documents indexes:")
+        with connection.schema_editor() as editor:
+            for index in indexes:
+                editor.remove_index(Document, index)
+        try:
+            self.run_queries(user_id, document_id, options['repeat'])
+        finally:
+            with connection.schema_editor() as editor:
+                for index in indexes:
+                    editor.add_index(Document, index)
+
+        self.stdout.write("With the documents indexes:")
+        self.run_queries(user_id, document_id, options['repeat'])
@@ -0,0 +1,65 @@
+import itertools
+import time
+
+from django.core.management.base import BaseCommand
+
+from documents.readability import analyze_readability
+from ._bench import add_text_arguments, best_of, load_text
+
+INDICES = ['flesch_kincaid_grade', 'gunning_fog', 'flesch_reading_ease', 'smog_index']
+
+runs = itertools.count()
+
+
+def textstat_scores(text):
+    # The previous path: four textstat calls with their own word, syllable
+    # and sentence passes
+    import textstat
+    # textstat memoises its counts by text; trailing spaces, which change no
+    # count, make every run a cache miss
+    text = text + ' ' * next(runs)
+    return {name: getattr(textstat, name)(text) for name in INDICES}
+
+
+def single_pass_scores(text):
+    counts, _ = analyze_readability(text)
+    return counts.scores()
+
+
+def single_pass_sections(text):
+    counts, sections = analyze_readability(text, sections=True)
+    return counts.scores(), [section.scores() for _, _, section in sections]
+
+
+class Command(BaseCommand):
+    help = 'Compare the readability scores of the single-pass engine with textstat, for speed and agreement'
+
+    def add_arguments(self, parser):
+        add_text_arguments(parser)
+
+    def report(self, label, elapsed, words):
+        self.stdout.write(f"{label:<24} {elapsed * 1000:9.1f}ms {words / elapsed:12.0f} words/sec")
+
+    def handle(self, *args, **options):
+        text = load_text(options)
+        words = len(text.split())
+        self.stdout.write(f"Text: {len(text)} chars, {words} words")
+
+        # Dictionaries and word lists are loaded outside the measurement
+        textstat_scores('Warming up the readability dictionaries.')
+        single_pass_scores('Warming up the readability dictionaries.')
+
+        expected, elapsed = best_of(options['repeat'], textstat_scores, text)
+        self.report('textstat', elapsed, words)
+
+        # The syllable memo survives between documents, like in the worker
+        start = time.perf_counter()
+        scores = single_pass_scores(text)
+        self.report('single pass (cold)', time.perf_counter() - start, words)
+        scores, elapsed = best_of(options['repeat'], single_pass_scores, text)
+        self.report('single pass (memo)', elapsed, words)
+        (_, sections), elapsed = best_of(options['repeat'], single_pass_sections, text)
+        self.report(f'with {len(sections)} sections', elapsed, words)
+
+        for name in INDICES:
+            self.stdout.write(f"{name:<24} textstat {expected[name]:9.4f}  single pass {scores[name]:9.4f}")
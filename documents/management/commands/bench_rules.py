@@ -0,0 +1,69 @@
+import json
+import random
+import re
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from documents.rules import RuleMatcher
+from ._bench import add_text_arguments, best_of, load_text
+
+
+def synthetic_config(rules, seed=0):
+    # Real config.json rules plus generated words and phrases up to `rules`
+    with open(settings.NLP_CONFIG_PATH, 'r') as file:
+        config = json.load(file)
+    rng = random.Random(seed)
+    letters = 'abcdefghijklmnopqrstuvwxyz'
+
+    def word():
+        return ''.join(rng.choice(letters) for _ in range(rng.randint(4, 9)))
+
+    per_set = rules // 3
+    for _ in range(per_set):
+        config['redundant_phrases'][' '.join(word() for _ in range(rng.randint(2, 4)))] = word()
+        config['complex_words'][word()] = word()
+        config['casual_words'].append(word())
+    return config
+
+
+def legacy_rules(config, text, tokens):
+    # Previous behaviour: a substring scan per phrase, then dict/list probes
+    # per token (casual_words is a list, so each probe is linear)
+    hits = 0
+    for phrase in config['redundant_phrases']:
+        if phrase in text:
+            hits += 1
+    complex_words = config['complex_words']
+    casual_words = config['casual_words']
+    for token in tokens:
+        if token.lower() in complex_words:
+            hits += 1
+        if token.lower() in casual_words:
+            hits += 1
+    return hits
+
+
+class Command(BaseCommand):
+    help = 'Compare per-rule scanning with the compiled single-pass rule matcher'
+
+    def add_arguments(self, parser):
+        add_text_arguments(parser, pages=20)
+        parser.add_argument('--rules', type=int, default=10000, help='Total number of rules in the generated config')
+
+    def handle(self, *args, **options):
+        text = load_text(options)
+        config = synthetic_config(options['rules'])
+        rule_count = len(config['redundant_phrases']) + len(config['complex_words']) + len(config['casual_words'])
+        # Stand-in for the spaCy tokens the legacy checks iterated over
+        tokens = re.findall(r"\w+|[^\w\s]", text)
+        self.stdout.write(f"Text: {len(text)} chars, {len(tokens)} tokens, {rule_count} rules")
+
+        hits, elapsed = best_of(options['repeat'], legacy_rules, config, text, tokens)
+        self.stdout.write(f"{'legacy scans':<18} wall={elapsed:.3f}s hits={hits}")
+
+        matcher, elapsed = best_of(1, RuleMatcher.from_config, config)
+        self.stdout.write(f"{'compile matcher':<18} wall={elapsed:.3f}s states={len(matcher.goto)}")
+
+        matches, elapsed = best_of(options['repeat'], matcher.find, text)
+        self.stdout.write(f"{'compiled matcher':<18} wall={elapsed:.3f}s hits={len(matches)}")
@@ -0,0 +1,102 @@
+import random
+import statistics
+import time
+
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from documents.models import Document, SearchEntry
+from documents.search import search
+from documents.statistics import DOCUMENTS, adjust_counters, status_counter
+from ._bench import SAMPLE_PARAGRAPH
+
+BENCH_USER = 'bench-search'
+SYLLABLES = ['ka', 'lo', 'mi', 'ne', 'ru', 'sa', 'ti', 'vo', 'ze', 'pa', 'qu', 'dra', 'sten', 'mor', 'vil']
+
+
+def vocabulary(size, seed=0):
+    # The words of the sample paragraph plus made-up words; drawn with Zipf
+    # weights so queries range from very common to rare terms
+    rng = random.Random(seed)
+    words = list(dict.fromkeys(word.strip('.,').lower() for word in SAMPLE_PARAGRAPH.split()))
+    while len(words) < size:
+        word = ''.join(rng.choice(SYLLABLES) for _ in range(rng.randint(2, 4)))
+        if word not in words:
+            words.append(word)
+    weights = [1 / (rank + 1) for rank in range(len(words))]
+    return words, weights
+
+
+def make_text(rng, words, weights, length):
+    sentences = []
+    for _ in range(max(1, length // 12)):
+        sentence = rng.choices(words, weights, k=12)
+        sentences.append(' '.join(sentence).capitalize() + '.')
+    return ' '.join(sentences)
+
+
+class Command(BaseCommand):
+    help = 'Seed a corpus of documents for one user and measure full-text search latency'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--documents', type=int, default=100000, help='Size of the seeded corpus')
+        parser.add_argument('--words', type=int, default=200, help='Words per seeded document')
+        parser.add_argument('--queries', type=int, default=50, help='Queries per term frequency band')
+        parser.add_argument('--clean', action='store_true', help='Delete the seeded corpus afterwards')
+
+    def seed(self, user, count, words_per_document):
+        words, weights = vocabulary(5000)
+        existing = SearchEntry.objects.filter(user=user).count()
+        rng = random.Random(existing)
+        start = time.perf_counter()
+        batch_size = 1000
+        for offset in range(existing, count, batch_size):
+            size = min(batch_size, count - offset)
+            with transaction.atomic():
+                Document.objects.bulk_create([
+                    Document(user=user, file_name=f'bench-{offset + index}.txt') for index in range(size)
+                ])
+                # bulk_create sends no post_save, so count the documents here
+                adjust_counters({DOCUMENTS: size, status_counter('uploaded'): size})
+                # MySQL cannot return the new ids from a bulk insert
+                document_ids = Document.objects.filter(user=user, search_entry__isnull=True).values_list('id', flat=True)
+                SearchEntry.objects.bulk_create([
+                    SearchEntry(document_id=document_id, user=user,
+                                original_content=make_text(rng, words, weights, words_per_document))
+                    for document_id in document_ids
+                ], batch_size=200)
+        if count > existing:
+            self.stdout.write(f"Seeded {count - existing} documents in {time.perf_counter() - start:.1f}s")
+        return words
+
+    def handle(self, *args, **options):
+        user, _ = User.objects.get_or_create(username=BENCH_USER)
+        words = self.seed(user, options['documents'], options['words'])
+        self.stdout.write(f"Corpus: {SearchEntry.objects.filter(user=user).count()} documents")
+
+        rng = random.Random(1)
+        bands = [
+            ('common term', words[:20]),
+            ('mid term', words[200:1000]),
+            ('rare term', words[3000:]),
+        ]
+        for label, band in bands:
+            for query_label, query_words in ((label, 1), (f"2 x {label}", 2)):
+                latencies = []
+                results = 0
+                for _ in range(options['queries']):
+                    query = ' '.join(rng.sample(band, query_words))
+                    start = time.perf_counter()
+                    hits = search(user, query, 0, 20)
+                    latencies.append(time.perf_counter() - start)
+                    results += len(hits)
+                latencies.sort()
+                self.stdout.write(
+                    f"{query_label:<18} p50={statistics.median(latencies) * 1000:7.1f}ms "
+                    f"p95={latencies[int(len(latencies) * 0.95) - 1] * 1000:7.1f}ms "
+                    f"results/page={results / len(latencies):.1f}"
+                )
+
+        if options['clean']:
+            user.delete()
@@ -0,0 +1,64 @@
+import random
+import re
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from documents.spelling import TOKEN, SymSpellCorrector, TextBlobCorrector, textblob_dictionary_path
+from ._bench import add_text_arguments, best_of, load_text
+
+ALPHABET = 'abcdefghijklmnopqrstuvwxyz'
+
+
+def add_typos(text, rate, seed=0):
+    # Delete, replace, insert or swap one letter in a share of the words
+    rng = random.Random(seed)
+
+    def typo(match):
+        word = match.group()
+        if rng.random() >= rate:
+            return word
+        i = rng.randrange(len(word) - 1)
+        operation = rng.randrange(4)
+        if operation == 0:
+            return word[:i] + word[i + 1:]
+        if operation == 1:
+            return word[:i] + rng.choice(ALPHABET) + word[i + 1:]
+        if operation == 2:
+            return word[:i] + rng.choice(ALPHABET) + word[i:]
+        return word[:i] + word[i + 1] + word[i] + word[i + 2:]
+
+    return re.sub(r'[a-z]{3,}', typo, text)
+
+
+class Command(BaseCommand):
+    help = 'Compare spelling correction throughput (words/sec) of the SymSpell engine and TextBlob'
+
+    def add_arguments(self, parser):
+        add_text_arguments(parser, pages=2)
+        parser.add_argument('--typo-rate', type=float, default=0.1, help='Share of words given a typo')
+
+    def handle(self, *args, **options):
+        text = add_typos(load_text(options), options['typo_rate'])
+        words = sum(1 for token in TOKEN.findall(text) if token[0].isalnum())
+        self.stdout.write(f"Text: {len(text)} chars, {words} words")
+
+        start = time.perf_counter()
+        symspell = SymSpellCorrector.from_file(
+            settings.SPELLING_DICTIONARY or textblob_dictionary_path(),
+            max_distance=settings.SPELLING_MAX_EDIT_DISTANCE,
+        )
+        self.stdout.write(f"SymSpell index built in {time.perf_counter() - start:.2f}s")
+
+        expected, elapsed = best_of(1, TextBlobCorrector().correct, text)
+        self.stdout.write(f"{'textblob':<18} {elapsed:8.2f}s {words / elapsed:10.0f} words/sec")
+
+        # The first run fills the word memo, later runs read from it
+        output, elapsed = best_of(1, symspell.correct, text)
+        self.stdout.write(f"{'symspell (cold)':<18} {elapsed:8.2f}s {words / elapsed:10.0f} words/sec")
+        output, elapsed = best_of(options['repeat'], symspell.correct, text)
+        self.stdout.write(f"{'symspell (memo)':<18} {elapsed:8.2f}s {words / elapsed:10.0f} words/sec")
+
+        differences = sum(a != b for a, b in zip(TOKEN.findall(expected), TOKEN.findall(output)))
+        self.stdout.write(f"Tokens corrected differently from TextBlob: {differences}")
@@ -0,0 +1,46 @@
+import json
+import subprocess
+import sys
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+# Runs in a fresh interpreter and reports its own startup time and peak RSS
+PROBE = '''
+import json, os, resource, sys, time
+start = time.perf_counter()
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'src.settings')
+import django
+django.setup()
+import src.urls
+models = [name for name in sys.argv[1].split(',') if name]
+if models:
+    from documents.registry import registry
+    registry.warm(models)
+print(json.dumps({
+    'seconds': time.perf_counter() - start,
+    'max_rss_mb': resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024,
+}))
+'''
+
+
+class Command(BaseCommand):
+    help = 'Measure process startup time and RSS of a worker, with and without loaded models'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--repeat', type=int, default=3, help='Number of runs per scenario, the fastest is reported')
+
+    def handle(self, *args, **options):
+        scenarios = [('URL conf only', '')] + [(f"+ {name}", name) for name in ('spacy', 'languagetool', 'grammar')]
+        scenarios.append(('+ all models', 'spacy,languagetool,grammar'))
+
+        for label, models in scenarios:
+            runs = []
+            for _ in range(options['repeat']):
+                output = subprocess.run(
+                    [sys.executable, '-c', PROBE, models],
+                    cwd=settings.BASE_DIR, capture_output=True, text=True, check=True,
+                ).stdout
+                runs.append(json.loads(output.strip().splitlines()[-1]))
+            best = min(runs, key=lambda run: run['seconds'])
+            self.stdout.write(f"{label:<16} startup={best['seconds']:.2f}s rss={best['max_rss_mb']:.0f}MB")
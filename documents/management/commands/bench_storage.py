@@ -0,0 +1,82 @@
+import time
+
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand
+from django.db import connection, transaction
+from django.db.models import Sum
+from django.db.models.functions import Length
+
+from documents.fields import compress_text, zstd_module
+from documents.models import Content, Document
+
+from ._bench import add_text_arguments, load_text
+
+# Typical corrections, so the improved body is a near-duplicate of the original
+CORRECTIONS = [('kinda', 'kind of'), ('Alot', 'A lot'), ('utilize', 'use'), ('In order to', 'To')]
+
+
+def improve(text):
+    for old, new in CORRECTIONS:
+        text = text.replace(old, new)
+    return text
+
+
+def codecs():
+    yield 'plain', lambda text: text.encode('utf-8')
+    for level in (1, 6, 9):
+        yield f'zlib-{level}', lambda text, level=level: compress_text(text, 'zlib', level)
+    try:
+        zstd_module()
+    except RuntimeError:
+        return
+    for level in (3, 19):
+        yield f'zstd-{level}', lambda text, level=level: compress_text(text, 'zstd', level)
+
+
+class Command(BaseCommand):
+    help = 'Compare stored size and read latency of document bodies per compression codec (rolled back afterwards)'
+
+    def add_arguments(self, parser):
+        add_text_arguments(parser, pages=5)
+        parser.add_argument('--documents', type=int, default=200, help='Number of documents in the corpus')
+
+    def handle(self, *args, **options):
+        text = load_text(options)
+        improved = improve(text)
+        raw_bytes = options['documents'] * (len(text.encode('utf-8')) + len(improved.encode('utf-8')))
+        self.stdout.write(
+            f"{options['documents']} documents of {len(text)} characters on {connection.vendor}, "
+            f"{raw_bytes / 1024:.0f}KB of text"
+        )
+
+        for name, encode in codecs():
+            with transaction.atomic():
+                user, _ = User.objects.get_or_create(username='bench-storage')
+                documents = [Document.objects.create(user=user, file_name=f'bench-storage-{index}.txt')
+                             for index in range(options['documents'])]
+                # Bytes are stored as they are; plain UTF-8 is read back as text
+                start = time.perf_counter()
+                original, improved_body = encode(text), encode(improved)
+                encode_time = time.perf_counter() - start
+                Content.objects.bulk_create([
+                    Content(document=document, original_content=original, improved_content=improved_body)
+                    for document in documents
+                ])
+
+                queryset = Content.objects.filter(document__in=documents)
+                stored = queryset.aggregate(
+                    size=Sum(Length('original_content')) + Sum(Length('improved_content'))
+                )['size']
+                best = None
+                for _ in range(options['repeat']):
+                    start = time.perf_counter()
+                    for content in queryset.all():
+                        content.original_content, content.improved_content
+                    elapsed = time.perf_counter() - start
+                    best = elapsed if best is None else min(best, elapsed)
+                transaction.set_rollback(True)
+
+            self.stdout.write(
+                f"  {name:8} stored {stored / 1024:9.0f}KB ({stored / raw_bytes:6.1%}), "
+                f"read all {best * 1000:8.2f}ms, encode one {encode_time * 1000:7.2f}ms"
+            )
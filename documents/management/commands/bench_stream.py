@@ -0,0 +1,40 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from documents.registry import registry
+from ._bench import add_text_arguments, load_text
+
+
+class Command(BaseCommand):
+    help = 'Compare time to first suggestion of the streaming pipeline with the full pipeline time'
+
+    def add_arguments(self, parser):
+        add_text_arguments(parser, pages=10)
+
+    def handle(self, *args, **options):
+        from documents.nlp_utils import improve_document_content, iter_document_improvement
+
+        text = load_text(options)
+        self.stdout.write(f"Text: {len(text)} chars")
+        # Model loading is not part of the measurement
+        registry.warm()
+
+        start = time.perf_counter()
+        improved, _ = improve_document_content(text)
+        self.stdout.write(f"{'full pipeline':<24} result after {time.perf_counter() - start:.2f}s")
+
+        start = time.perf_counter()
+        first = None
+        sections = 0
+        for event, data in iter_document_improvement(text):
+            if event == 'section':
+                sections += 1
+                first = first or time.perf_counter() - start
+            else:
+                streamed, _ = data
+        total = time.perf_counter() - start
+        self.stdout.write(
+            f"{'streaming':<24} first suggestions after {first:.2f}s, result after {total:.2f}s "
+            f"({sections} sections, same improved content: {streamed == improved})"
+        )
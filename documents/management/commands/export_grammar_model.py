@@ -0,0 +1,25 @@
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from documents.grammar_models import artifact_dir, export_int8, export_onnx
+
+
+class Command(BaseCommand):
+    help = 'Write the optimized grammar model artifacts (int8 quantized PyTorch or ONNX Runtime) for GRAMMAR_BACKEND'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--backend', choices=['int8', 'onnx'], required=True)
+        parser.add_argument('--model', default=settings.GRAMMAR_MODEL, help='Model to export, default GRAMMAR_MODEL')
+        parser.add_argument('--output', help='Directory to write to, default GRAMMAR_ARTIFACTS_DIR/<backend>')
+        parser.add_argument('--quantize', action='store_true', help='Also quantize the ONNX graphs to int8')
+
+    def handle(self, *args, **options):
+        directory = options['output'] or artifact_dir(options['backend'])
+        start = time.perf_counter()
+        if options['backend'] == 'int8':
+            export_int8(options['model'], directory)
+        else:
+            export_onnx(options['model'], directory, quantize=options['quantize'])
+        self.stdout.write(f"Exported {options['model']} ({options['backend']}) to {directory} in {time.perf_counter() - start:.1f}s")
@@ -0,0 +1,10 @@
+from django.core.management.base import BaseCommand
+
+from documents.search import rebuild_index
+
+
+class Command(BaseCommand):
+    help = 'Rewrite the full-text search index from the stored document contents'
+
+    def handle(self, *args, **options):
+        self.stdout.write(f"Indexed {rebuild_index()} documents")
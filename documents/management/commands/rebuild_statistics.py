@@ -0,0 +1,12 @@
+from django.core.management.base import BaseCommand
+
+from documents.statistics import counter_statistics, rebuild_counters
+
+
+class Command(BaseCommand):
+    help = 'Recount the materialized statistic counters from the users and documents tables'
+
+    def handle(self, *args, **options):
+        rebuild_counters()
+        for name, value in counter_statistics().items():
+            self.stdout.write(f"{name}: {value}")
@@ -0,0 +1,30 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from documents.jobs import run_worker
+from documents.registry import registry
+
+
+class Command(BaseCommand):
+    help = 'Process queued document improvement jobs with a pool of worker processes'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--processes', type=int, default=2, help='Number of worker processes')
+        parser.add_argument(
+            '--batch-size', type=int, default=settings.IMPROVEMENT_BATCH_SIZE,
+            help='Jobs claimed and grammar corrected together',
+        )
+        parser.add_argument('--poll-interval', type=float, default=1.0, help='Seconds between queue polls')
+        parser.add_argument('--once', action='store_true', help='Exit when the queue is empty')
+        parser.add_argument(
+            '--preload', nargs='?', const=','.join(registry.loaders), default=','.join(settings.PRELOAD_MODELS),
+            help='Comma separated models to load before forking (all models when given without a value)',
+        )
+
+    def handle(self, *args, **options):
+        preload = [name for name in options['preload'].split(',') if name]
+        self.stdout.write(f"Starting improvement worker with {options['processes']} processes")
+        run_worker(
+            options['processes'], poll_interval=options['poll_interval'], once=options['once'],
+            preload=preload, batch_size=options['batch_size'],
+        )
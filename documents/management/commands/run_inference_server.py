@@ -0,0 +1,51 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from documents.inference import InferenceError, InferenceServer, require_authkey
+from documents.registry import LOADERS, local_registry
+
+
+class Command(BaseCommand):
+    help = 'Serve the NLP models to the web and worker processes, batching concurrent requests'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--address', default=settings.INFERENCE_SERVER or 'unix:/tmp/inference.sock',
+            help="'unix:/path/to/socket' or 'host:port' (default INFERENCE_SERVER)",
+        )
+        parser.add_argument('--max-batch', type=int, default=settings.INFERENCE_MAX_BATCH, help='Items per batch')
+        parser.add_argument(
+            '--max-wait-ms', type=float, default=settings.INFERENCE_MAX_WAIT_MS,
+            help='How long a request may wait for its batch to fill',
+        )
+        parser.add_argument(
+            '--preload', default=','.join(LOADERS),
+            help='Comma separated models to load before accepting connections (empty for none)',
+        )
+
+    def handle(self, *args, **options):
+        try:
+            require_authkey(settings.INFERENCE_SERVER_AUTHKEY)
+        except InferenceError as e:
+            raise CommandError(str(e))
+        preload = [name for name in options['preload'].split(',') if name]
+        unknown = [name for name in preload if name not in LOADERS]
+        if unknown:
+            raise CommandError(f"Unknown model(s): {', '.join(unknown)}")
+
+        # The server always runs the models itself, whatever INFERENCE_SERVER says
+        models = local_registry()
+        for name in preload:
+            models.get(name)
+            self.stdout.write(f"{name:<14} loaded in {models.load_times[name]:.2f}s")
+
+        server = InferenceServer(models, options['max_batch'], options['max_wait_ms'] / 1000)
+
+        def ready():
+            self.stdout.write(f"Inference server listening on {options['address']}")
+            self.stdout.flush()
+
+        try:
+            server.serve_forever(options['address'], settings.INFERENCE_SERVER_AUTHKEY, ready=ready)
+        except InferenceError as e:
+            raise CommandError(str(e))
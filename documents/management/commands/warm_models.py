@@ -0,0 +1,20 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from documents.registry import registry
+
+
+class Command(BaseCommand):
+    help = 'Load the NLP models (downloading them if needed) and report the load time of each'
+
+    def add_arguments(self, parser):
+        parser.add_argument('models', nargs='*', help=f"Models to load, default all ({', '.join(registry.loaders)})")
+
+    def handle(self, *args, **options):
+        names = options['models'] or list(registry.loaders)
+        unknown = [name for name in names if name not in registry.loaders]
+        if unknown:
+            raise CommandError(f"Unknown model(s): {', '.join(unknown)}")
+
+        for name in names:
+            registry.get(name)
+            self.stdout.write(f"{name:<14} loaded in {registry.load_times[name]:.2f}s")
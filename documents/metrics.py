@@ -0,0 +1,148 @@
+import contextvars
+import functools
+import threading
+import time
+from collections import Counter, defaultdict
+from contextlib import contextmanager
+
+from django.db import connection
+
+from .edits import Suggestion
+from .models import StageMetric
+
+# Per-stage counters, kept in the stage_metrics table (one row per stage) so
+# every process (web, worker, pool) adds to the same totals. Wall time is
+# inclusive: a stage's time contains the stages it calls.
+FIELDS = {
+    'calls': ('nlp_stage_calls_total', 'Calls of each NLP pipeline stage'),
+    'microseconds': ('nlp_stage_seconds_total', 'Wall time spent in each NLP pipeline stage'),
+    'input_chars': ('nlp_stage_input_chars_total', 'Characters of text passed to each NLP pipeline stage'),
+    'suggestions': ('nlp_stage_suggestions_total', 'Suggestions produced by each NLP pipeline stage'),
+}
+
+# Timings of the code running in the current context (one job or request)
+current_timings = contextvars.ContextVar('current_timings', default=None)
+
+
+def input_chars(args):
+    # Size of the first text-like argument: a string, a spaCy Doc or Span, or
+    # a list of strings
+    for arg in args:
+        if isinstance(arg, str):
+            return len(arg)
+        text = getattr(arg, 'text', None)
+        if isinstance(text, str):
+            return len(text)
+        if isinstance(arg, (list, tuple)) and arg and all(isinstance(item, str) for item in arg):
+            return sum(len(item) for item in arg)
+    return 0
+
+
+def count_suggestions(result):
+    if isinstance(result, list):
+        return sum(1 for item in result if isinstance(item, Suggestion))
+    return 0
+
+
+def add_stage_metrics(deltas):
+    # Adds {stage: {field: delta}} to the stored totals with one upsert
+    if not deltas:
+        return
+    columns = list(FIELDS)
+    rows = [[stage] + [fields.get(column, 0) for column in columns] for stage, fields in deltas.items()]
+    values = ', '.join(['(' + ', '.join(['%s'] * (len(columns) + 1)) + ')'] * len(rows))
+    if connection.vendor == 'mysql':
+        conflict = 'ON DUPLICATE KEY UPDATE ' + ', '.join(f'{column} = {column} + VALUES({column})' for column in columns)
+    else:
+        conflict = 'ON CONFLICT (stage) DO UPDATE SET ' + ', '.join(
+            f'{column} = stage_metrics.{column} + excluded.{column}' for column in columns
+        )
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f"INSERT INTO stage_metrics (stage, {', '.join(columns)}) VALUES {values} {conflict}",
+            [value for row in rows for value in row],
+        )
+
+
+class StageMetrics:
+    # Counts in memory; flush() adds them to the shared totals
+    def __init__(self):
+        self.deltas = defaultdict(Counter)
+        self.lock = threading.Lock()
+
+    def record(self, stage, seconds, chars, suggestions):
+        with self.lock:
+            deltas = self.deltas[stage]
+            deltas['calls'] += 1
+            deltas['microseconds'] += int(seconds * 1000000)
+            deltas['input_chars'] += chars
+            deltas['suggestions'] += suggestions
+
+        timings = current_timings.get()
+        if timings is not None:
+            entry = timings.setdefault(stage, {'calls': 0, 'seconds': 0.0, 'input_chars': 0, 'suggestions': 0})
+            entry['calls'] += 1
+            entry['seconds'] += seconds
+            entry['input_chars'] += chars
+            entry['suggestions'] += suggestions
+
+    def flush(self):
+        with self.lock:
+            deltas, self.deltas = self.deltas, defaultdict(Counter)
+        add_stage_metrics(deltas)
+
+    def totals(self):
+        # {stage: {field: value}} from the shared totals
+        return {row.pop('stage'): row for row in StageMetric.objects.values('stage', *FIELDS)}
+
+
+stage_metrics = StageMetrics()
+
+
+def timed(stage):
+    # Records calls, wall time, input size and suggestions of a function
+    def decorator(func):
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            start = time.perf_counter()
+            result = func(*args, **kwargs)
+            stage_metrics.record(stage, time.perf_counter() - start, input_chars(args), count_suggestions(result))
+            return result
+        return wrapper
+    return decorator
+
+
+@contextmanager
+def collect_timings():
+    # Collects {stage: {calls, seconds, input_chars, suggestions}} for the
+    # stages run inside the block
+    timings = {}
+    token = current_timings.set(timings)
+    try:
+        yield timings
+    finally:
+        current_timings.reset(token)
+
+
+def add_timings(timings, other):
+    # Adds the timings collected in another process (e.g. a pool task)
+    for stage, entry in other.items():
+        total = timings.setdefault(stage, {'calls': 0, 'seconds': 0.0, 'input_chars': 0, 'suggestions': 0})
+        for field, value in entry.items():
+            total[field] = total.get(field, 0) + value
+    return timings
+
+
+def prometheus_text():
+    # Prometheus text exposition format
+    totals = stage_metrics.totals()
+    lines = []
+    for field, (metric, help_text) in FIELDS.items():
+        lines.append(f'# HELP {metric} {help_text}')
+        lines.append(f'# TYPE {metric} counter')
+        for stage in sorted(totals):
+            value = totals[stage].get(field, 0)
+            if field == 'microseconds':
+                value = value / 1000000
+            lines.append(f'{metric}{{stage="{stage}"}} {value}')
+    return '\n'.join(lines) + '\n'
@@ -0,0 +1,70 @@
+import cProfile
+import io
+import pstats
+
+from django.conf import settings
+from django.http import HttpResponse
+from rest_framework.authentication import TokenAuthentication
+from rest_framework.exceptions import AuthenticationFailed
+
+
+class ProfilingMiddleware:
+    # Opt-in request profiling: with PROFILING_ENABLED, a request with
+    # ?profile=1 from a staff user (any user with DEBUG) returns the profile
+    # of handling it instead of its response; other requests are served as
+    # usual. PROFILER selects cProfile (default) or pyinstrument (if installed).
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        if not settings.PROFILING_ENABLED or 'profile' not in request.GET or not self.may_profile(request):
+            return self.get_response(request)
+        if settings.PROFILER == 'pyinstrument':
+            return self.profile_pyinstrument(request)
+        return self.profile_cprofile(request)
+
+    def may_profile(self, request):
+        if settings.DEBUG:
+            return True
+        # The API authenticates with tokens, which only DRF's views resolve
+        user = request.user
+        if not user.is_authenticated:
+            try:
+                authenticated = TokenAuthentication().authenticate(request)
+            except AuthenticationFailed:
+                return False
+            if authenticated is None:
+                return False
+            user = authenticated[0]
+        return user.is_staff
+
+    def handle(self, request):
+        response = self.get_response(request)
+        # Streamed responses do their work while being consumed
+        if response.streaming:
+            for _ in response.streaming_content:
+                pass
+        return response
+
+    def profile_cprofile(self, request):
+        profiler = cProfile.Profile()
+        profiler.enable()
+        try:
+            self.handle(request)
+        finally:
+            profiler.disable()
+        output = io.StringIO()
+        stats = pstats.Stats(profiler, stream=output)
+        stats.sort_stats(settings.PROFILE_SORT).print_stats(settings.PROFILE_TOP_FUNCTIONS)
+        return HttpResponse(output.getvalue(), content_type='text/plain; charset=utf-8')
+
+    def profile_pyinstrument(self, request):
+        from pyinstrument import Profiler
+
+        profiler = Profiler()
+        profiler.start()
+        try:
+            self.handle(request)
+        finally:
+            profiler.stop()
+        return HttpResponse(profiler.output_html())
@@ -0,0 +1,94 @@
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    initial = True
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='CachedImprovement',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('cache_key', models.CharField(db_column='cache_key', max_length=64, unique=True)),
+                ('improved_content', models.TextField(db_column='improved_content')),
+                ('suggestions', models.JSONField(db_column='suggestions')),
+                ('created_at', models.DateTimeField(auto_now_add=True, db_column='created_at')),
+                ('last_used_at', models.DateTimeField(auto_now_add=True, db_column='last_used_at')),
+            ],
+            options={
+                'db_table': 'improvement_cache',
+            },
+        ),
+        migrations.CreateModel(
+            name='Document',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('upload_date', models.DateTimeField(auto_now_add=True, db_column='upload_date')),
+                ('status', models.CharField(db_column='status', default='uploaded', max_length=20)),
+                ('file_name', models.CharField(max_length=255)),
+                ('created_at', models.DateTimeField(auto_now_add=True, db_column='created_at')),
+                ('updated_at', models.DateTimeField(auto_now=True, db_column='updated_at')),
+                ('user', models.ForeignKey(db_column='user_id', on_delete=django.db.models.deletion.CASCADE, to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'db_table': 'documents',
+            },
+        ),
+        migrations.CreateModel(
+            name='SegmentResult',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('segment_hash', models.CharField(db_column='segment_hash', max_length=64, unique=True)),
+                ('result', models.JSONField(db_column='result')),
+                ('created_at', models.DateTimeField(auto_now_add=True, db_column='created_at')),
+            ],
+            options={
+                'db_table': 'segment_results',
+            },
+        ),
+        migrations.CreateModel(
+            name='ImprovementJob',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('status', models.CharField(db_column='status', default='queued', max_length=20)),
+                ('error', models.TextField(blank=True, db_column='error', null=True)),
+                ('created_at', models.DateTimeField(auto_now_add=True, db_column='created_at')),
+                ('started_at', models.DateTimeField(blank=True, db_column='started_at', null=True)),
+                ('finished_at', models.DateTimeField(blank=True, db_column='finished_at', null=True)),
+                ('document', models.ForeignKey(db_column='document_id', on_delete=django.db.models.deletion.CASCADE, to='documents.document')),
+            ],
+            options={
+                'db_table': 'improvement_jobs',
+            },
+        ),
+        migrations.CreateModel(
+            name='Content',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('original_content', models.TextField(db_column='original_content')),
+                ('improved_content', models.TextField(blank=True, db_column='improved_content', null=True)),
+                ('suggestions', models.JSONField(blank=True, db_column='suggestions', null=True)),
+                ('created_at', models.DateTimeField(auto_now_add=True, db_column='created_at')),
+                ('updated_at', models.DateTimeField(auto_now=True, db_column='updated_at')),
+                ('document', models.ForeignKey(db_column='document_id', on_delete=django.db.models.deletion.CASCADE, to='documents.document')),
+            ],
+            options={
+                'db_table': 'contents',
+            },
+        ),
+        migrations.AddIndex(
+            model_name='cachedimprovement',
+            index=models.Index(fields=['last_used_at'], name='idx_improvement_cache_used'),
+        ),
+        migrations.AddIndex(
+            model_name='improvementjob',
+            index=models.Index(fields=['status', 'id'], name='idx_improvement_jobs_status'),
+        ),
+    ]
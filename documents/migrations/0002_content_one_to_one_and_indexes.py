@@ -0,0 +1,25 @@
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('documents', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='content',
+            name='document',
+            field=models.OneToOneField(db_column='document_id', on_delete=django.db.models.deletion.CASCADE, related_name='content', to='documents.document'),
+        ),
+        migrations.AddIndex(
+            model_name='document',
+            index=models.Index(fields=['user', 'upload_date'], name='idx_documents_user_upload'),
+        ),
+        migrations.AddIndex(
+            model_name='document',
+            index=models.Index(fields=['status'], name='idx_documents_status'),
+        ),
+    ]
@@ -0,0 +1,38 @@
+from django.db import migrations, models
+
+
+def fill_counters(apps, schema_editor):
+    User = apps.get_model('auth', 'User')
+    Document = apps.get_model('documents', 'Document')
+    StatisticCounter = apps.get_model('documents', 'StatisticCounter')
+
+    counters = [
+        StatisticCounter(name='users', value=User.objects.count()),
+        StatisticCounter(name='documents', value=Document.objects.count()),
+    ]
+    for status, count in Document.objects.values_list('status').annotate(count=models.Count('id')).order_by():
+        counters.append(StatisticCounter(name=f'status:{status}', value=count))
+    StatisticCounter.objects.bulk_create(counters)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('auth', '0012_alter_user_first_name_max_length'),
+        ('documents', '0002_content_one_to_one_and_indexes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='StatisticCounter',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(db_column='name', max_length=50, unique=True)),
+                ('value', models.BigIntegerField(db_column='value', default=0)),
+            ],
+            options={
+                'db_table': 'statistic_counters',
+            },
+        ),
+        migrations.RunPython(fill_counters, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,60 @@
+from django.conf import settings
+from django.db import migrations, models
+import documents.fields
+
+
+def compress_contents(apps, schema_editor):
+    # Rows written before this migration hold plain text, which the field
+    # still reads; saving them again stores them compressed
+    Content = apps.get_model('documents', 'Content')
+    for content in Content.objects.only('id', 'original_content', 'improved_content').iterator(chunk_size=500):
+        content.excerpt = content.original_content[:settings.DOCUMENT_EXCERPT_CHARS]
+        content.save(update_fields=['original_content', 'improved_content', 'excerpt'])
+
+
+def decompress_contents(apps, schema_editor):
+    # Bytes are stored as they are, so this writes the bodies back as plain
+    # UTF-8 before the columns turn into text again
+    Content = apps.get_model('documents', 'Content')
+    for content in Content.objects.only('id', 'original_content', 'improved_content').iterator(chunk_size=500):
+        content.original_content = content.original_content.encode('utf-8')
+        if content.improved_content is not None:
+            content.improved_content = content.improved_content.encode('utf-8')
+        content.save(update_fields=['original_content', 'improved_content'])
+
+
+def restore_text_columns(apps, schema_editor):
+    # Runs last when unapplying: SQLite keeps the bytes written above as BLOBs
+    # when the columns turn back into text, other databases convert them
+    if schema_editor.connection.vendor == 'sqlite':
+        schema_editor.execute(
+            "UPDATE contents SET original_content = CAST(original_content AS TEXT), "
+            "improved_content = CAST(improved_content AS TEXT)"
+        )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('documents', '0003_statisticcounter'),
+    ]
+
+    operations = [
+        migrations.RunPython(migrations.RunPython.noop, restore_text_columns),
+        migrations.AddField(
+            model_name='content',
+            name='excerpt',
+            field=models.CharField(blank=True, db_column='excerpt', default='', max_length=255),
+        ),
+        migrations.AlterField(
+            model_name='content',
+            name='improved_content',
+            field=documents.fields.CompressedTextField(blank=True, db_column='improved_content', null=True),
+        ),
+        migrations.AlterField(
+            model_name='content',
+            name='original_content',
+            field=documents.fields.CompressedTextField(db_column='original_content'),
+        ),
+        migrations.RunPython(compress_contents, decompress_contents),
+    ]
@@ -0,0 +1,16 @@
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('documents', '0004_compressed_content'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='improvementjob',
+            name='timings',
+            field=models.JSONField(blank=True, db_column='timings', null=True),
+        ),
+    ]
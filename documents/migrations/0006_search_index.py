@@ -0,0 +1,94 @@
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+# MySQL searches search_index through a FULLTEXT index; SQLite through an
+# FTS5 table over it, kept in sync by triggers
+MYSQL_CREATE = [
+    'ALTER TABLE search_index ADD FULLTEXT INDEX ft_search_index (original_content, improved_content)',
+]
+MYSQL_DROP = [
+    'ALTER TABLE search_index DROP INDEX ft_search_index',
+]
+SQLITE_CREATE = [
+    "CREATE VIRTUAL TABLE search_index_fts USING fts5("
+    "original_content, improved_content, content='search_index', content_rowid='document_id')",
+    "CREATE TRIGGER search_index_insert AFTER INSERT ON search_index BEGIN "
+    "INSERT INTO search_index_fts(rowid, original_content, improved_content) "
+    "VALUES (new.document_id, new.original_content, new.improved_content); END",
+    "CREATE TRIGGER search_index_delete AFTER DELETE ON search_index BEGIN "
+    "INSERT INTO search_index_fts(search_index_fts, rowid, original_content, improved_content) "
+    "VALUES ('delete', old.document_id, old.original_content, old.improved_content); END",
+    "CREATE TRIGGER search_index_update AFTER UPDATE ON search_index BEGIN "
+    "INSERT INTO search_index_fts(search_index_fts, rowid, original_content, improved_content) "
+    "VALUES ('delete', old.document_id, old.original_content, old.improved_content); "
+    "INSERT INTO search_index_fts(rowid, original_content, improved_content) "
+    "VALUES (new.document_id, new.original_content, new.improved_content); END",
+]
+SQLITE_DROP = [
+    'DROP TRIGGER IF EXISTS search_index_update',
+    'DROP TRIGGER IF EXISTS search_index_delete',
+    'DROP TRIGGER IF EXISTS search_index_insert',
+    'DROP TABLE IF EXISTS search_index_fts',
+]
+
+
+def execute(schema_editor, statements):
+    statements = statements.get(schema_editor.connection.vendor, [])
+    with schema_editor.connection.cursor() as cursor:
+        for statement in statements:
+            cursor.execute(statement)
+
+
+def create_full_text_index(apps, schema_editor):
+    execute(schema_editor, {'mysql': MYSQL_CREATE, 'sqlite': SQLITE_CREATE})
+
+
+def drop_full_text_index(apps, schema_editor):
+    execute(schema_editor, {'mysql': MYSQL_DROP, 'sqlite': SQLITE_DROP})
+
+
+def index_contents(apps, schema_editor):
+    # Index the documents uploaded before search existed
+    Content = apps.get_model('documents', 'Content')
+    SearchEntry = apps.get_model('documents', 'SearchEntry')
+    entries = []
+    contents = Content.objects.select_related('document').only(
+        'document__id', 'document__user_id', 'original_content', 'improved_content'
+    )
+    for content in contents.iterator(chunk_size=500):
+        entries.append(SearchEntry(
+            document_id=content.document.id,
+            user_id=content.document.user_id,
+            original_content=content.original_content[:settings.SEARCH_INDEX_MAX_CHARS],
+            improved_content=(content.improved_content or '')[:settings.SEARCH_INDEX_MAX_CHARS],
+        ))
+        if len(entries) >= 500:
+            SearchEntry.objects.bulk_create(entries)
+            entries = []
+    SearchEntry.objects.bulk_create(entries)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('documents', '0005_improvementjob_timings'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SearchEntry',
+            fields=[
+                ('document', models.OneToOneField(db_column='document_id', on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='search_entry', serialize=False, to='documents.document')),
+                ('original_content', models.TextField(db_column='original_content')),
+                ('improved_content', models.TextField(blank=True, db_column='improved_content', default='')),
+                ('user', models.ForeignKey(db_column='user_id', on_delete=django.db.models.deletion.CASCADE, to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'db_table': 'search_index',
+            },
+        ),
+        migrations.RunPython(create_full_text_index, drop_full_text_index),
+        migrations.RunPython(index_contents, migrations.RunPython.noop),
+    ]
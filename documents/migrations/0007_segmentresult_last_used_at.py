@@ -0,0 +1,22 @@
+from django.db import migrations, models
+import django.utils.timezone
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('documents', '0006_search_index'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='segmentresult',
+            name='last_used_at',
+            field=models.DateTimeField(auto_now_add=True, db_column='last_used_at', default=django.utils.timezone.now),
+            preserve_default=False,
+        ),
+        migrations.AddIndex(
+            model_name='segmentresult',
+            index=models.Index(fields=['last_used_at'], name='idx_segment_results_used'),
+        ),
+    ]
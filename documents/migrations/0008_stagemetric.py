@@ -0,0 +1,42 @@
+from django.db import migrations, models
+
+# Stage metrics used to be kept in statistic_counters as nlp:<stage>:<field>,
+# where rebuilding the statistics counters wiped them
+FIELDS = ['calls', 'microseconds', 'input_chars', 'suggestions']
+
+
+def move_stage_metrics(apps, schema_editor):
+    StatisticCounter = apps.get_model('documents', 'StatisticCounter')
+    StageMetric = apps.get_model('documents', 'StageMetric')
+    counters = StatisticCounter.objects.filter(name__startswith='nlp:')
+    totals = {}
+    for name, value in counters.values_list('name', 'value'):
+        stage, field = name[len('nlp:'):].rsplit(':', 1)
+        if field in FIELDS:
+            totals.setdefault(stage, {})[field] = value
+    StageMetric.objects.bulk_create([StageMetric(stage=stage, **fields) for stage, fields in totals.items()])
+    counters.delete()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('documents', '0007_segmentresult_last_used_at'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='StageMetric',
+            fields=[
+                ('stage', models.CharField(db_column='stage', max_length=100, primary_key=True, serialize=False)),
+                ('calls', models.BigIntegerField(db_column='calls', default=0)),
+                ('microseconds', models.BigIntegerField(db_column='microseconds', default=0)),
+                ('input_chars', models.BigIntegerField(db_column='input_chars', default=0)),
+                ('suggestions', models.BigIntegerField(db_column='suggestions', default=0)),
+            ],
+            options={
+                'db_table': 'stage_metrics',
+            },
+        ),
+        migrations.RunPython(move_stage_metrics, migrations.RunPython.noop),
+    ]
@@ -1,6 +1,9 @@
+from django.conf import settings
 from django.db import models
 from django.contrib.auth.models import User
 
+from .fields import CompressedTextField
+
 class Document(models.Model):
     user = models.ForeignKey(User, on_delete=models.CASCADE, db_column='user_id')
     upload_date = models.DateTimeField(auto_now_add=True, db_column='upload_date')
@@ -11,13 +14,94 @@ class Document(models.Model):
 
     class Meta:
         db_table = 'documents'
+        indexes = [
+            models.Index(fields=['user', 'upload_date'], name='idx_documents_user_upload'),
+            models.Index(fields=['status'], name='idx_documents_status'),
+        ]
 
 class Content(models.Model):
-    document = models.ForeignKey(Document, on_delete=models.CASCADE, db_column='document_id')
-    original_content = models.TextField(db_column='original_content')
-    improved_content = models.TextField(blank=True, null=True, db_column='improved_content')
+    document = models.OneToOneField(Document, on_delete=models.CASCADE, related_name='content', db_column='document_id')
+    original_content = CompressedTextField(db_column='original_content')
+    improved_content = CompressedTextField(blank=True, null=True, db_column='improved_content')
+    # Start of original_content, so listings never decompress the bodies
+    excerpt = models.CharField(max_length=255, blank=True, default='', db_column='excerpt')
+    suggestions = models.JSONField(blank=True, null=True, db_column='suggestions')
     created_at = models.DateTimeField(auto_now_add=True, db_column='created_at')
     updated_at = models.DateTimeField(auto_now=True, db_column='updated_at')
 
     class Meta:
         db_table = 'contents'
+
+    def save(self, *args, **kwargs):
+        if isinstance(self.original_content, str):
+            self.excerpt = self.original_content[:settings.DOCUMENT_EXCERPT_CHARS]
+        super().save(*args, **kwargs)
+
+class ImprovementJob(models.Model):
+    QUEUED = 'queued'
+    RUNNING = 'running'
+    DONE = 'done'
+    FAILED = 'failed'
+
+    document = models.ForeignKey(Document, on_delete=models.CASCADE, db_column='document_id')
+    status = models.CharField(max_length=20, default=QUEUED, db_column='status')
+    error = models.TextField(blank=True, null=True, db_column='error')
+    created_at = models.DateTimeField(auto_now_add=True, db_column='created_at')
+    started_at = models.DateTimeField(blank=True, null=True, db_column='started_at')
+    finished_at = models.DateTimeField(blank=True, null=True, db_column='finished_at')
+    # Per-stage timings of the job (see documents/metrics.py)
+    timings = models.JSONField(blank=True, null=True, db_column='timings')
+
+    class Meta:
+        db_table = 'improvement_jobs'
+        indexes = [models.Index(fields=['status', 'id'], name='idx_improvement_jobs_status')]
+
+class CachedImprovement(models.Model):
+    cache_key = models.CharField(max_length=64, unique=True, db_column='cache_key')
+    improved_content = models.TextField(db_column='improved_content')
+    suggestions = models.JSONField(db_column='suggestions')
+    created_at = models.DateTimeField(auto_now_add=True, db_column='created_at')
+    last_used_at = models.DateTimeField(auto_now_add=True, db_column='last_used_at')
+
+    class Meta:
+        db_table = 'improvement_cache'
+        indexes = [models.Index(fields=['last_used_at'], name='idx_improvement_cache_used')]
+
+class SegmentResult(models.Model):
+    segment_hash = models.CharField(max_length=64, unique=True, db_column='segment_hash')
+    result = models.JSONField(db_column='result')
+    created_at = models.DateTimeField(auto_now_add=True, db_column='created_at')
+    last_used_at = models.DateTimeField(auto_now_add=True, db_column='last_used_at')
+
+    class Meta:
+        db_table = 'segment_results'
+        indexes = [models.Index(fields=['last_used_at'], name='idx_segment_results_used')]
+
+class StatisticCounter(models.Model):
+    name = models.CharField(max_length=50, unique=True, db_column='name')
+    value = models.BigIntegerField(default=0, db_column='value')
+
+    class Meta:
+        db_table = 'statistic_counters'
+
+class StageMetric(models.Model):
+    # Running totals of one NLP pipeline stage (see documents/metrics.py)
+    stage = models.CharField(max_length=100, primary_key=True, db_column='stage')
+    calls = models.BigIntegerField(default=0, db_column='calls')
+    microseconds = models.BigIntegerField(default=0, db_column='microseconds')
+    input_chars = models.BigIntegerField(default=0, db_column='input_chars')
+    suggestions = models.BigIntegerField(default=0, db_column='suggestions')
+
+    class Meta:
+        db_table = 'stage_metrics'
+
+class SearchEntry(models.Model):
+    # Plain text copy of a document's bodies for full-text search (see
+    # documents/search.py): a FULLTEXT index on MySQL, an FTS5 table on SQLite
+    document = models.OneToOneField(Document, on_delete=models.CASCADE, primary_key=True, related_name='search_entry', db_column='document_id')
+    user = models.ForeignKey(User, on_delete=models.CASCADE, db_column='user_id')
+    original_content = models.TextField(db_column='original_content')
+    improved_content = models.TextField(blank=True, default='', db_column='improved_content')
+
+    class Meta:
+        db_table = 'search_index'
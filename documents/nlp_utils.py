@@ -1,26 +1,36 @@
 import re
 import json
-import spacy
-import textstat
-import language_tool_python
-from transformers import pipeline
-from textblob import TextBlob
-
-# spaCy model
-nlp = spacy.load("en_core_web_sm")
-
-# LanguageTool
-tool = language_tool_python.LanguageTool('en-US')
-
-# Transformer models
-grammar_corrector = pipeline('text2text-generation', model='pszemraj/flan-t5-large-grammar-synthesis')
+from collections import namedtuple
+from spacy.tokens import Doc
+from django.conf import settings
+from .correction import GrammarCorrector, split_sections, split_segments
+from .edits import Edit, Suggestion, apply_edits, match_case, render_messages
+from .languagetool import BatchedChecker
+from .metrics import timed
+from .readability import analyze_readability
+from .registry import registry
+from .rules import RuleMatcher
+
+# Models are loaded from the registry on first use, not at import time
+nlp = registry.proxy('spacy')
+tool = registry.proxy('languagetool')
+grammar_corrector = registry.proxy('grammar')
+spelling_corrector = registry.proxy('spelling')
+
+checker = BatchedChecker(tool, chunk_chars=settings.LANGUAGETOOL_CHUNK_CHARS)
+
+# The LanguageTool result for a parsed document, shared by the sentence checks
+Doc.set_extension('language_check', default=None, force=True)
+
+# House-style rule hits for a document, shared by the style and clarity checks
+Doc.set_extension('rule_matches', default=None, force=True)
 
 # Load configuration from JSON file
 def load_config(file_path):
     with open(file_path, 'r') as file:
         return json.load(file)
 
-config = load_config('config.json')
+config = load_config(settings.NLP_CONFIG_PATH)
 redundant_phrases = config.get('redundant_phrases', {})
 complex_words = config.get('complex_words', {})
 grammar_mistakes = config.get('grammar_mistakes', {})
@@ -28,14 +38,50 @@ ner_suggestions = config.get('ner_suggestions', {})
 casual_words = config.get('casual_words', [])
 ambiguous_words = config.get('ambiguous_words', {})
 
+# Whole-word patterns used to locate grammar mistakes inside LanguageTool matches
+grammar_mistake_patterns = {
+    mistake: re.compile(r'\b' + re.escape(mistake) + r'\b', re.IGNORECASE) for mistake in grammar_mistakes
+}
+
+# All redundant phrase, complex word and casual word rules compiled into one
+# automaton that finds every hit in a single scan of the text
+rule_matcher = RuleMatcher.from_config(config)
+
+# Analysis stages: each one declares the spaCy components it needs so the
+# text can be parsed once with only those components enabled
+Stage = namedtuple('Stage', ['name', 'analyze', 'requires'])
+
+@timed('parse')
+def parse(text, stages=None):
+    if stages is None:
+        stages = ANALYSIS_STAGES
+    required = set()
+    for stage in stages:
+        required.update(stage.requires)
+    disable = [pipe for pipe in nlp.pipe_names if pipe not in required]
+    return nlp(text, disable=disable)
+
+def as_doc(text, stages):
+    # Reuse an already parsed Doc, otherwise parse with just what the stages need
+    if isinstance(text, Doc):
+        return text
+    return parse(text, stages)
+
+def run_stages(doc, stages=None):
+    if stages is None:
+        stages = ANALYSIS_STAGES
+    suggestions = []
+    for stage in stages:
+        suggestions.extend(stage.analyze(doc))
+    return suggestions
+
 # NLP Analysis
 def analyze_document(text):
-    doc = nlp(text)
+    doc = as_doc(text, [SENTENCE_STAGE, ENTITY_STAGE])
     suggestions = []
 
     # Analyze sentences
-    for sent in doc.sents:
-        suggestions.extend(analyze_sentence(sent))
+    suggestions.extend(analyze_sentences(doc))
 
     # Named Entity Recognition
     ner_suggestions = analyze_entities(doc)
@@ -43,16 +89,24 @@ def analyze_document(text):
 
     return suggestions
 
+@timed('analyze_sentences')
+def analyze_sentences(doc):
+    suggestions = []
+    for sent in doc.sents:
+        suggestions.extend(analyze_sentence(sent))
+    return suggestions
+
+@timed('analyze_sentence')
 def analyze_sentence(sentence):
     suggestions = []
 
     # Check for passive voice
     if is_passive(sentence):
-        suggestions.append(f"Consider using active voice in: '{sentence.text}'")
+        suggestions.append(Suggestion(f"Consider using active voice in: '{sentence.text}'", rule_id='passive_voice'))
 
     # Check for long sentences
     if len(sentence) > 20:  # Improved to check token count
-        suggestions.append(f"Consider breaking down the long sentence: '{sentence.text}'")
+        suggestions.append(Suggestion(f"Consider breaking down the long sentence: '{sentence.text}'", rule_id='long_sentence'))
 
     # Check for syntax and grammar issues
     syntax_suggestions = check_syntax(sentence)
@@ -67,18 +121,32 @@ def is_passive(sentence):
             return True
     return False
 
+@timed('check_syntax')
 def check_syntax(sentence):
     suggestions = []
 
-    # Check for common grammar mistakes using LanguageTool
-    matches = tool.check(sentence.text)
+    # Check for common grammar mistakes using LanguageTool, reusing the
+    # document-wide batched check when there is one
+    language_check = sentence.doc._.language_check
+    if language_check is not None:
+        matches = language_check.for_span(sentence.start_char, sentence.end_char)
+    else:
+        matches = [match._replace(offset=match.offset + sentence.start_char)
+                   for match in checker.check(sentence.text).matches]
+    text = sentence.doc.text
     for match in matches:
         for mistake, replacement in grammar_mistakes.items():
             if mistake in match.message.lower():
-                suggestions.append(f"Consider replacing '{mistake}' with '{replacement}'")
+                # Only occurrences of the mistake inside the flagged span are replaced
+                edits = [
+                    Edit(found.start(), found.end(), match_case(found.group(), replacement), 'grammar_mistakes')
+                    for found in grammar_mistake_patterns[mistake].finditer(text, match.offset, match.offset + match.length)
+                ]
+                suggestions.append(Suggestion(f"Consider replacing '{mistake}' with '{replacement}'", edits, 'grammar_mistakes'))
 
     return suggestions
 
+@timed('analyze_entities')
 def analyze_entities(doc):
     suggestions = []
 
@@ -87,118 +155,308 @@ def analyze_entities(doc):
         if ent.label_ in ner_suggestions:
             for term, suggestion in ner_suggestions[ent.label_].items():
                 if ent.text.lower() == term:
-                    suggestions.append(f"{suggestion} for '{ent.text}'")
+                    suggestions.append(Suggestion(f"{suggestion} for '{ent.text}'", rule_id='entities'))
 
     return suggestions
 
 # Grammar and Spelling Correction
-def fix_grammar_and_spelling(text):
-    # Correct grammar using transformer-based model
-    corrected_grammar = grammar_corrector(text, max_length=512)[0]['generated_text']
+@timed('correct_spelling')
+def correct_spelling(text):
+    # Correct spelling with the configured engine (SPELLING_ENGINE)
+    return spelling_corrector.correct(text)
+
+# Grammar is corrected with the transformer-based model window by window, so
+# long documents are not truncated; spelling is corrected on each window output.
+# The inference server batches windows itself, so they are sent to it at once.
+correction_engine = GrammarCorrector(
+    grammar_corrector,
+    max_window_tokens=settings.GRAMMAR_MAX_WINDOW_TOKENS,
+    batch_size=settings.INFERENCE_MAX_BATCH if settings.INFERENCE_SERVER else settings.GRAMMAR_BATCH_SIZE,
+    postprocess=correct_spelling,
+)
+
+@timed('correct_grammar_and_spelling')
+def correct_grammar_and_spelling(text, store=None):
+    return correction_engine.correct(text, store)
+
+@timed('check_language')
+def check_language(text, doc=None):
+    # One batched LanguageTool pass; chunks are cut at sentence ends when the
+    # text has already been parsed
+    boundaries = None
+    if doc is not None and doc.has_annotation('SENT_START'):
+        boundaries = [sent.end_char for sent in doc.sents]
+    return checker.check(text, boundaries)
 
-    # Correct spelling using TextBlob
-    blob = TextBlob(corrected_grammar)
-    corrected_text = str(blob.correct())
+def fix_grammar_and_spelling(text):
+    corrected_text = correct_grammar_and_spelling(text)
 
     # Gather suggestions from LanguageTool
-    matches = tool.check(corrected_text)
-    suggestions = [match.message for match in matches]
+    suggestions = check_language(corrected_text).messages()
 
     return corrected_text, suggestions
 
+def find_rule_matches(text):
+    # Scan once per document; a Doc keeps its hits for the other rule stages
+    if not isinstance(text, Doc):
+        return rule_matcher.find(text)
+    if text._.rule_matches is None:
+        text._.rule_matches = rule_matcher.find(text.text)
+    return text._.rule_matches
+
+def match_text(text, match):
+    if isinstance(text, Doc):
+        text = text.text
+    return text[match.start:match.end]
+
 # Style and Tone Analysis
+@timed('analyze_style_and_tone')
 def analyze_style_and_tone(text):
     suggestions = []
 
     # Check for overly casual language
-    for token in nlp(text):
-        if token.text.lower() in casual_words:
-            suggestions.append(f"Consider replacing '{token.text}' with a more formal term.")
+    for match in find_rule_matches(text):
+        if match.rule_set == 'casual_words':
+            word = match_text(text, match)
+            suggestions.append(Suggestion(f"Consider replacing '{word}' with a more formal term.", rule_id='casual_words'))
 
     return suggestions
 
 # Readability Analysis
+@timed('readability_analysis')
 def readability_analysis(text):
     suggestions = []
+    # All four indices come from one count of the text
+    counts, _ = analyze_readability(text)
 
     # Flesch-Kincaid Grade Level
-    flesch_kincaid_grade = textstat.flesch_kincaid_grade(text)
+    flesch_kincaid_grade = counts.flesch_kincaid_grade()
     if flesch_kincaid_grade > 8:
-        suggestions.append("The text is written at a high grade level. Consider simplifying your language.")
+        suggestions.append(Suggestion("The text is written at a high grade level. Consider simplifying your language.", rule_id='readability'))
 
     # Gunning-Fog Index
-    gunning_fog_index = textstat.gunning_fog(text)
+    gunning_fog_index = counts.gunning_fog()
     if gunning_fog_index > 10:
-        suggestions.append("The text is difficult to read. Consider simplifying your sentences and using more common words.")
+        suggestions.append(Suggestion("The text is difficult to read. Consider simplifying your sentences and using more common words.", rule_id='readability'))
 
     # Flesch Reading Ease
-    flesch_score = textstat.flesch_reading_ease(text)
+    flesch_score = counts.flesch_reading_ease()
     if flesch_score < 60:
-        suggestions.append("The text is difficult to read. Consider simplifying your sentences and using more common words.")
+        suggestions.append(Suggestion("The text is difficult to read. Consider simplifying your sentences and using more common words.", rule_id='readability'))
 
     # SMOG Index
-    smog_index = textstat.smog_index(text)
+    smog_index = counts.smog_index()
     if smog_index > 12:
-        suggestions.append("The text may be too complex. Consider simplifying it for easier comprehension.")
+        suggestions.append(Suggestion("The text may be too complex. Consider simplifying it for easier comprehension.", rule_id='readability'))
 
     return suggestions
 
+@timed('improve_clarity_and_conciseness')
 def improve_clarity_and_conciseness(text):
-    doc = nlp(text)
     suggestions = []
-
-    # Check for redundant phrases
-    for phrase, replacement in redundant_phrases.items():
-        if phrase in text:
-            suggestions.append(f"Consider replacing '{phrase}' with '{replacement}'.")
-
-    # Check for complex words
-    for token in doc:
-        if token.text.lower() in complex_words:
-            replacement = complex_words[token.text.lower()]
-            suggestions.append(f"Consider replacing '{token.text}' with '{replacement}'.")
+    redundant = {}
+
+    for match in find_rule_matches(text):
+        word = match_text(text, match)
+        edit = Edit(match.start, match.end, match_case(word, match.replacement), match.rule_set)
+
+        # Check for redundant phrases, reported once per phrase with an edit
+        # for every occurrence
+        if match.rule_set == 'redundant_phrases':
+            if match.phrase not in redundant:
+                redundant[match.phrase] = len(suggestions)
+                suggestions.append(Suggestion(
+                    f"Consider replacing '{match.phrase}' with '{match.replacement}'.", [], 'redundant_phrases'
+                ))
+            index = redundant[match.phrase]
+            suggestions[index] = suggestions[index]._replace(edits=suggestions[index].edits + (edit,))
+
+        # Check for complex words
+        elif match.rule_set == 'complex_words':
+            suggestions.append(Suggestion(f"Consider replacing '{word}' with '{match.replacement}'.", [edit], 'complex_words'))
 
     return suggestions
 
-def improve_document_content(original_content):
+# Sentence checks need the dependency parse, entity checks need NER and the
+# rule checks only need the text
+SENTENCE_STAGE = Stage('sentences', analyze_sentences, ('tok2vec', 'parser'))
+ENTITY_STAGE = Stage('entities', analyze_entities, ('ner',))
+STYLE_STAGE = Stage('style', analyze_style_and_tone, ())
+CLARITY_STAGE = Stage('clarity', improve_clarity_and_conciseness, ())
+
+ANALYSIS_STAGES = [SENTENCE_STAGE, ENTITY_STAGE, STYLE_STAGE, CLARITY_STAGE]
+
+def language_suggestions(language_check):
+    # LanguageTool messages are reported as they are, without edits
+    return [Suggestion(match.message, rule_id=f"languagetool:{match.rule_id}") for match in language_check.matches]
+
+@timed('analyze_sentences_incremental')
+def analyze_sentences_incremental(text, store):
+    # Sentence-level results (sentence checks, entities and LanguageTool
+    # messages) are stored per sentence with offsets relative to the sentence;
+    # only sentences without a stored result are parsed and sent to LanguageTool
+    sentences = []
+    position = 0
+    for sentence, separator in split_segments(text):
+        if sentence.strip():
+            sentences.append((position, sentence))
+        position += len(sentence) + len(separator)
+
+    texts = [sentence for _, sentence in sentences]
+    results = store.get_many('sentence', texts)
+    missing = list(dict.fromkeys(sentence for sentence in texts if sentence not in results))
+
+    if missing:
+        stages = [SENTENCE_STAGE, ENTITY_STAGE]
+        required = {pipe for stage in stages for pipe in stage.requires}
+        disable = [pipe for pipe in nlp.pipe_names if pipe not in required]
+        fresh = {}
+        docs = nlp.pipe(missing, disable=disable)
+        for sentence, doc, language_check in zip(missing, docs, checker.check_many(missing)):
+            doc._.language_check = language_check
+            fresh[sentence] = {
+                'sentences': [suggestion.to_dict() for suggestion in analyze_sentences(doc)],
+                'entities': [suggestion.to_dict() for suggestion in analyze_entities(doc)],
+                'grammar': [suggestion.to_dict() for suggestion in language_suggestions(language_check)],
+            }
+        store.put_many('sentence', fresh)
+        results.update(fresh)
+
+    # Move the stored edits to where each sentence sits in this text
+    analysed = []
+    for position, sentence in sentences:
+        analysed.append({
+            key: [Suggestion.from_dict(data).shifted(position) for data in results[sentence][key]]
+            for key in ('sentences', 'entities', 'grammar')
+        })
+    return analysed
+
+@timed('improve_document_content')
+def improve_document_content(original_content, store=None):
     # First, fix grammar and spelling
-    corrected_content, grammar_suggestions = fix_grammar_and_spelling(original_content)
-
+    corrected_content = correct_grammar_and_spelling(original_content, store)
+    return analyze_corrected_content(corrected_content, store)
+
+@timed('correct_documents')
+def correct_documents(texts, store=None):
+    # Grammar correction for several documents at once; their windows share
+    # the model batches
+    return correction_engine.correct_many(texts, store)
+
+def analyze_corrected_content(corrected_content, store=None):
+    doc, sentence_suggestions, grammar_suggestions = analyze_sentence_level(corrected_content, store)
+    return finish_analysis(corrected_content, doc, sentence_suggestions, grammar_suggestions)
+
+@timed('analyze_sentence_level')
+def analyze_sentence_level(corrected_content, store=None):
+    # The expensive part of the analysis: sentence checks, entities and
+    # LanguageTool. Returns the Doc for the rule stages with the suggestions.
+    if len(corrected_content) >= settings.LARGE_DOCUMENT_CHARS:
+        # Shard by shard in this process; the improvement worker runs the
+        # shards across its pool instead
+        spans = shard_spans(corrected_content)
+        results = [analyze_shard(corrected_content[start:end], store) for start, end in spans]
+        return merge_shards(corrected_content, spans, results)
+    if store is None:
+        # Parse the corrected content once and share the Doc between all stages
+        doc = parse(corrected_content)
+
+        # Check the whole text with LanguageTool once; the sentence checks and
+        # the grammar suggestions both read from this result
+        doc._.language_check = check_language(corrected_content, doc)
+        grammar_suggestions = language_suggestions(doc._.language_check)
+        sentence_suggestions = run_stages(doc, [SENTENCE_STAGE, ENTITY_STAGE])
+    else:
+        # Reuse stored sentence results; the rule stages only need the rule
+        # matches, so they get the text itself instead of a fresh parse
+        doc = corrected_content
+        sentence_suggestions, grammar_suggestions = analyze_stored_sentences(corrected_content, store)
+    return doc, sentence_suggestions, grammar_suggestions
+
+def analyze_stored_sentences(text, store):
+    results = analyze_sentences_incremental(text, store)
+    grammar_suggestions = [suggestion for result in results for suggestion in result['grammar']]
+    sentence_suggestions = [suggestion for result in results for suggestion in result['sentences']]
+    sentence_suggestions += [suggestion for result in results for suggestion in result['entities']]
+    return sentence_suggestions, grammar_suggestions
+
+def shard_spans(text):
+    # (start, end) of the shards of a large document, cut after line breaks
+    spans = []
+    position = 0
+    for section in split_sections(text, settings.DOCUMENT_SHARD_CHARS):
+        spans.append((position, position + len(section)))
+        position += len(section)
+    return spans
+
+@timed('analyze_shard')
+def analyze_shard(text, store=None):
+    # Sentence level suggestions of one shard, relative to the shard. Shards
+    # are independent, so they can be analysed in any process and order.
+    if store is not None:
+        return analyze_stored_sentences(text, store)
+    doc = parse(text, [SENTENCE_STAGE, ENTITY_STAGE])
+    doc._.language_check = check_language(text, doc)
+    return run_stages(doc, [SENTENCE_STAGE, ENTITY_STAGE]), language_suggestions(doc._.language_check)
+
+def merge_shards(text, spans, results):
+    # Shard results in document order, moved to where each shard starts. The
+    # rule stages get the text itself: they only need the rule matches, and a
+    # large document may exceed the parser's max_length.
+    sentence_suggestions = []
+    grammar_suggestions = []
+    for (start, _), (sentences, grammar) in zip(spans, results):
+        sentence_suggestions.extend(suggestion.shifted(start) for suggestion in sentences)
+        grammar_suggestions.extend(suggestion.shifted(start) for suggestion in grammar)
+    return text, sentence_suggestions, grammar_suggestions
+
+def finish_sharded_analysis(corrected_content, spans, results):
+    return finish_analysis(corrected_content, *merge_shards(corrected_content, spans, results))
+
+@timed('finish_analysis')
+def finish_analysis(corrected_content, doc, sentence_suggestions, grammar_suggestions):
     # Perform further analysis on the corrected content
     suggestions = []
 
     # Analyze document using various functions
-    suggestions.extend(analyze_document(corrected_content))
-    suggestions.extend(analyze_style_and_tone(corrected_content))
+    suggestions.extend(sentence_suggestions)
+    suggestions.extend(run_stages(doc, [STYLE_STAGE]))
     suggestions.extend(readability_analysis(corrected_content))
-    suggestions.extend(improve_clarity_and_conciseness(corrected_content))
+    suggestions.extend(run_stages(doc, [CLARITY_STAGE]))
     suggestions.extend(grammar_suggestions)
 
     improved_content = apply_suggestions(corrected_content, suggestions)
-    return improved_content, suggestions
-
+    return improved_content, render_messages(suggestions)
+
+def iter_document_improvement(original_content, store=None):
+    # Streaming variant of improve_document_content. Yields
+    # ('section', messages) as each section of the text is corrected and
+    # analysed, then ('done', (improved content, messages)) for the whole
+    # text. Sentence level results are local to their section, and the cheap
+    # whole-text stages (style, readability, clarity) run once more over the
+    # joined text. They get it as plain text, as merge_shards does, so a text
+    # longer than the parser's max_length still streams. The result matches
+    # improve_document_content wherever no sentence spans a section (or, for
+    # large documents, a shard) boundary.
+    corrected_sections = []
+    sentence_suggestions = []
+    grammar_suggestions = []
+    offset = 0
+    for section in split_sections(original_content, settings.STREAM_SECTION_CHARS):
+        corrected = correct_grammar_and_spelling(section, store)
+        doc, sentences, grammar = analyze_sentence_level(corrected, store)
+        yield 'section', render_messages(sentences + run_stages(doc, [STYLE_STAGE, CLARITY_STAGE]) + grammar)
+
+        sentence_suggestions.extend(suggestion.shifted(offset) for suggestion in sentences)
+        grammar_suggestions.extend(suggestion.shifted(offset) for suggestion in grammar)
+        corrected_sections.append(corrected)
+        offset += len(corrected)
+
+    corrected_content = ''.join(corrected_sections)
+    yield 'done', finish_analysis(corrected_content, corrected_content, sentence_suggestions, grammar_suggestions)
+
+@timed('apply_suggestions')
 def apply_suggestions(text, suggestions):
-    for suggestion in suggestions:
-        print(f"Processing suggestion: {suggestion}")
-        try:
-            if "Consider replacing" in suggestion:
-                parts = suggestion.split("Consider replacing '")
-                if len(parts) > 1:
-                    old_phrase, new_phrase = parts[1].split("' with '")
-                    new_phrase = new_phrase.replace("'.", "")
-                    text = re.sub(r'\b' + re.escape(old_phrase) + r'\b', new_phrase, text)
-            elif "Grammar issue:" in suggestion:
-                match = re.search(r'Consider using (.*?) instead of (.*)', suggestion)
-                if match:
-                    new_text = match.group(1)
-                    old_text = match.group(2)
-                    text = re.sub(r'\b' + re.escape(old_text) + r'\b', new_text, text)
-            elif "Spelling issue:" in suggestion:
-                match = re.search(r"Spelling issue: '(.*?)' is misspelled.", suggestion)
-                if match:
-                    misspelled_word = match.group(1)
-                    corrected_word = TextBlob(misspelled_word).correct()
-                    text = re.sub(r'\b' + re.escape(misspelled_word) + r'\b', str(corrected_word), text)
-        except ValueError as e:
-            print(f"Error processing suggestion: {e}")
-    return text
+    # Every suggestion carries its edits as character spans of text, so all of
+    # them are applied in a single pass
+    return apply_edits(text, [edit for suggestion in suggestions for edit in suggestion.edits])
@@ -0,0 +1,51 @@
+from django.conf import settings
+from rest_framework.pagination import CursorPagination
+from rest_framework.response import Response
+from rest_framework.utils.urls import remove_query_param, replace_query_param
+
+
+class DocumentCursorPagination(CursorPagination):
+    # Newest first; the cursor encodes the upload date so pages stay stable
+    # while new documents are uploaded
+    ordering = ('-upload_date', '-id')
+    page_size = 50
+    page_size_query_param = 'page_size'
+    max_page_size = 200
+
+
+class SearchPagination:
+    # Ranked results have no stable cursor, so pages are offsets into the
+    # ranking (?page=, ?page_size=). One extra result is fetched to know
+    # whether there is a next page, instead of counting every match.
+    def __init__(self):
+        self.page_size = settings.SEARCH_PAGE_SIZE
+        self.max_page_size = settings.SEARCH_MAX_PAGE_SIZE
+
+    def query_int(self, name, default):
+        try:
+            value = int(self.request.query_params.get(name, default))
+        except ValueError:
+            return default
+        return value if value > 0 else default
+
+    def paginate(self, request, search):
+        # search(offset, limit) returns the results in rank order
+        self.request = request
+        self.page = self.query_int('page', 1)
+        self.page_size = min(self.query_int('page_size', self.page_size), self.max_page_size)
+        results = search((self.page - 1) * self.page_size, self.page_size + 1)
+        self.has_next = len(results) > self.page_size
+        return results[:self.page_size]
+
+    def page_link(self, page):
+        url = self.request.build_absolute_uri()
+        if page == 1:
+            return remove_query_param(url, 'page')
+        return replace_query_param(url, 'page', page)
+
+    def get_paginated_response(self, data):
+        return Response({
+            'next': self.page_link(self.page + 1) if self.has_next else None,
+            'previous': self.page_link(self.page - 1) if self.page > 1 else None,
+            'results': data,
+        })
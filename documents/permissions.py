@@ -0,0 +1,9 @@
+from django.conf import settings
+from rest_framework.permissions import BasePermission, IsAdminUser
+
+
+class MetricsPermission(BasePermission):
+    # Staff only (a scraper sends a staff user's token), unless METRICS_PUBLIC
+    # opens the endpoint to scrapers that do not authenticate
+    def has_permission(self, request, view):
+        return settings.METRICS_PUBLIC or IsAdminUser().has_permission(request, view)
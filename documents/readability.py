@@ -0,0 +1,174 @@
+import functools
+import math
+import re
+from collections import Counter
+from itertools import islice
+
+# Counts behind the readability indices, collected in one pass over the text
+# with the same rules textstat uses (en_US), so the scores and the thresholds
+# applied to them stay the same:
+# - words are the whitespace separated tokens left after removing punctuation
+#   (apostrophes of contractions are kept)
+# - sentences are the regex matches below, ignoring those of two words or less
+# - syllables come from the CMU dictionary when NLTK has it, else from pyphen
+# - difficult words have 3+ syllables and are not on textstat's easy word list
+
+# A token is a word when anything is left of it once punctuation is removed
+WORD = re.compile(r'\S*\w\S*')
+SENTENCE = re.compile(r'\b[^.!?]+[.!?]*', re.UNICODE)
+NONCONTRACTION_APOSTROPHE = re.compile(r"'(?!(?:[tsd]|ve|ll|re))")
+PUNCTUATION = re.compile(r"[^\w\s']")
+# Paragraphs: text between line breaks
+SECTION = re.compile(r'[^\r\n]+')
+
+DIFFICULT_SYLLABLES = 3
+SYLLABLE_CACHE_SIZE = 100000
+
+
+def clean_text(text):
+    return PUNCTUATION.sub('', NONCONTRACTION_APOSTROPHE.sub('', text))
+
+
+@functools.lru_cache(maxsize=None)
+def cmudict():
+    # Only used when already installed; textstat would download it
+    try:
+        import nltk
+        nltk.data.find('corpora/cmudict')
+        return nltk.corpus.cmudict.dict()
+    except (ImportError, LookupError):
+        return {}
+
+
+@functools.lru_cache(maxsize=None)
+def hyphenator():
+    from pyphen import Pyphen
+    return Pyphen(lang='en_US')
+
+
+@functools.lru_cache(maxsize=None)
+def easy_words():
+    import importlib.resources
+    resource = importlib.resources.files('textstat').joinpath('resources/en/easy_words.txt')
+    with resource.open(encoding='utf-8') as file:
+        return frozenset(line.strip() for line in file)
+
+
+@functools.lru_cache(maxsize=SYLLABLE_CACHE_SIZE)
+def word_syllables(word):
+    # Syllables of a lowercased word, memoised: documents repeat their words
+    phones = cmudict().get(word)
+    if phones:
+        return sum(1 for phone in phones[0] if phone[-1].isdigit())
+    return len(hyphenator().positions(word)) + 1
+
+
+@functools.lru_cache(maxsize=SYLLABLE_CACHE_SIZE)
+def word_counts(word):
+    # (syllables, polysyllable, difficult) of a word
+    lowered = word.lower()
+    syllables = word_syllables(lowered)
+    polysyllable = syllables >= 3
+    difficult = lowered not in easy_words() and syllables >= DIFFICULT_SYLLABLES
+    return syllables, polysyllable, difficult
+
+
+class ReadabilityCounts:
+    def __init__(self, sentences=0, words=0, syllables=0, polysyllables=0, difficult_words=0):
+        self.sentences = sentences
+        self.words = words
+        self.syllables = syllables
+        self.polysyllables = polysyllables
+        self.difficult_words = difficult_words
+
+    def words_per_sentence(self):
+        return self.words / self.sentences if self.sentences else 0.0
+
+    def syllables_per_word(self):
+        return self.syllables / self.words if self.words else 0.0
+
+    def flesch_kincaid_grade(self):
+        sentence_length = self.words_per_sentence()
+        syllables = self.syllables_per_word()
+        if sentence_length == 0 or syllables == 0:
+            return 0.0
+        return (0.39 * sentence_length) + (11.8 * syllables) - 15.59
+
+    def flesch_reading_ease(self):
+        sentence_length = self.words_per_sentence()
+        syllables = self.syllables_per_word()
+        if sentence_length == 0 or syllables == 0:
+            return 0.0
+        return 206.835 - 1.015 * sentence_length - 84.6 * syllables
+
+    def gunning_fog(self):
+        if not self.words:
+            return 0.0
+        return 0.4 * (self.words_per_sentence() + 100 * self.difficult_words / self.words)
+
+    def smog_index(self):
+        if not self.sentences:
+            return 0.0
+        return (1.043 * math.sqrt(30 * (self.polysyllables / self.sentences))) + 3.1291
+
+    def scores(self):
+        return {
+            "flesch_kincaid_grade": self.flesch_kincaid_grade(),
+            "gunning_fog": self.gunning_fog(),
+            "flesch_reading_ease": self.flesch_reading_ease(),
+            "smog_index": self.smog_index(),
+        }
+
+    def add(self, other):
+        self.sentences += other.sentences
+        self.words += other.words
+        self.syllables += other.syllables
+        self.polysyllables += other.polysyllables
+        self.difficult_words += other.difficult_words
+
+
+def count_words(text):
+    # Word, syllable, polysyllable and difficult word counts; every distinct
+    # word is looked up once
+    counts = ReadabilityCounts()
+    for word, occurrences in Counter(clean_text(text).split()).items():
+        syllables, polysyllable, difficult = word_counts(word)
+        counts.words += occurrences
+        counts.syllables += syllables * occurrences
+        counts.polysyllables += polysyllable * occurrences
+        counts.difficult_words += difficult * occurrences
+    return counts
+
+
+def analyze_readability(text, sections=False):
+    # Returns the counts of the whole text and, with sections=True, a list of
+    # (start, end, counts) for every paragraph. The paragraph counts add up to
+    # the document's; a sentence counts for the paragraph it starts in.
+    if not sections:
+        document = count_words(text)
+        parts = []
+    else:
+        document = ReadabilityCounts()
+        spans = [match.span() for match in SECTION.finditer(text)]
+        parts = [(start, end, count_words(text[start:end])) for start, end in spans]
+        for _, _, counts in parts:
+            document.add(counts)
+
+    section = 0
+    for match in SENTENCE.finditer(text):
+        # Fragments of two words or less (headings, list items) are skipped
+        if sum(1 for _ in islice(WORD.finditer(text, match.start(), match.end()), 3)) <= 2:
+            continue
+        document.sentences += 1
+        if parts:
+            while parts[section][1] <= match.start():
+                section += 1
+            parts[section][2].sentences += 1
+
+    # Any text has at least one sentence, and so does any paragraph with words
+    if text:
+        document.sentences = max(1, document.sentences)
+    for _, _, counts in parts:
+        if counts.words:
+            counts.sentences = max(1, counts.sentences)
+    return document, parts
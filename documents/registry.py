@@ -0,0 +1,120 @@
+import functools
+import threading
+import time
+
+from django.conf import settings
+
+
+class ModelRegistry:
+    # Loads each model on first use instead of at import time. Models can be
+    # warmed explicitly (manage.py warm_models, or in a parent process before
+    # it forks workers so they share the loaded weights copy-on-write).
+    def __init__(self):
+        self.loaders = {}
+        self.instances = {}
+        self.load_times = {}
+        self.lock = threading.Lock()
+
+    def register(self, name, loader):
+        self.loaders[name] = loader
+
+    def get(self, name):
+        instance = self.instances.get(name)
+        if instance is None:
+            with self.lock:
+                instance = self.instances.get(name)
+                if instance is None:
+                    start = time.perf_counter()
+                    instance = self.loaders[name]()
+                    self.load_times[name] = time.perf_counter() - start
+                    self.instances[name] = instance
+        return instance
+
+    def is_loaded(self, name):
+        return name in self.instances
+
+    def warm(self, names=None):
+        for name in self.loaders if names is None else names:
+            self.get(name)
+
+    def proxy(self, name):
+        return LazyModel(self, name)
+
+
+class LazyModel:
+    # Stands in for a model object and loads it the first time it is used
+    def __init__(self, registry, name):
+        self._registry = registry
+        self._name = name
+
+    def __call__(self, *args, **kwargs):
+        return self._registry.get(self._name)(*args, **kwargs)
+
+    def __getattr__(self, attr):
+        return getattr(self._registry.get(self._name), attr)
+
+    def __repr__(self):
+        state = 'loaded' if self._registry.is_loaded(self._name) else 'not loaded'
+        return f"<LazyModel {self._name} ({state})>"
+
+
+def load_spacy():
+    import spacy
+    return spacy.load(settings.SPACY_MODEL)
+
+
+def load_languagetool():
+    # Either the Java server or the offline stand-in
+    if settings.LANGUAGETOOL_BACKEND == 'local':
+        from .languagetool import LocalLanguageTool
+        return LocalLanguageTool('en-US')
+    import language_tool_python
+    return language_tool_python.LanguageTool('en-US')
+
+
+def load_grammar_pipeline():
+    # GRAMMAR_BACKEND picks full precision, int8 or ONNX Runtime inference
+    from .grammar_models import load_pipeline
+    return load_pipeline(settings.GRAMMAR_BACKEND)
+
+
+def load_spelling():
+    # The symmetric delete index takes a second or two to build, so it is
+    # built once per process (or before forking, with PRELOAD_MODELS)
+    from .spelling import SymSpellCorrector, TextBlobCorrector, textblob_dictionary_path
+    if settings.SPELLING_ENGINE == 'textblob':
+        return TextBlobCorrector()
+    return SymSpellCorrector.from_file(
+        settings.SPELLING_DICTIONARY or textblob_dictionary_path(),
+        max_distance=settings.SPELLING_MAX_EDIT_DISTANCE,
+        cache_size=settings.SPELLING_CACHE_SIZE,
+    )
+
+
+LOADERS = {
+    'spacy': load_spacy,
+    'languagetool': load_languagetool,
+    'grammar': load_grammar_pipeline,
+    'spelling': load_spelling,
+}
+
+
+def load_model(name):
+    # With INFERENCE_SERVER set the models live in the shared inference server
+    # (manage.py run_inference_server) and this process only holds a client
+    if settings.INFERENCE_SERVER:
+        from .inference import remote_model
+        return remote_model(name, settings.INFERENCE_SERVER)
+    return LOADERS[name]()
+
+
+def local_registry():
+    registry = ModelRegistry()
+    for name, loader in LOADERS.items():
+        registry.register(name, loader)
+    return registry
+
+
+registry = ModelRegistry()
+for name in LOADERS:
+    registry.register(name, functools.partial(load_model, name))
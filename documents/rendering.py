@@ -0,0 +1,114 @@
+import hashlib
+import os
+import re
+import threading
+import zipfile
+from io import BytesIO
+from xml.sax.saxutils import escape
+
+from django.conf import settings
+from django.core.cache import cache
+from docx import Document as DocxDocument
+
+ORGANIZATION_NAME = "AI DOCUMENT ASSISTANT"
+
+DOCUMENT_XML = 'word/document.xml'
+
+# Stand-ins put where the per-document values go when the template is
+# analysed; the rendered XML is the template XML with these filled in
+TITLE_SLOT = 'DOCUMENT-TITLE-SLOT-7f3a'
+CONTENT_SLOT = 'IMPROVED-CONTENT-SLOT-7f3a'
+SLOT_PATTERN = re.compile(f'({TITLE_SLOT}|{CONTENT_SLOT})')
+
+# Characters XML 1.0 cannot hold
+INVALID_XML_CHARS = re.compile('[\x00-\x08\x0b\x0c\x0e-\x1f\ufffe\uffff]')
+
+
+def run_text_xml(text):
+    # Text for inside a <w:t>, written the way python-docx writes run text:
+    # line breaks and tabs become <w:br/> and <w:tab/> elements
+    text = escape(INVALID_XML_CHARS.sub('', text))
+    text = text.replace('\r\n', '\n').replace('\r', '\n')
+    text = text.replace('\n', '</w:t><w:br/><w:t xml:space="preserve">')
+    return text.replace('\t', '</w:t><w:tab/><w:t xml:space="preserve">')
+
+
+class WordTemplate:
+    # templates/template.docx analysed once: the package without its main
+    # part, and the main part's XML split around the placeholder slots.
+    # Rendering only escapes the values and appends one zip entry.
+    def __init__(self, path):
+        self.path = path
+        # (version, package bytes, document.xml parts), replaced as a whole
+        self.state = (None, None, None)
+        self.lock = threading.Lock()
+
+    def load(self):
+        version = os.stat(self.path).st_mtime_ns
+        if version == self.state[0]:
+            return self.state
+        with self.lock:
+            if version == self.state[0]:
+                return self.state
+            # Fill the placeholders exactly as the per-request code did, with
+            # slots standing in for the per-document values
+            template = DocxDocument(self.path)
+            for paragraph in template.paragraphs:
+                if '<<ORGANIZATION_NAME>>' in paragraph.text:
+                    paragraph.text = paragraph.text.replace('<<ORGANIZATION_NAME>>', ORGANIZATION_NAME)
+                if '<<DOCUMENT_TITLE>>' in paragraph.text:
+                    paragraph.text = paragraph.text.replace('<<DOCUMENT_TITLE>>', TITLE_SLOT)
+                if '<<IMPROVED_CONTENT>>' in paragraph.text:
+                    for run in paragraph.runs:
+                        if '<<IMPROVED_CONTENT>>' in run.text:
+                            run.text = run.text.replace('<<IMPROVED_CONTENT>>', CONTENT_SLOT)
+            filled = BytesIO()
+            template.save(filled)
+
+            package = BytesIO()
+            with zipfile.ZipFile(filled) as source, zipfile.ZipFile(package, 'w', zipfile.ZIP_DEFLATED) as target:
+                for info in source.infolist():
+                    if info.filename == DOCUMENT_XML:
+                        document_xml = source.read(info).decode('utf-8')
+                    else:
+                        target.writestr(info, source.read(info), zipfile.ZIP_DEFLATED)
+
+            parts = SLOT_PATTERN.split(document_xml)
+            for index in range(0, len(parts) - 1, 2):
+                # Values may start or end with spaces, so the <w:t> holding a
+                # slot has to preserve them
+                opening = parts[index].rfind('<w:t>')
+                if opening != -1 and opening == parts[index].rfind('<w:t'):
+                    parts[index] = parts[index][:opening] + '<w:t xml:space="preserve">' + parts[index][opening + len('<w:t>'):]
+            self.state = (version, package.getvalue(), parts)
+            return self.state
+
+    def render(self, title, content):
+        _, package_bytes, parts = self.load()
+        values = {TITLE_SLOT: run_text_xml(title), CONTENT_SLOT: run_text_xml(content)}
+        document_xml = ''.join(values.get(part, part) for part in parts)
+        output = BytesIO(package_bytes)
+        with zipfile.ZipFile(output, 'a', zipfile.ZIP_DEFLATED) as package:
+            package.writestr(DOCUMENT_XML, document_xml)
+        return output.getvalue()
+
+
+word_template = WordTemplate(os.path.join(settings.BASE_DIR, 'templates', 'template.docx'))
+
+
+def word_document_etag(document, content):
+    # Changes whenever the improved content, the title or the template does
+    version = word_template.load()[0]
+    key = f'{document.id}:{content.updated_at.isoformat()}:{document.file_name}:{version}'
+    return '"' + hashlib.sha256(key.encode('utf-8')).hexdigest()[:32] + '"'
+
+
+def render_word_document(document, content, etag):
+    # Rendered files are cached by their ETag; large ones are rendered each time
+    cache_key = 'documents:word:' + etag.strip('"')
+    data = cache.get(cache_key)
+    if data is None:
+        data = word_template.render(document.file_name, content.improved_content or '')
+        if len(data) <= settings.WORD_DOCUMENT_CACHE_MAX_BYTES:
+            cache.set(cache_key, data, settings.WORD_DOCUMENT_CACHE_TTL)
+    return data
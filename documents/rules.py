@@ -0,0 +1,78 @@
+import re
+from collections import deque, namedtuple
+
+# Words are runs of letters/digits, optionally joined by apostrophes (y'all)
+WORD = re.compile(r"\w+(?:['’]\w+)*")
+
+RuleMatch = namedtuple('RuleMatch', ['start', 'end', 'rule_set', 'phrase', 'replacement'])
+
+
+class RuleMatcher:
+    # Aho-Corasick automaton over words: every house-style rule (single words
+    # and multi-word phrases) is compiled into one automaton and a text is
+    # scanned once, whatever the number of rules
+    def __init__(self):
+        self.goto = [{}]
+        self.fail = [0]
+        self.output = [[]]
+        self.rules = []
+
+    @classmethod
+    def from_config(cls, config):
+        matcher = cls()
+        for phrase, replacement in config.get('redundant_phrases', {}).items():
+            matcher.add('redundant_phrases', phrase, replacement)
+        for word, replacement in config.get('complex_words', {}).items():
+            matcher.add('complex_words', word, replacement)
+        for word in config.get('casual_words', []):
+            matcher.add('casual_words', word)
+        matcher.compile()
+        return matcher
+
+    def add(self, rule_set, phrase, replacement=None):
+        words = [word.lower() for word in WORD.findall(phrase)]
+        if not words:
+            return
+        state = 0
+        for word in words:
+            if word not in self.goto[state]:
+                self.goto.append({})
+                self.fail.append(0)
+                self.output.append([])
+                self.goto[state][word] = len(self.goto) - 1
+            state = self.goto[state][word]
+        self.output[state].append(len(self.rules))
+        self.rules.append((rule_set, phrase, replacement, len(words)))
+
+    def compile(self):
+        # Breadth-first construction of the failure links; each state's output
+        # also gets the outputs of its failure state (suffix matches)
+        queue = deque(self.goto[0].values())
+        while queue:
+            state = queue.popleft()
+            for word, next_state in self.goto[state].items():
+                queue.append(next_state)
+                fallback = self.fail[state]
+                while fallback and word not in self.goto[fallback]:
+                    fallback = self.fail[fallback]
+                self.fail[next_state] = self.goto[fallback].get(word, 0)
+                if self.fail[next_state] == next_state:
+                    self.fail[next_state] = 0
+                self.output[next_state] = self.output[next_state] + self.output[self.fail[next_state]]
+
+    def find(self, text):
+        # Returns every rule hit with character offsets, ordered by position
+        words = [(m.start(), m.end(), m.group().lower()) for m in WORD.finditer(text)]
+        matches = []
+        goto, fail, output, rules = self.goto, self.fail, self.output, self.rules
+        state = 0
+        for index, (_, end, word) in enumerate(words):
+            while state and word not in goto[state]:
+                state = fail[state]
+            state = goto[state].get(word, 0)
+            for rule_index in output[state]:
+                rule_set, phrase, replacement, length = rules[rule_index]
+                start = words[index - length + 1][0]
+                matches.append(RuleMatch(start, end, rule_set, phrase, replacement))
+        matches.sort(key=lambda match: (match.start, match.end))
+        return matches
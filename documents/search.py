@@ -0,0 +1,190 @@
+import functools
+import operator
+import re
+from collections import namedtuple
+
+from django.conf import settings
+from django.db import connection, transaction
+from django.db.models import Case, IntegerField, Q, Value, When
+
+from .models import Content, SearchEntry
+
+# A ranked result; on every backend a higher score is a better match
+SearchHit = namedtuple('SearchHit', ['document_id', 'score', 'snippet'])
+
+TERM = re.compile(r'\w+')
+MAX_TERMS = 20
+ELLIPSIS = '…'
+
+
+def index_uploads(uploads):
+    # Index new documents from (document, text) pairs, where text is the
+    # start of the body kept while it was extracted, so the stored body is
+    # never read back and decompressed for this
+    entries = [
+        SearchEntry(document_id=document.pk, user_id=document.user_id,
+                    original_content=text[:settings.SEARCH_INDEX_MAX_CHARS])
+        for document, text in uploads
+    ]
+    with transaction.atomic():
+        SearchEntry.objects.filter(document_id__in=[entry.document_id for entry in entries]).delete()
+        SearchEntry.objects.bulk_create(entries, batch_size=100)
+
+
+def index_improvements(improved):
+    # Update the improved text of indexed documents from {document id:
+    # improved content}; documents without an entry are indexed from their
+    # stored contents
+    entries = [
+        SearchEntry(document_id=document_id, improved_content=improved_content[:settings.SEARCH_INDEX_MAX_CHARS])
+        for document_id, improved_content in improved.items()
+    ]
+    with transaction.atomic():
+        indexed = set(SearchEntry.objects.filter(document_id__in=list(improved)).values_list('document_id', flat=True))
+        SearchEntry.objects.bulk_update(
+            [entry for entry in entries if entry.document_id in indexed], ['improved_content'], batch_size=100
+        )
+    missing = [document_id for document_id in improved if document_id not in indexed]
+    if missing:
+        index_documents(missing)
+
+
+def index_documents(document_ids):
+    # (Re)writes the search entries of the documents from their stored
+    # contents; used to rebuild the index, as it decompresses the bodies
+    contents = Content.objects.filter(document_id__in=document_ids).select_related('document').only(
+        'document__id', 'document__user', 'original_content', 'improved_content'
+    )
+    entries = [
+        SearchEntry(
+            document_id=content.document.id,
+            user_id=content.document.user_id,
+            original_content=content.original_content[:settings.SEARCH_INDEX_MAX_CHARS],
+            improved_content=(content.improved_content or '')[:settings.SEARCH_INDEX_MAX_CHARS],
+        )
+        for content in contents
+    ]
+    with transaction.atomic():
+        SearchEntry.objects.filter(document_id__in=document_ids).delete()
+        SearchEntry.objects.bulk_create(entries, batch_size=100)
+
+
+def rebuild_index(batch_size=500):
+    SearchEntry.objects.all().delete()
+    document_ids = list(Content.objects.order_by('document_id').values_list('document_id', flat=True))
+    for start in range(0, len(document_ids), batch_size):
+        index_documents(document_ids[start:start + batch_size])
+    return len(document_ids)
+
+
+def search_terms(query):
+    # Words of the query, lowercased and deduplicated; operators and quotes
+    # are not passed on to the full-text syntax of the database
+    return list(dict.fromkeys(term.lower() for term in TERM.findall(query)))[:MAX_TERMS]
+
+
+def clip(window, cut_start, cut_end):
+    # A snippet from a window of the text: words cut by the window are
+    # dropped and the cuts marked with an ellipsis
+    window = ' '.join(window.split())
+    if cut_start and ' ' in window:
+        window = ELLIPSIS + window[window.index(' ') + 1:]
+    if cut_end and ' ' in window:
+        window = window[:window.rindex(' ')] + ELLIPSIS
+    return window
+
+
+def search(user, query, offset, limit):
+    # The user's documents best matching any of the query terms
+    terms = search_terms(query)
+    if not terms:
+        return []
+    if connection.vendor == 'mysql':
+        return mysql_search(user.id, terms, offset, limit)
+    if connection.vendor == 'sqlite':
+        return sqlite_search(user.id, terms, offset, limit)
+    return fallback_search(user.id, terms, offset, limit)
+
+
+def mysql_search(user_id, terms, offset, limit):
+    # Natural language mode ranks by relevance over both bodies
+    against = ' '.join(terms)
+    with connection.cursor() as cursor:
+        cursor.execute(
+            "SELECT document_id, MATCH(original_content, improved_content) AGAINST (%s IN NATURAL LANGUAGE MODE) AS score "
+            "FROM search_index "
+            "WHERE user_id = %s AND MATCH(original_content, improved_content) AGAINST (%s IN NATURAL LANGUAGE MODE) "
+            "ORDER BY score DESC, document_id DESC LIMIT %s OFFSET %s",
+            [against, user_id, against, limit, offset],
+        )
+        rows = cursor.fetchall()
+    snippets = mysql_snippets([document_id for document_id, _ in rows], terms)
+    return [SearchHit(document_id, float(score), snippets.get(document_id, '')) for document_id, score in rows]
+
+
+def mysql_snippets(document_ids, terms):
+    # Only a window around the first occurrence of the longest term is read,
+    # preferring the improved content
+    if not document_ids:
+        return {}
+    term = max(terms, key=len)
+    size = settings.SEARCH_SNIPPET_CHARS
+    window = "SUBSTRING({0}, GREATEST(LOCATE(%s, {0}) - %s, 1), %s), GREATEST(LOCATE(%s, {0}) - %s, 1), CHAR_LENGTH({0})"
+    placeholders = ', '.join(['%s'] * len(document_ids))
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f"SELECT document_id, LOCATE(%s, improved_content), {window.format('improved_content')}, "
+            f"{window.format('original_content')} FROM search_index WHERE document_id IN ({placeholders})",
+            [term] + [term, size // 2, size, term, size // 2] * 2 + list(document_ids),
+        )
+        rows = cursor.fetchall()
+    snippets = {}
+    for document_id, improved_at, *columns in rows:
+        text, start, length = columns[:3] if improved_at else columns[3:]
+        snippets[document_id] = clip(text or '', start > 1, start + size - 1 < length)
+    return snippets
+
+
+def sqlite_search(user_id, terms, offset, limit):
+    # FTS5 ranks with BM25, where lower is better, and builds the snippets
+    match = ' OR '.join(f'"{term}"' for term in terms)
+    snippet_tokens = max(8, min(64, settings.SEARCH_SNIPPET_CHARS // 6))
+    with connection.cursor() as cursor:
+        cursor.execute(
+            "SELECT search_index_fts.rowid, -bm25(search_index_fts), "
+            "snippet(search_index_fts, -1, '', '', %s, %s) "
+            "FROM search_index_fts JOIN search_index ON search_index.document_id = search_index_fts.rowid "
+            "WHERE search_index_fts MATCH %s AND search_index.user_id = %s "
+            "ORDER BY bm25(search_index_fts), search_index_fts.rowid DESC LIMIT %s OFFSET %s",
+            [ELLIPSIS, snippet_tokens, match, user_id, limit, offset],
+        )
+        rows = cursor.fetchall()
+    return [SearchHit(document_id, score, ' '.join(snippet.split())) for document_id, score, snippet in rows]
+
+
+def fallback_search(user_id, terms, offset, limit):
+    # Databases without a full-text index here: a scan of the user's entries,
+    # ranked by how many of the terms each one contains
+    matches = [Q(original_content__icontains=term) | Q(improved_content__icontains=term) for term in terms]
+    score = sum((Case(When(match, then=1), default=0, output_field=IntegerField()) for match in matches), Value(0))
+    rows = (
+        SearchEntry.objects.filter(user_id=user_id)
+        .filter(functools.reduce(operator.or_, matches))
+        .annotate(score=score)
+        .order_by('-score', '-document_id')
+        .values_list('document_id', 'score', 'original_content', 'improved_content')[offset:offset + limit]
+    )
+    hits = []
+    size = settings.SEARCH_SNIPPET_CHARS
+    for document_id, score, original_content, improved_content in rows:
+        # Window around the first occurrence of any term, preferring the
+        # improved content
+        text = next(
+            (text for text in (improved_content, original_content) if any(term in text.lower() for term in terms)),
+            original_content,
+        )
+        lowered = text.lower()
+        found = min((lowered.find(term) for term in terms if term in lowered), default=0)
+        start = max(found - size // 2, 0)
+        hits.append(SearchHit(document_id, float(score), clip(text[start:start + size], start > 0, start + size < len(text))))
+    return hits
@@ -0,0 +1,28 @@
+from django.contrib.auth.models import User
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from .models import Document
+from .statistics import DOCUMENTS, USERS, adjust_counters, status_counter
+
+
+@receiver(post_save, sender=Document)
+def count_created_document(sender, instance, created, **kwargs):
+    if created:
+        adjust_counters({DOCUMENTS: 1, status_counter(instance.status): 1})
+
+
+@receiver(post_delete, sender=Document)
+def count_deleted_document(sender, instance, **kwargs):
+    adjust_counters({DOCUMENTS: -1, status_counter(instance.status): -1})
+
+
+@receiver(post_save, sender=User)
+def count_created_user(sender, instance, created, **kwargs):
+    if created:
+        adjust_counters({USERS: 1})
+
+
+@receiver(post_delete, sender=User)
+def count_deleted_user(sender, instance, **kwargs):
+    adjust_counters({USERS: -1})
@@ -0,0 +1,137 @@
+import functools
+import os
+import re
+
+# Same tokens as TextBlob.correct(): words, single punctuation marks and
+# single whitespace characters, so joining them gives back the text
+TOKEN = re.compile(r'\w+|[^\w\s]|\s')
+
+
+def textblob_dictionary_path():
+    # The word frequency list TextBlob's own corrector uses
+    import textblob
+    return os.path.join(os.path.dirname(textblob.__file__), 'en', 'en-spelling.txt')
+
+
+def load_frequencies(path):
+    # "word count" per line; lines starting with ;;; are comments
+    frequencies = {}
+    with open(path, 'r', encoding='utf-8') as file:
+        for line in file:
+            if line.startswith(';;;'):
+                continue
+            parts = line.split()
+            if len(parts) == 2:
+                frequencies[parts[0]] = int(parts[1])
+    return frequencies
+
+
+def edit_distance(a, b, max_distance):
+    # Optimal string alignment distance (insertions, deletions, replacements
+    # and adjacent transpositions); max_distance + 1 once it is exceeded
+    if abs(len(a) - len(b)) > max_distance:
+        return max_distance + 1
+    previous_previous = None
+    previous = list(range(len(b) + 1))
+    for i in range(1, len(a) + 1):
+        current = [i] + [0] * len(b)
+        row_minimum = i
+        for j in range(1, len(b) + 1):
+            cost = 0 if a[i - 1] == b[j - 1] else 1
+            value = min(previous[j] + 1, current[j - 1] + 1, previous[j - 1] + cost)
+            if i > 1 and j > 1 and a[i - 1] == b[j - 2] and a[i - 2] == b[j - 1]:
+                value = min(value, previous_previous[j - 2] + 1)
+            current[j] = value
+            row_minimum = min(row_minimum, value)
+        if row_minimum > max_distance:
+            return max_distance + 1
+        previous_previous, previous = previous, current
+    return min(previous[len(b)], max_distance + 1)
+
+
+def deletes(word, max_distance):
+    # Every string made by deleting up to max_distance characters
+    found = set()
+    level = {word}
+    for _ in range(max_distance):
+        level = {candidate[:i] + candidate[i + 1:] for candidate in level for i in range(len(candidate))}
+        level -= found
+        found |= level
+    return found
+
+
+class SymSpellCorrector:
+    # Symmetric delete spelling correction: every dictionary word is indexed
+    # under the strings made by deleting up to max_distance characters from
+    # its prefix, so the candidates for a word are found by looking up its own
+    # deletes instead of generating and checking every possible edit.
+    # Picks the same word as TextBlob's corrector: the known word itself, else
+    # the most frequent word at the smallest edit distance (up to 2).
+    def __init__(self, frequencies, max_distance=2, prefix_length=7, cache_size=100000):
+        self.frequencies = frequencies
+        self.max_distance = max_distance
+        self.prefix_length = prefix_length
+        self.index = {}
+        for word in frequencies:
+            prefix = word[:prefix_length]
+            self.index.setdefault(prefix, []).append(word)
+            for delete in deletes(prefix, max_distance):
+                self.index.setdefault(delete, []).append(word)
+        # Words repeat a lot within and across documents
+        self.correct_word = functools.lru_cache(maxsize=cache_size)(self.correct_word)
+
+    @classmethod
+    def from_file(cls, path, **kwargs):
+        return cls(load_frequencies(path), **kwargs)
+
+    def suggest(self, word):
+        if word in self.frequencies:
+            return word
+        best_distance = self.max_distance + 1
+        best = []
+        checked = set()
+        prefix = word[:self.prefix_length]
+        candidates = [prefix]
+        seen = {prefix}
+        # Breadth first over the deletes of the input, fewest deletes first
+        for candidate in candidates:
+            if len(prefix) - len(candidate) > best_distance:
+                break
+            for suggestion in self.index.get(candidate, ()):
+                if suggestion in checked:
+                    continue
+                checked.add(suggestion)
+                distance = edit_distance(word, suggestion, self.max_distance)
+                if distance > self.max_distance:
+                    continue
+                if distance < best_distance:
+                    best_distance = distance
+                    best = [suggestion]
+                elif distance == best_distance:
+                    best.append(suggestion)
+            if len(prefix) - len(candidate) < self.max_distance:
+                for i in range(len(candidate)):
+                    delete = candidate[:i] + candidate[i + 1:]
+                    if delete not in seen:
+                        seen.add(delete)
+                        candidates.append(delete)
+        if not best:
+            return word
+        return max(best, key=lambda suggestion: (self.frequencies[suggestion], suggestion))
+
+    def correct_word(self, word):
+        # Tokens TextBlob leaves alone: single characters and numbers
+        if len(word) == 1 or word.replace('.', '').isdigit():
+            return word
+        corrected = self.suggest(word)
+        return corrected.title() if word.istitle() else corrected
+
+    def correct(self, text):
+        return ''.join(self.correct_word(token) if not token.isspace() else token for token in TOKEN.findall(text))
+
+
+class TextBlobCorrector:
+    # The original corrector: Norvig-style candidate generation per word
+    def correct(self, text):
+        from textblob import TextBlob
+        return str(TextBlob(text).correct())
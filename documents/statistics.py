@@ -0,0 +1,98 @@
+from collections import Counter
+
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models import Count, F, Q
+from django.utils import timezone
+
+from .models import Document, StatisticCounter
+
+CACHE_KEY = 'documents:statistics'
+
+# Counter names kept in the statistic_counters table
+USERS = 'users'
+DOCUMENTS = 'documents'
+
+
+def status_counter(status):
+    return f'status:{status}'
+
+
+def adjust_counters(deltas):
+    # Apply {counter name: delta} with atomic increments
+    for name, delta in deltas.items():
+        if not delta:
+            continue
+        if not StatisticCounter.objects.filter(name=name).update(value=F('value') + delta):
+            StatisticCounter.objects.get_or_create(name=name)
+            StatisticCounter.objects.filter(name=name).update(value=F('value') + delta)
+
+
+def set_document_status(queryset, status, **fields):
+    # Change the status of the documents in queryset and move their counts
+    # between the status counters. Status changes go through here because
+    # queryset.update() does not send signals.
+    with transaction.atomic():
+        rows = list(queryset.select_for_update().values_list('id', 'status'))
+        if not rows:
+            return 0
+        Document.objects.filter(id__in=[row[0] for row in rows]).update(
+            status=status, updated_at=timezone.now(), **fields
+        )
+        deltas = Counter()
+        for _, old_status in rows:
+            if old_status != status:
+                deltas[status_counter(old_status)] -= 1
+                deltas[status_counter(status)] += 1
+        adjust_counters(deltas)
+    return len(rows)
+
+
+def compute_statistics():
+    # One aggregate over documents with conditional counts
+    counts = Document.objects.aggregate(
+        total=Count('id'),
+        approved=Count('id', filter=Q(status='approved')),
+        rejected=Count('id', filter=Q(status='rejected')),
+    )
+    return {
+        'total_users': User.objects.count(),
+        'total_uploaded_documents': counts['total'],
+        'total_approved_documents': counts['approved'],
+        'total_rejected_documents': counts['rejected'],
+        'total_documents': counts['total'],
+    }
+
+
+def counter_statistics():
+    # O(1): read the materialized counters instead of scanning documents
+    names = [USERS, DOCUMENTS, status_counter('approved'), status_counter('rejected')]
+    values = dict(StatisticCounter.objects.filter(name__in=names).values_list('name', 'value'))
+    return {
+        'total_users': values.get(USERS, 0),
+        'total_uploaded_documents': values.get(DOCUMENTS, 0),
+        'total_approved_documents': values.get(status_counter('approved'), 0),
+        'total_rejected_documents': values.get(status_counter('rejected'), 0),
+        'total_documents': values.get(DOCUMENTS, 0),
+    }
+
+
+def get_statistics():
+    compute = counter_statistics if settings.STATISTICS_USE_COUNTERS else compute_statistics
+    return cache.get_or_set(CACHE_KEY, compute, settings.STATISTICS_CACHE_TTL)
+
+
+def rebuild_counters():
+    # Recount everything from the tables, e.g. after a bulk import
+    with transaction.atomic():
+        StatisticCounter.objects.all().delete()
+        counters = [
+            StatisticCounter(name=USERS, value=User.objects.count()),
+            StatisticCounter(name=DOCUMENTS, value=Document.objects.count()),
+        ]
+        for status, count in Document.objects.values_list('status').annotate(count=Count('id')).order_by():
+            counters.append(StatisticCounter(name=status_counter(status), value=count))
+        StatisticCounter.objects.bulk_create(counters)
+    cache.delete(CACHE_KEY)
@@ -1,3 +1,694 @@
-from django.test import TestCase
+import importlib.util
+import os
+import subprocess
+import sys
+import tempfile
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
+from multiprocessing import AuthenticationError
+from unittest import mock, skipUnless
 
-# Create your tests here.
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.db import connection
+from django.db.migrations.executor import MigrationExecutor
+from django.test import SimpleTestCase, TestCase, TransactionTestCase, override_settings
+from django.utils import timezone
+from rest_framework.authtoken.models import Token
+from rest_framework.test import APIClient
+
+from .cache import ResultCache, SegmentStore, cache_key
+from .correction import GrammarCorrector, split_segments
+from .edits import Edit, Suggestion, apply_edits, match_case
+from .fields import TextCompressor, ZLIB_HEADER, ZSTD_HEADER, compress_text, decompress_text
+from .inference import InferenceClient, RemoteLanguageTool, RemoteSpelling
+from .jobs import claim_jobs, complete_jobs, enqueue_improvement, enqueue_improvements, fail_job, save_improvement
+from .languagetool import BatchedChecker, CheckResult, CheckedMatch, LocalLanguageTool, chunk_spans
+from .metrics import StageMetrics
+from .models import CachedImprovement, Content, Document, ImprovementJob, SearchEntry, SegmentResult, StageMetric
+from .registry import load_spelling
+from .rules import RuleMatcher
+from .search import fallback_search, search, search_terms
+from .statistics import counter_statistics, rebuild_counters
+
+
+class ChunkSpansTests(SimpleTestCase):
+    def assert_covers(self, text, spans, chunk_chars):
+        self.assertEqual(spans[0][0], 0)
+        self.assertEqual(spans[-1][1], len(text))
+        for (_, end), (start, _) in zip(spans, spans[1:]):
+            self.assertEqual(end, start)
+        for start, end in spans:
+            self.assertLessEqual(end - start, chunk_chars)
+
+    def test_cuts_after_the_last_sentence_end_in_the_window(self):
+        text = "One two. Three four. Five six seven eight."
+        spans = chunk_spans(text, 25)
+        self.assertEqual(text[spans[0][0]:spans[0][1]], "One two. Three four. ")
+        self.assert_covers(text, spans, 25)
+
+    def test_cuts_at_paragraph_breaks(self):
+        text = "First line\nSecond line\nThird"
+        spans = chunk_spans(text, 15)
+        self.assertEqual([text[start:end] for start, end in spans], ["First line\n", "Second line\n", "Third"])
+
+    def test_long_sentence_falls_back_to_whitespace(self):
+        text = "aaaa bbbb cccc dddd"
+        spans = chunk_spans(text, 10)
+        self.assertEqual([text[start:end] for start, end in spans], ["aaaa bbbb ", "cccc dddd"])
+
+    def test_word_longer_than_the_chunk_is_cut(self):
+        text = "abcdefghij"
+        self.assertEqual(chunk_spans(text, 4), [(0, 4), (4, 8), (8, 10)])
+
+    def test_given_boundaries_are_used(self):
+        text = "no punctuation here at all"
+        spans = chunk_spans(text, 20, boundaries=[3])
+        self.assertEqual(spans[0], (0, 3))
+        self.assert_covers(text, spans, 20)
+
+    def test_short_text_is_one_span(self):
+        self.assertEqual(chunk_spans("Short.", 100), [(0, 6)])
+
+
+class BatchedCheckerTests(SimpleTestCase):
+    text = (
+        "We found alot of issues. The the report is late.\n"
+        "You should of checked it. Irregardless, we ship it.\n"
+    ) * 5
+
+    def check(self, text, chunk_chars):
+        tool = LocalLanguageTool()
+        return BatchedChecker(tool, chunk_chars=chunk_chars).check(text), tool.requests
+
+    def test_offsets_are_relative_to_the_whole_text(self):
+        whole, requests = self.check(self.text, len(self.text))
+        self.assertEqual(requests, 1)
+        chunked, requests = self.check(self.text, 60)
+        self.assertGreater(requests, 1)
+        self.assertEqual(chunked.matches, whole.matches)
+        found = [
+            self.text[match.offset:match.offset + match.length].lower()
+            for match in chunked.matches if match.rule_id == 'EN_A_LOT'
+        ]
+        self.assertEqual(found, ['alot'] * 5)
+
+    def test_for_span_returns_the_matches_of_a_sentence(self):
+        result, _ = self.check(self.text, 60)
+        start = self.text.index("You should of", 200)
+        end = self.text.index("\n", start)
+        matches = result.for_span(start, end)
+        self.assertEqual([match.rule_id for match in matches], ['EN_COULD_OF', 'EN_IRREGARDLESS'])
+        for match in matches:
+            self.assertTrue(start <= match.offset < end)
+
+    def test_check_many_shifts_offsets_to_each_text(self):
+        texts = ["It was alot.", "No mistakes here.", "We would of gone."]
+        tool = LocalLanguageTool()
+        results = BatchedChecker(tool).check_many(texts)
+        self.assertEqual(tool.requests, 1)
+        self.assertEqual([match.offset for match in results[0].matches], [7])
+        self.assertEqual(results[1].matches, [])
+        self.assertEqual([(match.offset, match.rule_id) for match in results[2].matches], [(3, 'EN_COULD_OF')])
+
+    def test_check_result_sorts_matches(self):
+        result = CheckResult([
+            CheckedMatch(20, 2, 'b', [], 'B'),
+            CheckedMatch(5, 2, 'a', [], 'A'),
+        ])
+        self.assertEqual(result.messages(), ['a', 'b'])
+        self.assertEqual(result.for_span(0, 10), [CheckedMatch(5, 2, 'a', [], 'A')])
+        self.assertEqual(result.for_span(10, 20), [])
+
+
+class FakeTokenizer:
+    # One token per word
+    def __call__(self, texts, add_special_tokens=True):
+        return {'input_ids': [list(range(len(text.split()))) for text in texts]}
+
+
+class FakePipeline:
+    # Uppercases each window and records the batches it was given
+    def __init__(self):
+        self.tokenizer = FakeTokenizer()
+        self.batches = []
+
+    def __call__(self, texts, batch_size=None, max_length=None):
+        self.batches.append(list(texts))
+        return [[{'generated_text': text.upper()}] for text in texts]
+
+
+class GrammarCorrectorTests(SimpleTestCase):
+    def corrector(self, max_window_tokens=6, batch_size=8):
+        return GrammarCorrector(FakePipeline(), max_window_tokens=max_window_tokens, batch_size=batch_size)
+
+    def test_windows_hold_whole_sentences_up_to_the_limit(self):
+        text = "One two three. Four five six. Seven eight. Nine ten eleven twelve thirteen."
+        self.assertEqual(self.corrector().build_windows(text), [
+            ("One two three. Four five six.", ' '),
+            ("Seven eight.", ' '),
+            ("Nine ten eleven twelve thirteen.", ''),
+        ])
+
+    def test_paragraph_breaks_end_a_window(self):
+        text = "One two.\n\nThree four. Five.\nSix."
+        self.assertEqual(self.corrector().build_windows(text), [
+            ("One two.", '\n\n'),
+            ("Three four. Five.", '\n'),
+            ("Six.", ''),
+        ])
+
+    def test_long_sentences_are_cut_between_words(self):
+        text = "Short one. " + ' '.join(f"w{index}" for index in range(14)) + ". After."
+        windows = self.corrector(max_window_tokens=5).build_windows(text)
+        self.assertEqual(windows, [
+            ("Short one.", ' '),
+            ("w0 w1 w2 w3 w4", ' '),
+            ("w5 w6 w7 w8 w9", ' '),
+            ("w10 w11 w12 w13.", ' '),
+            ("After.", ''),
+        ])
+        self.assertTrue(all(len(window.split()) <= 5 for window, _ in windows))
+
+    def test_separators_are_rejoined_exactly(self):
+        text = "  First  one here.   Second one!\r\n\r\n  Third one?\tFourth " + "x " * 12 + "end.\n"
+        self.assertEqual(''.join(sentence + separator for sentence, separator in split_segments(text)), text)
+        corrector = self.corrector(max_window_tokens=5)
+        self.assertEqual(corrector.correct(text), text.upper())
+
+    def test_windows_of_several_texts_share_batches(self):
+        corrector = self.corrector(max_window_tokens=3, batch_size=4)
+        texts = ["One two. Three four.", "Five six.\nSeven.", "One two. Three four."]
+        self.assertEqual(corrector.correct_many(texts), [text.upper() for text in texts])
+        # Identical windows are corrected once, at most batch_size at a time
+        self.assertEqual(sorted(window for batch in corrector.pipeline.batches for window in batch),
+                         ["Five six.", "One two.", "Seven.", "Three four."])
+        self.assertTrue(all(len(batch) <= 4 for batch in corrector.pipeline.batches))
+
+
+class ApplyEditsTests(SimpleTestCase):
+    text = "We utilize the the tools in order to succeed."
+
+    def edit(self, phrase, replacement, occurrence=0):
+        start = self.text.index(phrase)
+        for _ in range(occurrence):
+            start = self.text.index(phrase, start + 1)
+        return Edit(start, start + len(phrase), replacement, 'test')
+
+    def test_edits_apply_in_one_pass_in_any_order(self):
+        edits = [self.edit("in order to", "to"), self.edit("utilize", "use")]
+        self.assertEqual(apply_edits(self.text, edits), "We use the the tools to succeed.")
+        self.assertEqual(apply_edits(self.text, edits[::-1]), "We use the the tools to succeed.")
+
+    def test_adjacent_edits_both_apply(self):
+        the = self.text.index("the the")
+        edits = [Edit(the, the + 4, "", 'repeat'), Edit(the + 4, the + 7, "our", 'word')]
+        self.assertEqual(apply_edits(self.text, edits), "We utilize our tools in order to succeed.")
+
+    def test_on_overlap_the_earliest_start_wins(self):
+        edits = [self.edit("order to succeed", "success"), self.edit("in order", "for")]
+        self.assertEqual(apply_edits(self.text, edits), "We utilize the the tools for to succeed.")
+
+    def test_on_the_same_start_the_longer_span_wins(self):
+        edits = [self.edit("in order", "for"), self.edit("in order to", "to")]
+        self.assertEqual(apply_edits(self.text, edits), "We utilize the the tools to succeed.")
+        self.assertEqual(apply_edits(self.text, edits[::-1]), "We utilize the the tools to succeed.")
+
+    def test_no_edits_keeps_the_text(self):
+        self.assertEqual(apply_edits(self.text, []), self.text)
+
+    def test_match_case_keeps_capitalised_words_capitalised(self):
+        self.assertEqual(match_case("Utilize", "use"), "Use")
+        self.assertEqual(match_case("utilize", "use"), "use")
+        self.assertEqual(match_case("UTILIZE", "use"), "Use")
+        self.assertEqual(match_case("Utilize", "Make use of"), "Make use of")
+        self.assertEqual(match_case("", "use"), "use")
+        text = "Utilize it, then utilize it again."
+        edits = [
+            Edit(found, found + len("utilize"), match_case(text[found:found + len("utilize")], "use"), 'complex_words')
+            for found in (0, text.index("utilize"))
+        ]
+        self.assertEqual(apply_edits(text, edits), "Use it, then use it again.")
+
+    def test_suggestions_shift_and_round_trip(self):
+        suggestion = Suggestion("Use 'use'.", [Edit(3, 10, "use", 'complex_words')], 'complex_words')
+        self.assertEqual(suggestion.shifted(5).edits, (Edit(8, 15, "use", 'complex_words'),))
+        self.assertEqual(Suggestion.from_dict(suggestion.to_dict()), suggestion)
+
+
+class RuleMatcherTests(SimpleTestCase):
+    config = {
+        'redundant_phrases': {'in order to': 'to', 'order to': 'to', 'end result': 'result'},
+        'complex_words': {'utilize': 'use', 'use': 'apply'},
+        'casual_words': ['chill out', 'chill', "y'all"],
+    }
+
+    def find(self, text):
+        matcher = RuleMatcher.from_config(self.config)
+        return [(text[match.start:match.end], match.rule_set, match.replacement) for match in matcher.find(text)]
+
+    def test_multi_word_phrases_match(self):
+        self.assertEqual(self.find("The end result was fine."), [("end result", 'redundant_phrases', 'result')])
+        self.assertEqual(self.find("Just chill out."), [("chill", 'casual_words', None), ("chill out", 'casual_words', None)])
+
+    def test_overlapping_patterns_all_match(self):
+        self.assertEqual(self.find("We left in order to win."), [
+            ("in order to", 'redundant_phrases', 'to'),
+            ("order to", 'redundant_phrases', 'to'),
+        ])
+
+    def test_matching_ignores_case_and_whitespace_between_words(self):
+        self.assertEqual(self.find("UTILIZE it. In  Order\nTo win."), [
+            ("UTILIZE", 'complex_words', 'use'),
+            ("In  Order\nTo", 'redundant_phrases', 'to'),
+            ("Order\nTo", 'redundant_phrases', 'to'),
+        ])
+
+    def test_no_hits_inside_words(self):
+        self.assertEqual(self.find("The user utilized chilli and reordered the ends."), [])
+        self.assertEqual(self.find("See y'all soon."), [("y'all", 'casual_words', None)])
+
+    def test_offsets_are_character_offsets_of_the_text(self):
+        text = "Naïve users — utilize it, then use it."
+        matches = RuleMatcher.from_config(self.config).find(text)
+        self.assertEqual([(match.start, match.end) for match in matches], [(14, 21), (31, 34)])
+        self.assertEqual([match.phrase for match in matches], ['utilize', 'use'])
+
+
+class CompressedTextTests(TestCase):
+    text = "Ünïcode text, repeated. " * 200
+
+    def test_zlib_round_trip(self):
+        data = compress_text(self.text, 'zlib')
+        self.assertTrue(data.startswith(ZLIB_HEADER))
+        self.assertLess(len(data), len(self.text.encode('utf-8')))
+        self.assertEqual(decompress_text(data), self.text)
+
+    @skipUnless(importlib.util.find_spec('zstandard'), "zstandard is not installed")
+    def test_zstd_round_trip(self):
+        data = compress_text(self.text, 'zstd')
+        self.assertTrue(data.startswith(ZSTD_HEADER))
+        self.assertEqual(decompress_text(data), self.text)
+
+    def test_incremental_writes_match_one_write(self):
+        compressor = TextCompressor('zlib')
+        for start in range(0, len(self.text), 100):
+            compressor.write(self.text[start:start + 100])
+        self.assertEqual(decompress_text(compressor.finish()), self.text)
+
+    def test_headerless_rows_are_read_as_plain_text(self):
+        self.assertEqual(decompress_text(self.text.encode('utf-8')), self.text)
+        self.assertEqual(decompress_text(memoryview(self.text.encode('utf-8'))), self.text)
+        self.assertEqual(decompress_text(self.text), self.text)
+
+    def test_field_stores_compressed_bytes(self):
+        document = Document.objects.create(user=User.objects.create(username='compressed'), file_name='c.txt')
+        Content.objects.create(document=document, original_content=self.text, improved_content=None)
+        with connection.cursor() as cursor:
+            cursor.execute("SELECT original_content, improved_content FROM contents WHERE document_id = %s", [document.id])
+            original, improved = cursor.fetchone()
+        self.assertTrue(bytes(original).startswith(ZLIB_HEADER))
+        self.assertIsNone(improved)
+
+        # A row written before compression, as plain text
+        with connection.cursor() as cursor:
+            cursor.execute(
+                "UPDATE contents SET original_content = %s WHERE document_id = %s",
+                [connection.Database.Binary("Legacy body.".encode('utf-8')), document.id],
+            )
+        self.assertEqual(Content.objects.get(document=document).original_content, "Legacy body.")
+
+
+class CompressedContentMigrationTests(TransactionTestCase):
+    before = [('documents', '0003_statisticcounter')]
+    after = [('documents', '0004_compressed_content')]
+
+    def migrate(self, targets):
+        executor = MigrationExecutor(connection)
+        executor.loader.build_graph()
+        executor.migrate(targets)
+        return executor.loader.project_state(targets).apps
+
+    def tearDown(self):
+        executor = MigrationExecutor(connection)
+        executor.migrate(executor.loader.graph.leaf_nodes('documents'))
+
+    def raw_contents(self):
+        with connection.cursor() as cursor:
+            cursor.execute("SELECT original_content, improved_content, excerpt FROM contents ORDER BY id")
+            return [(bytes(original), improved if improved is None else bytes(improved), excerpt)
+                    for original, improved, excerpt in cursor.fetchall()]
+
+    def test_forward_compresses_and_reverse_restores_plain_text(self):
+        apps = self.migrate(self.before)
+        user = apps.get_model('auth', 'User').objects.create(username='migrated')
+        Document = apps.get_model('documents', 'Document')
+        Content = apps.get_model('documents', 'Content')
+        bodies = [("First body. " * 50, "Improved body."), ("Second body.", None)]
+        for index, (original, improved) in enumerate(bodies):
+            document = Document.objects.create(user=user, file_name=f'{index}.txt')
+            Content.objects.create(document=document, original_content=original, improved_content=improved)
+
+        self.migrate(self.after)
+        rows = self.raw_contents()
+        self.assertTrue(all(original.startswith(ZLIB_HEADER) for original, _, _ in rows))
+        self.assertTrue(rows[0][1].startswith(ZLIB_HEADER))
+        self.assertIsNone(rows[1][1])
+        self.assertEqual([excerpt for _, _, excerpt in rows], [bodies[0][0][:200], "Second body."])
+        self.assertEqual(
+            [decompress_text(original) for original, _, _ in rows], [original for original, _ in bodies]
+        )
+
+        apps = self.migrate(self.before)
+        Content = apps.get_model('documents', 'Content')
+        self.assertEqual(
+            list(Content.objects.order_by('id').values_list('original_content', 'improved_content')), bodies
+        )
+
+
+class ImprovementQueueTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create(username='queue')
+        self.documents = []
+        for index, status in enumerate(['uploaded', 'approved', 'rejected']):
+            document = Document.objects.create(user=self.user, file_name=f'{index}.txt', status=status)
+            Content.objects.create(document=document, original_content=f"Document {index} has alot of text.")
+            self.documents.append(document)
+
+    def assert_review_states_kept(self):
+        self.assertEqual(
+            [document.status for document in Document.objects.order_by('id')],
+            ['uploaded', 'approved', 'rejected'],
+        )
+
+    def test_claim_complete_and_fail(self):
+        approved_before = counter_statistics()['total_approved_documents']
+        jobs = enqueue_improvements(self.documents)
+        self.assertEqual([job.status for job in jobs], [ImprovementJob.QUEUED] * 3)
+        self.assert_review_states_kept()
+
+        claimed = claim_jobs(2)
+        self.assertEqual([job.pk for job in claimed], [jobs[0].pk, jobs[1].pk])
+        self.assertTrue(all(job.status == ImprovementJob.RUNNING and job.started_at for job in claimed))
+        self.assertEqual([job.pk for job in claim_jobs(10)], [jobs[2].pk])
+        self.assertEqual(claim_jobs(10), [])
+
+        first, second = claimed
+        contents = {content.document_id: content.id for content in Content.objects.all()}
+        complete_jobs([(first, contents[first.document_id], 'Improved text.', [{'message': 'm'}], {'total': 1.0})])
+        with self.assertLogs('documents.jobs', level='ERROR'):
+            fail_job(second, RuntimeError('model crashed'))
+
+        first.refresh_from_db()
+        second.refresh_from_db()
+        self.assertEqual(first.status, ImprovementJob.DONE)
+        self.assertEqual(first.timings, {'total': 1.0})
+        self.assertEqual(Content.objects.get(document_id=first.document_id).improved_content, 'Improved text.')
+        self.assertEqual(second.status, ImprovementJob.FAILED)
+        self.assertEqual(second.error, 'model crashed')
+        self.assert_review_states_kept()
+        self.assertEqual(counter_statistics()['total_approved_documents'], approved_before)
+
+    @override_settings(IMPROVEMENT_JOB_TIMEOUT=60)
+    def test_stale_running_jobs_are_claimed_again(self):
+        job = enqueue_improvement(self.documents[0])
+        claim_jobs(1)
+        ImprovementJob.objects.filter(pk=job.pk).update(started_at=timezone.now() - timedelta(seconds=120))
+        self.assertEqual([claimed.pk for claimed in claim_jobs(1)], [job.pk])
+
+    def test_active_jobs_are_not_queued_twice(self):
+        first = enqueue_improvements(self.documents[:2])
+        second = enqueue_improvements(self.documents)
+        self.assertEqual([job.pk for job in second[:2]], [job.pk for job in first])
+        self.assertEqual(ImprovementJob.objects.count(), 3)
+
+        # Once a job has finished, improving again queues a new one
+        ImprovementJob.objects.update(status=ImprovementJob.DONE)
+        self.assertNotEqual(enqueue_improvement(self.documents[0]).pk, first[0].pk)
+
+    @override_settings(ALLOWED_HOSTS=['*'])
+    def test_bulk_improve_returns_the_queued_job(self):
+        client = APIClient()
+        client.force_authenticate(self.user)
+        ids = [document.id for document in self.documents]
+        first = client.post('/api/documents/bulk_improve/', {'document_ids': ids}, format='json').json()['results']
+        second = client.post('/api/documents/bulk_improve/', {'document_ids': ids}, format='json').json()['results']
+        self.assertEqual([row['job_id'] for row in first], [row['job_id'] for row in second])
+        self.assertEqual([row['status'] for row in second], ['uploaded', 'approved', 'rejected'])
+        self.assertEqual(ImprovementJob.objects.count(), 3)
+
+
+@override_settings(CACHE_PRUNE_INTERVAL=0)
+class SegmentStoreTests(TestCase):
+    def test_least_recently_used_rows_are_pruned(self):
+        store = SegmentStore(max_entries=3)
+        store.put_many('sentence', {'one': 1, 'two': 2, 'three': 3})
+        old = timezone.now() - timedelta(days=1)
+        SegmentResult.objects.update(last_used_at=old)
+
+        # A hit refreshes the row, so 'one' outlives the untouched rows
+        self.assertEqual(store.get_many('sentence', ['one', 'missing']), {'one': 1})
+        store.put_many('sentence', {'four': 4, 'five': 5})
+
+        self.assertEqual(SegmentResult.objects.count(), 3)
+        self.assertEqual(store.get_many('sentence', ['one', 'two', 'three', 'four', 'five']), {'one': 1, 'four': 4, 'five': 5})
+
+    @override_settings(CACHE_PRUNE_INTERVAL=3600)
+    def test_pruning_waits_for_the_interval(self):
+        store = SegmentStore(max_entries=2)
+        with mock.patch.dict('documents.cache._last_pruned', clear=True):
+            store.put_many('sentence', {'one': 1, 'two': 2, 'three': 3})
+            self.assertEqual(SegmentResult.objects.count(), 2)
+            with self.assertNumQueries(1):
+                store.put_many('sentence', {'four': 4, 'five': 5})
+            self.assertEqual(SegmentResult.objects.count(), 4)
+        self.assertEqual(store.prune(), 2)
+        self.assertEqual(store.get_many('sentence', ['four', 'five']), {'four': 4, 'five': 5})
+
+    def test_improvement_cache_is_pruned(self):
+        cache = ResultCache(1000, persistent=True, persistent_max_entries=2)
+        for text in ["First.", "Second.", "Third.", "Fourth."]:
+            cache.put(text, text, [])
+        self.assertEqual(
+            sorted(CachedImprovement.objects.values_list('improved_content', flat=True)), ["Fourth.", "Third."]
+        )
+
+
+@override_settings(ALLOWED_HOSTS=['*'], PROFILING_ENABLED=True, PROFILER='cprofile', DEBUG=False)
+class ProfilingMiddlewareTests(TestCase):
+    url = '/api/get_statistics/?profile=1'
+
+    def get(self, user=None):
+        client = APIClient()
+        if user is not None:
+            client.credentials(HTTP_AUTHORIZATION=f'Token {Token.objects.create(user=user).key}')
+        return client.get(self.url)
+
+    def test_anonymous_requests_are_not_profiled(self):
+        response = self.get()
+        self.assertEqual(response.status_code, 401)
+        self.assertNotIn(b'function calls', response.content)
+
+    def test_non_staff_users_are_not_profiled(self):
+        response = self.get(User.objects.create(username='member'))
+        self.assertEqual(response.status_code, 200)
+        self.assertIn('total_documents', response.json())
+
+    def test_staff_users_get_the_profile(self):
+        response = self.get(User.objects.create(username='admin', is_staff=True))
+        self.assertEqual(response['Content-Type'], 'text/plain; charset=utf-8')
+        self.assertIn(b'function calls', response.content)
+
+
+class StageMetricsTests(TestCase):
+    def test_flush_adds_to_the_stored_totals(self):
+        metrics = StageMetrics()
+        metrics.record('grammar', 0.5, 100, 0)
+        metrics.record('grammar', 0.25, 50, 0)
+        metrics.record('rules', 0.001, 10, 2)
+        with self.assertNumQueries(1):
+            metrics.flush()
+        metrics.record('rules', 0.002, 5, 1)
+        metrics.flush()
+        self.assertEqual(metrics.totals(), {
+            'grammar': {'calls': 2, 'microseconds': 750000, 'input_chars': 150, 'suggestions': 0},
+            'rules': {'calls': 2, 'microseconds': 3000, 'input_chars': 15, 'suggestions': 3},
+        })
+
+        # Rebuilding the statistics counters leaves the metrics alone
+        rebuild_counters()
+        self.assertEqual(StageMetric.objects.get(stage='grammar').calls, 2)
+
+    @override_settings(ALLOWED_HOSTS=['*'])
+    def test_metrics_endpoint_is_for_staff(self):
+        client = APIClient()
+        self.assertEqual(client.get('/api/metrics/').status_code, 401)
+        client.force_authenticate(User.objects.create(username='member'))
+        self.assertEqual(client.get('/api/metrics/').status_code, 403)
+        client.force_authenticate(User.objects.create(username='admin', is_staff=True))
+        self.assertIn(b'nlp_stage_calls_total', client.get('/api/metrics/').content)
+
+        with override_settings(METRICS_PUBLIC=True):
+            self.assertEqual(APIClient().get('/api/metrics/').status_code, 200)
+
+
+class CacheKeyTests(SimpleTestCase):
+    def test_engines_are_part_of_the_key(self):
+        text = "Some text."
+        engines = {'SPELLING_ENGINE': 'symspell', 'LANGUAGETOOL_BACKEND': 'server', 'GRAMMAR_BACKEND': 'pytorch'}
+        with override_settings(**engines):
+            key = cache_key(text)
+            window_key = cache_key(text, 'correction')
+        self.assertNotEqual(key, window_key)
+        for changed in ({'SPELLING_ENGINE': 'textblob'}, {'LANGUAGETOOL_BACKEND': 'local'}, {'GRAMMAR_BACKEND': 'onnx'}):
+            with override_settings(**{**engines, **changed}):
+                self.assertNotEqual(cache_key(text), key)
+                self.assertNotEqual(cache_key(text, 'correction'), window_key)
+
+    def test_whitespace_changes_the_document_key(self):
+        # Results hold offsets into the exact text, so only identical text hits
+        self.assertNotEqual(cache_key("One.\r\nTwo.\n"), cache_key("One.\nTwo."))
+        self.assertNotEqual(cache_key("  One."), cache_key("One."))
+        self.assertEqual(cache_key("One.\r\nTwo."), cache_key("One.\r\nTwo."))
+
+    def test_cached_results_are_only_returned_for_the_same_text(self):
+        cache = ResultCache(1000)
+        cache.put("One.\r\nTwo.", "One.\r\nTwo.", [])
+        self.assertIsNone(cache.get("One.\nTwo."))
+        self.assertEqual(cache.get("One.\r\nTwo."), ("One.\r\nTwo.", []))
+
+
+@override_settings(ALLOWED_HOSTS=['*'], SEARCH_INDEX_MAX_CHARS=60)
+class SearchTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create(username='searcher')
+        self.other = User.objects.create(username='other')
+
+    def upload(self, user, name, text):
+        client = APIClient()
+        client.force_authenticate(user)
+        response = client.post('/api/upload/', {'file': SimpleUploadedFile(name, text.encode())}, format='multipart')
+        self.assertEqual(response.status_code, 201)
+        return Document.objects.get(pk=response.json()['document_id'])
+
+    def found(self, user, query):
+        return [hit.document_id for hit in search(user, query, 0, 10)]
+
+    def test_results_are_scoped_to_the_user(self):
+        mine = self.upload(self.user, 'mine.txt', "Quarterly budget review for the team.")
+        client = APIClient()
+        client.force_authenticate(self.other)
+        response = client.post(
+            '/api/upload/bulk/', {'files': [SimpleUploadedFile('theirs.txt', b"Another budget review, not yours.")]},
+            format='multipart',
+        )
+        theirs = response.json()['results'][0]['document_id']
+        self.assertEqual(self.found(self.user, 'budget'), [mine.id])
+        self.assertEqual(self.found(self.other, 'budget'), [theirs])
+
+        client = APIClient()
+        client.force_authenticate(self.user)
+        results = client.get('/api/documents/search/', {'q': 'budget'}).json()['results']
+        self.assertEqual([row['document_id'] for row in results], [mine.id])
+
+    def test_only_the_start_of_the_body_is_indexed(self):
+        document = self.upload(self.user, 'long.txt', "Opening words here. " + "filler " * 20 + "closingword")
+        self.assertEqual(len(SearchEntry.objects.get(document=document).original_content), 60)
+        self.assertEqual(self.found(self.user, 'opening'), [document.id])
+        self.assertEqual(self.found(self.user, 'closingword'), [])
+
+    def test_index_follows_improvements_and_deletes(self):
+        document = self.upload(self.user, 'draft.txt', "The draft has alot of typos.")
+        self.assertEqual(self.found(self.user, 'polished'), [])
+
+        save_improvement(document, "The polished draft has a lot of typos.", [])
+        self.assertEqual(self.found(self.user, 'polished'), [document.id])
+        save_improvement(document, "The final draft has a lot of typos.", [])
+        self.assertEqual(self.found(self.user, 'polished'), [])
+        self.assertEqual(self.found(self.user, 'final'), [document.id])
+
+        document.delete()
+        self.assertEqual(self.found(self.user, 'draft'), [])
+
+    def test_fallback_search(self):
+        both = self.upload(self.user, 'both.txt', "Budget and forecast.")
+        one = self.upload(self.user, 'one.txt', "Only the budget.")
+        self.upload(self.other, 'other.txt', "Budget and forecast too.")
+        save_improvement(one, "Only the revised budget.", [])
+
+        hits = fallback_search(self.user.id, search_terms('forecast budget'), 0, 10)
+        self.assertEqual([(hit.document_id, hit.score) for hit in hits], [(both.id, 2.0), (one.id, 1.0)])
+        self.assertEqual(hits[1].snippet, "Only the revised budget.")
+        self.assertEqual(fallback_search(self.user.id, ['missing'], 0, 10), [])
+
+
+class InferenceServerTests(SimpleTestCase):
+    # A real run_inference_server process on a temporary Unix socket, serving
+    # the models that need neither spaCy nor transformers
+    authkey = 'inference-test-key'
+
+    @classmethod
+    def run_server(cls, *arguments, authkey=authkey):
+        env = {**os.environ, 'INFERENCE_SERVER_AUTHKEY': authkey, 'LANGUAGETOOL_BACKEND': 'local'}
+        return subprocess.Popen(
+            [sys.executable, 'manage.py', 'run_inference_server', *arguments],
+            cwd=settings.BASE_DIR, env=env, stdout=subprocess.PIPE, stderr=subprocess.PIPE, text=True,
+        )
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.directory = tempfile.TemporaryDirectory()
+        cls.address = f'unix:{cls.directory.name}/inference.sock'
+        cls.server = cls.run_server('--address', cls.address, '--max-wait-ms', '200', '--preload', 'languagetool,spelling')
+        for line in cls.server.stdout:
+            if line.startswith('Inference server listening'):
+                break
+        else:
+            cls.server.wait()
+            raise RuntimeError(f"Inference server exited: {cls.server.stderr.read()}")
+        cls.inference = InferenceClient(cls.address, cls.authkey.encode())
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.server.terminate()
+        cls.server.wait()
+        cls.server.stdout.close()
+        cls.server.stderr.close()
+        cls.directory.cleanup()
+        super().tearDownClass()
+
+    def test_concurrent_requests_are_batched(self):
+        texts = [f"Report {index} has alot of errors. We would of fixed the the rest." for index in range(8)]
+        before = self.inference.call('stats')['check']
+        with ThreadPoolExecutor(len(texts)) as executor:
+            results = list(executor.map(RemoteLanguageTool(self.inference).check, texts))
+        after = self.inference.call('stats')['check']
+        self.assertEqual(after['requests'] - before['requests'], len(texts))
+        self.assertLess(after['batches'] - before['batches'], len(texts))
+
+        local = LocalLanguageTool()
+        self.assertEqual(results, [local.check(text) for text in texts])
+
+    def test_spelling_matches_local_inference(self):
+        texts = ["Teh quick brwn fox.", "Nothing wrong here.", "Speling is hard."]
+        local = load_spelling()
+        remote = RemoteSpelling(self.inference)
+        self.assertEqual([remote.correct(text) for text in texts], [local.correct(text) for text in texts])
+
+    def test_wrong_authkey_is_refused(self):
+        with self.assertRaises(AuthenticationError):
+            InferenceClient(self.address, b'wrong-key').call('stats')
+
+    def test_server_refuses_to_start_without_an_authkey(self):
+        server = self.run_server('--address', f'unix:{self.directory.name}/other.sock', '--preload', '', authkey='')
+        _, stderr = server.communicate(timeout=60)
+        self.assertNotEqual(server.returncode, 0)
+        self.assertIn('INFERENCE_SERVER_AUTHKEY', stderr)
+
+    def test_server_refuses_to_listen_on_every_interface(self):
+        server = self.run_server('--address', '0.0.0.0:0', '--preload', '')
+        _, stderr = server.communicate(timeout=60)
+        self.assertNotEqual(server.returncode, 0)
+        self.assertIn('every interface', stderr)
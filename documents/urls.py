@@ -1,13 +1,21 @@
 from django.urls import path
-from .views import upload_document, get_document, improve_document, update_document_status, get_all_documents, get_statistics, generate_word_document
+from .views import upload_document, bulk_upload_documents, get_document, get_document_readability, improve_document, improve_document_stream, bulk_improve_documents, get_improvement_job, update_document_status, get_all_documents, search_documents, get_statistics, get_cache_statistics, get_metrics, generate_word_document
 
 urlpatterns = [
     path('upload/', upload_document, name='upload_document'),
+    path('upload/bulk/', bulk_upload_documents, name='bulk_upload_documents'),
     path('documents/<int:id>/', get_document, name='get_document'),
+    path('documents/<int:id>/readability/', get_document_readability, name='get_document_readability'),
     path('documents/<int:id>/improve/', improve_document, name='improve_document'),
+    path('documents/<int:id>/improve/stream/', improve_document_stream, name='improve_document_stream'),
+    path('documents/bulk_improve/', bulk_improve_documents, name='bulk_improve_documents'),
+    path('jobs/<int:id>/', get_improvement_job, name='get_improvement_job'),
     path('documents/<int:id>/update-status/', update_document_status, name='update_document_status'),
     path('documents/', get_all_documents, name='get_all_documents'),
+    path('documents/search/', search_documents, name='search_documents'),
     path('get_statistics/', get_statistics, name='get_statistics'),
+    path('cache_statistics/', get_cache_statistics, name='get_cache_statistics'),
+    path('metrics/', get_metrics, name='get_metrics'),
     path('documents/<int:document_id>/generate_word_document/', generate_word_document, name='generate_word_document'),
 
 ]
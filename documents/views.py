@@ -2,20 +2,27 @@ from rest_framework.decorators import api_view, permission_classes
 from rest_framework.permissions import IsAuthenticated
 from rest_framework.response import Response
 from rest_framework import status
-from .models import Document, Content
-from django.contrib.auth.models import User 
-from docx import Document as DocxDocument
-import PyPDF2
-from io import BytesIO
-from django.http import HttpResponse
+from .models import Document, Content, ImprovementJob
+from django.http import HttpResponse, StreamingHttpResponse
+from django.utils.cache import get_conditional_response
 from django.conf import settings
+from django.db import transaction
+import json
 import os
-from .nlp_utils import improve_document_content
+import tempfile
+from .bulk import BulkUploadError, bulk_upload
+from .cache import SegmentStore, result_cache
+from .extraction import SUPPORTED_EXTENSIONS, ContentWriter, extract_text
+from .jobs import enqueue_improvement, enqueue_improvements, save_improvement, save_improvements
+from .metrics import collect_timings, prometheus_text, stage_metrics
+from .pagination import DocumentCursorPagination, SearchPagination
+from .permissions import MetricsPermission
+from .readability import analyze_readability
+from .rendering import render_word_document, word_document_etag
+from .search import index_uploads, search, search_terms
+from .statistics import get_statistics as compute_statistics, set_document_status
 
 
-#  set max Size
-MAX_FILE_SIZE = 10 * 1024 * 1024  # 10MB
-
 @api_view(['POST'])
 @permission_classes([IsAuthenticated])
 def upload_document(request):
@@ -26,45 +33,42 @@ def upload_document(request):
         return Response({"error": "No file provided"}, status=status.HTTP_400_BAD_REQUEST)
     
     
-    if file.size > MAX_FILE_SIZE:
-        return Response({"error": "File size exceeds the limit of 10MB"}, status=status.HTTP_400_BAD_REQUEST)
+    if file.size > settings.MAX_UPLOAD_SIZE:
+        return Response({"error": f"File size exceeds the limit of {settings.MAX_UPLOAD_SIZE // (1024 * 1024)}MB"}, status=status.HTTP_400_BAD_REQUEST)
     
+    # Extract file name and extension
+    file_name, file_extension = os.path.splitext(file.name)
+    file_extension = file_extension.lower()
+    if file_extension not in SUPPORTED_EXTENSIONS:
+        return Response({"error": "Unsupported file format"}, status=status.HTTP_400_BAD_REQUEST)
+
     try:
-        # Extract file name and extension
-        file_name = file.name
-        file_name, file_extension = os.path.splitext(file_name)
-        
-        # Create a new document entry with file name
-        document = Document.objects.create(
-            user=user,
-            file_name=file.name 
-        )
-        
-        # Extract content from file
-        original_content = ''
-        if file_extension == '.txt':
-            original_content = file.read().decode('utf-8')
-        elif file_extension == '.docx':
-            doc = DocxDocument(file)
-            for para in doc.paragraphs:
-                original_content += para.text + '\n'
-        elif file_extension == '.pdf':
-            pdf = PyPDF2.PdfReader(file)
-            for page in pdf.pages:
-                original_content += page.extract_text() + '\n'
-        else:
-            return Response({"error": "Unsupported file format"}, status=status.HTTP_400_BAD_REQUEST)
+        with transaction.atomic():
+            # Create a new document entry with file name
+            document = Document.objects.create(
+                user=user,
+                file_name=file.name 
+            )
+            content = Content.objects.create(document=document, original_content='')
 
-        # Save 
-        Content.objects.create(document=document, original_content=original_content)
+            # Extract content from file piece by piece and save it in chunks
+            writer = ContentWriter(
+                content, settings.UPLOAD_WRITE_CHUNK_CHARS, settings.UPLOAD_RESPONSE_CONTENT_CHARS,
+                settings.SEARCH_INDEX_MAX_CHARS,
+            )
+            for text in extract_text(file, file_extension):
+                writer.write(text)
+            writer.close()
+            index_uploads([(document, writer.index_text())])
         
-        # Construct response data
+        # Construct response data; very large documents only get a preview
         response_data = {
             "document_id": document.id,
             "file_name": document.file_name,
             "status": document.status,
             "upload_date": document.upload_date.isoformat(), 
-            "content": original_content  
+            "content": writer.preview_text(),
+            "content_truncated": writer.truncated
         }
         
         return Response(response_data, status=status.HTTP_201_CREATED)
@@ -72,6 +76,29 @@ def upload_document(request):
         return Response({"error": str(e)}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
 
 
+@api_view(['POST'])
+@permission_classes([IsAuthenticated])
+def bulk_upload_documents(request):
+    # Many files (or .zip archives of them) in one request, as "files"
+    files = request.FILES.getlist('files')
+
+    if not files:
+        return Response({"error": "No files provided"}, status=status.HTTP_400_BAD_REQUEST)
+
+    try:
+        with tempfile.TemporaryDirectory() as directory:
+            results = bulk_upload(request.user, files, directory)
+    except BulkUploadError as e:
+        return Response({"error": str(e)}, status=status.HTTP_400_BAD_REQUEST)
+    except Exception as e:
+        return Response({"error": str(e)}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
+
+    # 207 when only some of the files could be stored
+    failed = any("error" in result for result in results)
+    response_status = status.HTTP_207_MULTI_STATUS if failed else status.HTTP_201_CREATED
+    return Response({"results": results}, status=response_status)
+
+
 @api_view(['GET'])
 @permission_classes([IsAuthenticated])
 def get_document(request, id):
@@ -100,6 +127,40 @@ def get_document(request, id):
         return Response({"error": str(e)}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
 
 
+def readability_scores(counts):
+    scores = {name: round(value, 2) for name, value in counts.scores().items()}
+    scores.update({"sentences": counts.sentences, "words": counts.words})
+    return scores
+
+
+@api_view(['GET'])
+@permission_classes([IsAuthenticated])
+def get_document_readability(request, id):
+    # Readability of the whole text and of every paragraph, from one count.
+    # ?content=original scores the uploaded text instead of the improved one.
+    try:
+        content = Content.objects.get(document_id=id)
+        if request.query_params.get('content') == 'original':
+            text = content.original_content
+        else:
+            text = content.improved_content or content.original_content
+        counts, sections = analyze_readability(text, sections=True)
+
+        response_data = {
+            "document_id": id,
+            "readability": readability_scores(counts),
+            "sections": [
+                dict(start=start, end=end, **readability_scores(section))
+                for start, end, section in sections if section.words
+            ],
+        }
+        return Response(response_data, status=status.HTTP_200_OK)
+    except Content.DoesNotExist:
+        return Response({"error": "Document not found"}, status=status.HTTP_404_NOT_FOUND)
+    except Exception as e:
+        return Response({"error": str(e)}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
+
+
 @api_view(['POST'])
 @permission_classes([IsAuthenticated])
 def improve_document(request, id):
@@ -109,34 +170,205 @@ def improve_document(request, id):
         
         content = Content.objects.get(document=document)
         
-        # NLP
-        improved_content, suggestions = improve_document_content(content.original_content)
-        
-        # Save 
-        content.improved_content = improved_content
-        content.suggestions = suggestions
-        content.save()
+        # Identical content has been improved before, answer straight away
+        cached = result_cache.get(content.original_content)
+        if cached is not None:
+            improved_content, suggestions = cached
+            save_improvement(document, improved_content, suggestions)
+
+            response_data = {
+                "document_id": document.id,
+                "file_name": document.file_name,
+                "status": document.status,
+                "upload_date": document.upload_date.isoformat(),
+                "original_content": content.original_content,
+                "improved_content": improved_content,
+                "suggestions": suggestions,
+                "cached": True
+            }
+
+            return Response(response_data, status=status.HTTP_200_OK)
+
+        # Queue the NLP work for run_improvement_worker instead of running it here
+        job = enqueue_improvement(document)
         
         
         response_data = {
+            "job_id": job.id,
+            "job_status": job.status,
             "document_id": document.id,
             "file_name": document.file_name,
             "status": document.status,
             "upload_date": document.upload_date.isoformat(), 
-            "original_content": content.original_content,
-            "improved_content": content.improved_content,
-            "suggestions": suggestions  
         }
         
-        return Response(response_data, status=status.HTTP_200_OK)
+        return Response(response_data, status=status.HTTP_202_ACCEPTED)
+    except Document.DoesNotExist:
+        return Response({"error": "Document not found"}, status=status.HTTP_404_NOT_FOUND)
+    except Content.DoesNotExist:
+        return Response({"error": "Content not found for this document"}, status=status.HTTP_404_NOT_FOUND)
+    except Exception as e:
+        return Response({"error": str(e)}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
+
+
+def server_sent_event(event, data):
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
+
+
+def stream_improvement(document, text):
+    # Runs the NLP pipeline in this process while the response is sent
+    from .nlp_utils import iter_document_improvement
+
+    try:
+        cached = result_cache.get(text)
+        timings = None
+        if cached is None:
+            store = SegmentStore() if settings.INCREMENTAL_ANALYSIS else None
+            with collect_timings() as timings:
+                for index, (event, data) in enumerate(iter_document_improvement(text, store)):
+                    if event == 'section':
+                        yield server_sent_event('suggestions', {"section": index, "suggestions": data})
+                    else:
+                        cached = data
+            stage_metrics.flush()
+            result_cache.put(text, *cached)
+        improved_content, suggestions = cached
+        save_improvement(document, improved_content, suggestions)
+
+        response_data = {
+            "document_id": document.id,
+            "status": document.status,
+            "improved_content": improved_content,
+            "suggestions": suggestions,
+        }
+        if settings.DEBUG and timings is not None:
+            response_data["timings"] = timings
+        yield server_sent_event('done', response_data)
+    except Exception as e:
+        yield server_sent_event('error', {"error": str(e)})
+
+
+@api_view(['POST'])
+@permission_classes([IsAuthenticated])
+def improve_document_stream(request, id):
+    # Server-sent events: a "suggestions" event per section of the text as
+    # soon as it is analysed, then "done" with the improved content
+    try:
+        document = Document.objects.get(id=id)
+        content = Content.objects.get(document=document)
     except Document.DoesNotExist:
         return Response({"error": "Document not found"}, status=status.HTTP_404_NOT_FOUND)
     except Content.DoesNotExist:
         return Response({"error": "Content not found for this document"}, status=status.HTTP_404_NOT_FOUND)
+
+    response = StreamingHttpResponse(stream_improvement(document, content.original_content), content_type='text/event-stream')
+    response['Cache-Control'] = 'no-cache'
+    # Keeps nginx from buffering the events
+    response['X-Accel-Buffering'] = 'no'
+    return response
+
+
+@api_view(['POST'])
+@permission_classes([IsAuthenticated])
+def bulk_improve_documents(request):
+    # Queues many documents at once; the worker grammar corrects queued
+    # documents together, so their sentences share model batches
+    document_ids = request.data.get('document_ids')
+
+    if not isinstance(document_ids, list) or not document_ids:
+        return Response({"error": "document_ids must be a non-empty list"}, status=status.HTTP_400_BAD_REQUEST)
+    if not all(isinstance(document_id, int) for document_id in document_ids):
+        return Response({"error": "document_ids must be integers"}, status=status.HTTP_400_BAD_REQUEST)
+    if len(document_ids) > settings.BULK_IMPROVE_MAX_DOCUMENTS:
+        return Response({"error": f"At most {settings.BULK_IMPROVE_MAX_DOCUMENTS} documents can be improved at once"}, status=status.HTTP_400_BAD_REQUEST)
+
+    try:
+        document_ids = list(dict.fromkeys(document_ids))
+        documents = Document.objects.filter(id__in=document_ids, content__isnull=False).select_related('content').in_bulk()
+
+        # Documents whose content has been improved before are answered
+        # straight away, the others are queued
+        cached = {}
+        queued = []
+        for document in documents.values():
+            result = result_cache.get(document.content.original_content)
+            if result is not None:
+                cached[document.id] = result
+            else:
+                queued.append(document)
+
+        if cached:
+            save_improvements([
+                (document_id, documents[document_id].content.id, improved_content, suggestions)
+                for document_id, (improved_content, suggestions) in cached.items()
+            ])
+        jobs = {job.document_id: job for job in enqueue_improvements(queued)} if queued else {}
+
+        results = []
+        for document_id in document_ids:
+            if document_id in jobs:
+                job = jobs[document_id]
+                results.append({"document_id": document_id, "job_id": job.id, "job_status": job.status, "status": documents[document_id].status})
+            elif document_id in cached:
+                results.append({"document_id": document_id, "status": documents[document_id].status, "cached": True})
+            else:
+                results.append({"document_id": document_id, "error": "Document not found"})
+
+        return Response({"results": results}, status=status.HTTP_202_ACCEPTED)
+    except Exception as e:
+        return Response({"error": str(e)}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
+
+
+@api_view(['GET'])
+@permission_classes([IsAuthenticated])
+def get_improvement_job(request, id):
+    try:
+        job = ImprovementJob.objects.select_related('document').get(id=id)
+        document = job.document
+
+        response_data = {
+            "job_id": job.id,
+            "job_status": job.status,
+            "document_id": document.id,
+            "status": document.status,
+            "created_at": job.created_at.isoformat(),
+            "started_at": job.started_at.isoformat() if job.started_at else None,
+            "finished_at": job.finished_at.isoformat() if job.finished_at else None,
+        }
+
+        if job.status == ImprovementJob.DONE:
+            content = Content.objects.get(document=document)
+            response_data["original_content"] = content.original_content
+            response_data["improved_content"] = content.improved_content or ''
+            response_data["suggestions"] = content.suggestions or []
+        elif job.status == ImprovementJob.FAILED:
+            response_data["error"] = job.error
+        # Where the pipeline spent its time, for debugging
+        if settings.DEBUG and job.timings:
+            response_data["timings"] = job.timings
+
+        return Response(response_data, status=status.HTTP_200_OK)
+    except ImprovementJob.DoesNotExist:
+        return Response({"error": "Job not found"}, status=status.HTTP_404_NOT_FOUND)
+    except Content.DoesNotExist:
+        return Response({"error": "Content not found for this document"}, status=status.HTTP_404_NOT_FOUND)
     except Exception as e:
         return Response({"error": str(e)}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
 
 
+@api_view(['GET'])
+@permission_classes([IsAuthenticated])
+def get_cache_statistics(request):
+    return Response(result_cache.stats(), status=status.HTTP_200_OK)
+
+
+@api_view(['GET'])
+@permission_classes([MetricsPermission])
+def get_metrics(request):
+    # Per-stage NLP pipeline counters in the Prometheus text format
+    return HttpResponse(prometheus_text(), content_type='text/plain; version=0.0.4; charset=utf-8')
+
+
 @api_view(['PATCH'])
 @permission_classes([IsAuthenticated])
 def update_document_status(request, id):
@@ -151,8 +383,7 @@ def update_document_status(request, id):
             return Response({"error": "No status provided"}, status=status.HTTP_400_BAD_REQUEST)
         
         # Update the document status
-        document.status = new_status
-        document.save()
+        set_document_status(Document.objects.filter(pk=document.pk), new_status)
         
         
         
@@ -162,32 +393,73 @@ def update_document_status(request, id):
     except Exception as e:
         return Response({"error": str(e)}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
 
+# Content bodies returned by get_all_documents only when asked for in ?fields=
+LISTING_BODY_FIELDS = ('original_content', 'improved_content')
+
 @api_view(['GET'])
 @permission_classes([IsAuthenticated])
 def get_all_documents(request):
     try:
         user = request.user
-        # Retrieve all documents for the logged-in user
-        documents = Document.objects.filter(user=user)
+        fields = [field for field in request.query_params.get('fields', '').split(',') if field]
+        unknown_fields = [field for field in fields if field not in LISTING_BODY_FIELDS]
+        if unknown_fields:
+            return Response({"error": f"Unknown fields: {', '.join(unknown_fields)}"}, status=status.HTTP_400_BAD_REQUEST)
+
+        # Documents of the logged-in user joined to their content, with the
+        # stored excerpt; the full bodies are only loaded when requested
+        documents = Document.objects.filter(user=user, content__isnull=False).select_related('content').defer(
+            *[f'content__{field}' for field in LISTING_BODY_FIELDS if field not in fields]
+        )
+
+        paginator = DocumentCursorPagination()
+        page = paginator.paginate_queryset(documents, request)
+
+        response_data = []
+        for document in page:
+            doc_data = {
+                "document_id": document.id,
+                "file_name": document.file_name,
+                "status": document.status,
+                "upload_date": document.upload_date.isoformat(),
+                "excerpt": document.content.excerpt
+            }
+            for field in fields:
+                doc_data[field] = getattr(document.content, field) or ''
+            response_data.append(doc_data)
         
+        return paginator.get_paginated_response(response_data)
+    except Exception as e:
+        return Response({"error": str(e)}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
+
+@api_view(['GET'])
+@permission_classes([IsAuthenticated])
+def search_documents(request):
+    try:
+        query = request.query_params.get('q', '')
+        if not search_terms(query):
+            return Response({"error": "No search terms provided"}, status=status.HTTP_400_BAD_REQUEST)
+
+        # Ranked matches among the logged-in user's documents, a page at a time
+        paginator = SearchPagination()
+        hits = paginator.paginate(request, lambda offset, limit: search(request.user, query, offset, limit))
+        documents = Document.objects.in_bulk([hit.document_id for hit in hits])
+
         response_data = []
-        for document in documents:
-            try:
-                # Retrieve the content associated with the document
-                content = Content.objects.get(document=document)
-                doc_data = {
-                    "document_id": document.id,
-                    "file_name": document.file_name,
-                    "status": document.status,
-                    "upload_date": document.upload_date.isoformat(),  
-                    "original_content": content.original_content,
-                    "improved_content": content.improved_content or ''  
-                }
-                response_data.append(doc_data)
-            except Content.DoesNotExist:
+        for hit in hits:
+            document = documents.get(hit.document_id)
+            if document is None:
                 continue
-        
-        return Response(response_data, status=status.HTTP_200_OK)
+            response_data.append({
+                "document_id": document.id,
+                "file_name": document.file_name,
+                "status": document.status,
+                "upload_date": document.upload_date.isoformat(),
+                "score": round(hit.score, 4),
+                "snippet": hit.snippet,
+            })
+
+        return paginator.get_paginated_response(response_data)
     except Exception as e:
         return Response({"error": str(e)}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
 
@@ -195,20 +467,9 @@ def get_all_documents(request):
 @permission_classes([IsAuthenticated])
 def get_statistics(request):
     try:
-        total_users = User.objects.count()
-        total_uploaded_documents = Document.objects.count()
-        total_approved_documents = Document.objects.filter(status='approved').count()
-        total_rejected_documents = Document.objects.filter(status='rejected').count()
-        total_documents = Document.objects.count()
-        
-        response_data = {
-            'total_users': total_users,
-            'total_uploaded_documents': total_uploaded_documents,
-            'total_approved_documents': total_approved_documents,
-            'total_rejected_documents': total_rejected_documents,
-            'total_documents': total_documents
-        }
-        
+        # Materialized counters (or one aggregate query), cached briefly
+        response_data = compute_statistics()
+
         return Response(response_data, status=status.HTTP_200_OK)
     except Exception as e:
         return Response({"error": str(e)}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
@@ -219,46 +480,25 @@ def get_statistics(request):
 @permission_classes([IsAuthenticated])
 def generate_word_document(request, document_id):
     try:
-        # Get the document and its improved content from the database
+        # Get the document and when its content last changed; the content
+        # itself is only loaded when the file has to be rendered
         doc = Document.objects.get(id=document_id)
-        content = Content.objects.get(document=doc)
-        
-        # Get the improved content
-        improved_content = content.improved_content or '' 
-        
-        # Define the organization name and document title
-        organization_name = "AI DOCUMENT ASSISTANT"
-        document_title = doc.file_name  
+        content = Content.objects.only('id', 'updated_at').get(document=doc)
 
-        # Load the template
-        template_path = os.path.join(settings.BASE_DIR, 'templates', 'template.docx')
-        
-        if not os.path.exists(template_path):
-            return Response({"error": "Template file not found"}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
-        
-        template = DocxDocument(template_path)
-
-        # Replace placeholders in the template with actual content
-        for paragraph in template.paragraphs:
-            if '<<ORGANIZATION_NAME>>' in paragraph.text:
-                paragraph.text = paragraph.text.replace('<<ORGANIZATION_NAME>>', organization_name)
-            if '<<DOCUMENT_TITLE>>' in paragraph.text:
-                paragraph.text = paragraph.text.replace('<<DOCUMENT_TITLE>>', document_title)
-            if '<<IMPROVED_CONTENT>>' in paragraph.text:
-                # To avoid text replacement issues with formatting, handle in runs
-                inline_shapes = paragraph.runs
-                for run in inline_shapes:
-                    if '<<IMPROVED_CONTENT>>' in run.text:
-                        run.text = run.text.replace('<<IMPROVED_CONTENT>>', improved_content)
-
-        # Save the document to a BytesIO object
-        file_stream = BytesIO()
-        template.save(file_stream)
-        file_stream.seek(0)
+        # Repeat downloads of an unchanged document get a 304
+        etag = word_document_etag(doc, content)
+        not_modified = get_conditional_response(request, etag=etag)
+        if not_modified is not None:
+            return not_modified
+
+        # Render from the pre-analysed template, or reuse the cached file
+        data = render_word_document(doc, content, etag)
 
         # Create the HTTP response
-        response = HttpResponse(file_stream, content_type='application/vnd.openxmlformats-officedocument.wordprocessingml.document')
+        response = HttpResponse(data, content_type='application/vnd.openxmlformats-officedocument.wordprocessingml.document')
         response['Content-Disposition'] = f'attachment; filename={doc.file_name}_optimized.docx'
+        response['ETag'] = etag
+        response['Cache-Control'] = 'private, no-cache'
 
         return response
 
@@ -270,5 +510,3 @@ def generate_word_document(request, document_id):
         return Response({"error": "Template file not found"}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
     except Exception as e:
         return Response({"error": str(e)}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
-
-
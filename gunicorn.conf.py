@@ -0,0 +1,19 @@
+import os
+
+bind = os.environ.get('GUNICORN_BIND', '0.0.0.0:8000')
+workers = int(os.environ.get('GUNICORN_WORKERS', 2))
+# Streamed improvements (documents/<id>/improve/stream/) run the pipeline
+# inside the request, so allow long requests
+timeout = int(os.environ.get('GUNICORN_TIMEOUT', 600))
+
+# Load the app (and the models in PRELOAD_MODELS) in the master process so the
+# forked workers share them copy-on-write instead of each loading a copy
+preload_app = True
+wsgi_app = 'src.wsgi:application'
+
+
+def when_ready(server):
+    from django.conf import settings
+    from documents.registry import registry
+
+    registry.warm(settings.PRELOAD_MODELS)
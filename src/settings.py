@@ -55,6 +55,7 @@ MIDDLEWARE = [
 
       'corsheaders.middleware.CorsMiddleware',
     'django.middleware.common.CommonMiddleware',
+    'documents.middleware.ProfilingMiddleware',
 ]
 
 CORS_ALLOW_ALL_ORIGINS = True
@@ -89,7 +90,8 @@ import os
 
 DATABASES = {
     'default': {
-        'ENGINE': 'django.db.backends.mysql',
+        # DATABASE_ENGINE=django.db.backends.sqlite3 runs against a local file
+        'ENGINE': os.environ.get('DATABASE_ENGINE', 'django.db.backends.mysql'),
         'NAME': os.environ.get('DATABASE_NAME'),
         'USER': os.environ.get('DATABASE_USER'),
         'PASSWORD': os.environ.get('DATABASE_PASSWORD'),
@@ -106,6 +108,155 @@ REST_FRAMEWORK = {
     
 }
 
+# House-style rules used by documents/nlp_utils.py
+NLP_CONFIG_PATH = BASE_DIR / 'config.json'
+
+# spaCy pipeline used for parsing and NER
+SPACY_MODEL = 'en_core_web_sm'
+
+# Models loaded before worker processes are forked, so they share the weights
+# (names from documents/registry.py: spacy, languagetool, grammar, spelling)
+PRELOAD_MODELS = [name for name in os.environ.get('PRELOAD_MODELS', '').split(',') if name]
+
+# LanguageTool: 'server' starts the Java server through language_tool_python,
+# 'local' uses the offline stand-in in documents/languagetool.py
+LANGUAGETOOL_BACKEND = os.environ.get('LANGUAGETOOL_BACKEND', 'server')
+
+# Maximum characters sent to LanguageTool in one request
+LANGUAGETOOL_CHUNK_CHARS = 20000
+
+# Grammar correction model, run over sentence-aligned windows of at most
+# GRAMMAR_MAX_WINDOW_TOKENS tokens, GRAMMAR_BATCH_SIZE windows at a time
+GRAMMAR_MODEL = 'pszemraj/flan-t5-large-grammar-synthesis'
+GRAMMAR_MAX_WINDOW_TOKENS = int(os.environ.get('GRAMMAR_MAX_WINDOW_TOKENS', 256))
+GRAMMAR_BATCH_SIZE = int(os.environ.get('GRAMMAR_BATCH_SIZE', 8))
+
+# Grammar model inference: 'pytorch' (full precision), 'int8' (dynamically
+# quantized) or 'onnx' (ONNX Runtime). int8 and onnx load the artifacts that
+# manage.py export_grammar_model writes to GRAMMAR_ARTIFACTS_DIR/<backend>
+GRAMMAR_BACKEND = os.environ.get('GRAMMAR_BACKEND', 'pytorch')
+GRAMMAR_ARTIFACTS_DIR = os.environ.get('GRAMMAR_ARTIFACTS_DIR', os.path.join(BASE_DIR, 'models', 'grammar'))
+
+# Spelling correction of the grammar model output: 'symspell' (symmetric
+# delete index over SPELLING_DICTIONARY, by default TextBlob's word list,
+# with a memo of SPELLING_CACHE_SIZE corrected words) or 'textblob'
+SPELLING_ENGINE = os.environ.get('SPELLING_ENGINE', 'symspell')
+SPELLING_DICTIONARY = os.environ.get('SPELLING_DICTIONARY')
+SPELLING_MAX_EDIT_DISTANCE = 2
+SPELLING_CACHE_SIZE = 100000
+
+# Shared inference server (manage.py run_inference_server): when
+# INFERENCE_SERVER is set ('unix:/path/to/socket' or 'host:port') the models
+# are loaded there once and every web and worker process calls it. Requests
+# are batched up to INFERENCE_MAX_BATCH items, waiting at most
+# INFERENCE_MAX_WAIT_MS for a batch to fill. Requests are pickled, so the
+# server and its clients must share a secret INFERENCE_SERVER_AUTHKEY; neither
+# side starts without one.
+INFERENCE_SERVER = os.environ.get('INFERENCE_SERVER', '')
+INFERENCE_SERVER_AUTHKEY = os.environ.get('INFERENCE_SERVER_AUTHKEY', '').encode()
+INFERENCE_MAX_BATCH = int(os.environ.get('INFERENCE_MAX_BATCH', 32))
+INFERENCE_MAX_WAIT_MS = float(os.environ.get('INFERENCE_MAX_WAIT_MS', 10))
+
+# Seconds after which a running improvement job is considered abandoned and
+# handed to another worker
+IMPROVEMENT_JOB_TIMEOUT = 3600
+
+# The improvement worker claims up to IMPROVEMENT_BATCH_SIZE jobs at a time
+# and grammar corrects them together; the bulk improve endpoint accepts at
+# most BULK_IMPROVE_MAX_DOCUMENTS document ids
+IMPROVEMENT_BATCH_SIZE = int(os.environ.get('IMPROVEMENT_BATCH_SIZE', 16))
+BULK_IMPROVE_MAX_DOCUMENTS = 500
+
+# The streaming improve endpoint corrects and analyses the text in sections
+# of about STREAM_SECTION_CHARS characters (split at line breaks)
+STREAM_SECTION_CHARS = 2000
+
+# Documents of LARGE_DOCUMENT_CHARS characters or more are analysed in shards
+# of about DOCUMENT_SHARD_CHARS characters (split at line breaks); the
+# improvement worker spreads the shards of one document over its pool
+LARGE_DOCUMENT_CHARS = int(os.environ.get('LARGE_DOCUMENT_CHARS', 200000))
+DOCUMENT_SHARD_CHARS = 50000
+
+# Cache of improve_document_content results keyed by a hash of the text, the
+# config.json rules, the grammar model and backend and the spelling and
+# LanguageTool engines. The in-memory tier is an LRU bounded by the characters
+# it holds; the persistent tier is the improvement_cache table.
+IMPROVEMENT_CACHE_MAX_CHARS = 50 * 1024 * 1024
+IMPROVEMENT_CACHE_PERSISTENT = True
+IMPROVEMENT_CACHE_PERSISTENT_MAX_ENTRIES = 10000
+
+# Store corrected windows and per-sentence analysis in the segment_results
+# table so re-improving an edited document only processes what changed; the
+# least recently used rows beyond SEGMENT_STORE_MAX_ENTRIES are deleted
+INCREMENTAL_ANALYSIS = True
+SEGMENT_STORE_MAX_ENTRIES = int(os.environ.get('SEGMENT_STORE_MAX_ENTRIES', 1000000))
+
+# Each process prunes improvement_cache and segment_results back to their
+# maximum sizes at most once every CACHE_PRUNE_INTERVAL seconds
+CACHE_PRUNE_INTERVAL = 300
+
+# Uploads: text is extracted piece by piece and compressed every
+# UPLOAD_WRITE_CHUNK_CHARS characters; the upload response carries at most
+# UPLOAD_RESPONSE_CONTENT_CHARS characters of it
+MAX_UPLOAD_SIZE = int(os.environ.get('MAX_UPLOAD_SIZE', 200 * 1024 * 1024))
+UPLOAD_WRITE_CHUNK_CHARS = 4 * 1024 * 1024
+UPLOAD_RESPONSE_CONTENT_CHARS = 10 * 1024 * 1024
+
+# PDFs with at least PDF_PARALLEL_MIN_PAGES pages are extracted by a pool of
+# PDF_EXTRACTION_PROCESSES processes
+PDF_EXTRACTION_PROCESSES = int(os.environ.get('PDF_EXTRACTION_PROCESSES', os.cpu_count() or 1))
+PDF_PARALLEL_MIN_PAGES = 50
+
+# Bulk uploads (files or .zip archives): at most BULK_UPLOAD_MAX_FILES files,
+# extracted by BULK_UPLOAD_PROCESSES processes and inserted
+# BULK_UPLOAD_BATCH_SIZE at a time
+BULK_UPLOAD_MAX_FILES = 1000
+BULK_UPLOAD_PROCESSES = int(os.environ.get('BULK_UPLOAD_PROCESSES', os.cpu_count() or 1))
+BULK_UPLOAD_BATCH_SIZE = 100
+
+# Length of the content excerpt in the document listing (at most 255)
+DOCUMENT_EXCERPT_CHARS = 200
+
+# Full-text search: the search_index table holds an uncompressed copy of the
+# first SEARCH_INDEX_MAX_CHARS characters of each body, taken while the upload
+# is extracted, so only that much of a document is searchable; results come
+# SEARCH_PAGE_SIZE (at most SEARCH_MAX_PAGE_SIZE) to a page, each with a
+# snippet of about SEARCH_SNIPPET_CHARS characters
+SEARCH_INDEX_MAX_CHARS = 100000
+SEARCH_PAGE_SIZE = 20
+SEARCH_MAX_PAGE_SIZE = 100
+SEARCH_SNIPPET_CHARS = 200
+
+# Document bodies are stored compressed: 'zlib' (standard library) or 'zstd'
+# (needs the zstandard package). Rows written with either codec stay readable.
+CONTENT_COMPRESSION = os.environ.get('CONTENT_COMPRESSION', 'zlib')
+CONTENT_COMPRESSION_LEVEL = 6
+
+# get_statistics is cached for STATISTICS_CACHE_TTL seconds; with
+# STATISTICS_USE_COUNTERS it reads the statistic_counters table (kept up to
+# date on document/user create, delete and status change) instead of counting
+STATISTICS_CACHE_TTL = 10
+STATISTICS_USE_COUNTERS = True
+
+# Generated Word documents are cached (keyed by document and content
+# version) for WORD_DOCUMENT_CACHE_TTL seconds if they are not larger than
+# WORD_DOCUMENT_CACHE_MAX_BYTES
+WORD_DOCUMENT_CACHE_TTL = 60 * 60
+WORD_DOCUMENT_CACHE_MAX_BYTES = 2 * 1024 * 1024
+
+# Request profiling (documents/middleware.py): when enabled, ?profile=1 from a
+# staff user (or anyone with DEBUG) returns the profile of the request, from
+# cProfile (sorted by PROFILE_SORT, top PROFILE_TOP_FUNCTIONS entries) or
+# pyinstrument
+PROFILING_ENABLED = os.environ.get('PROFILING_ENABLED', '') == '1'
+PROFILER = os.environ.get('PROFILER', 'cprofile')
+PROFILE_SORT = 'cumulative'
+PROFILE_TOP_FUNCTIONS = 60
+
+# The Prometheus metrics endpoint (/api/metrics/) is for staff users (e.g. a
+# scraper sending a staff user's token); METRICS_PUBLIC=1 opens it to anyone
+METRICS_PUBLIC = os.environ.get('METRICS_PUBLIC', '') == '1'
+
 # Password validation
 # https://docs.djangoproject.com/en/3.2/ref/settings/#auth-password-validators
 